@@ -0,0 +1,264 @@
+"""
+A minimal coroutine runtime that plugs into a hand-written select() loop.
+
+A coroutine (either a plain generator or an `async def` function) never blocks.
+When it needs to wait it hands the loop a small request object instead:
+
+    WaitReadable(sock)   -> "resume me when sock has data"
+    WaitWritable(sock)   -> "resume me when sock can take more bytes"
+    Sleep(seconds)       -> "resume me after this long"
+
+A generator does this with `yield WaitReadable(sock)`; an `async def` does it with
+`await wait_readable(sock)`. Either way the coroutine is parked in a table, and the
+select() loop resumes it when the OS reports the socket ready or the timer heap says
+its time is up. That is the whole trick behind asyncio, in about a page of code.
+"""
+import heapq
+import itertools
+import select
+import socket
+import time
+from collections import deque
+
+
+class WaitReadable:
+    __slots__ = ("sock",)
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def __await__(self):
+        return (yield self)
+
+
+class WaitWritable:
+    __slots__ = ("sock",)
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def __await__(self):
+        return (yield self)
+
+
+class Sleep:
+    __slots__ = ("seconds",)
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __await__(self):
+        return (yield self)
+
+
+def wait_readable(sock):
+    return WaitReadable(sock)
+
+
+def wait_writable(sock):
+    return WaitWritable(sock)
+
+
+def sleep(seconds):
+    return Sleep(seconds)
+
+
+class TaskCancelled(Exception):
+    """Stored as a task's exception when it was cancelled before finishing."""
+
+
+class Task:
+    """A coroutine being driven by the Runtime, plus its eventual result."""
+
+    def __init__(self, coro, on_done=None):
+        self.coro = coro
+        self.on_done = on_done
+        self.done = False
+        self.result = None
+        self.exception = None
+        # The WaitReadable/WaitWritable/Sleep request this task is parked on, if any
+        self.waiting_on = None
+
+
+class Runtime:
+    """
+    The scheduler: a ready queue of tasks that can run right now, a heap of sleeping
+    tasks ordered by wake-up time, and two tables of tasks parked on a socket.
+
+    The runtime does not own a loop. An existing select() loop asks it which sockets
+    to watch (read_socks / write_socks) and how long it may sleep (next_timeout), then
+    reports readiness back (on_readable / on_writable) and calls run_ready().
+    Use run() when there is no outer loop.
+    """
+
+    def __init__(self):
+        self.ready = deque()                # (task, value to send in)
+        self.sleepers = []                  # heap of (wake_at, seq, task)
+        self.readers = {}                   # sock -> task
+        self.writers = {}                   # sock -> task
+        self.sequence = itertools.count()   # heap tie-breaker, so tasks never get compared
+
+    def spawn(self, coro, on_done=None):
+        """Schedules a coroutine to start on the next run_ready(). on_done(task) fires when it finishes."""
+        if not hasattr(coro, "send"):
+            raise TypeError(f"spawn() needs a generator or coroutine, got {type(coro).__name__}")
+        task = Task(coro, on_done)
+        self.ready.append((task, None))
+        return task
+
+    def cancel(self, task):
+        """Stops a task wherever it is parked. Its on_done callback still fires."""
+        if task.done:
+            return
+        self._unpark(task)
+        task.coro.close()
+        self._finish(task, exception=TaskCancelled())
+
+    def pending(self):
+        return bool(self.ready or self.sleepers or self.readers or self.writers)
+
+    def read_socks(self):
+        return list(self.readers)
+
+    def write_socks(self):
+        return list(self.writers)
+
+    def next_timeout(self, now):
+        """0 if something can run right now, the time until the next sleeper wakes, or None."""
+        if self.ready:
+            return 0.0
+        while self.sleepers and self.sleepers[0][2].waiting_on is None:
+            heapq.heappop(self.sleepers)  # Lazily drop entries for cancelled tasks
+        if self.sleepers:
+            return max(0.0, self.sleepers[0][0] - now)
+        return None
+
+    def on_readable(self, sock):
+        task = self.readers.pop(sock)
+        task.waiting_on = None
+        self.ready.append((task, None))
+
+    def on_writable(self, sock):
+        task = self.writers.pop(sock)
+        task.waiting_on = None
+        self.ready.append((task, None))
+
+    def run_ready(self, now=None):
+        """Wakes due sleepers, then steps every task that is ready. Returns the number of steps taken."""
+        now = time.monotonic() if now is None else now
+        while self.sleepers and self.sleepers[0][0] <= now:
+            _, _, task = heapq.heappop(self.sleepers)
+            if isinstance(task.waiting_on, Sleep):
+                task.waiting_on = None
+                self.ready.append((task, None))
+
+        # Only run what is ready now; tasks made ready during this pass wait for the next one,
+        # so a task that keeps yielding cannot starve socket I/O.
+        steps = len(self.ready)
+        for _ in range(steps):
+            task, value = self.ready.popleft()
+            self._step(task, value)
+        return steps
+
+    def _step(self, task, value):
+        try:
+            request = task.coro.send(value)
+        except StopIteration as stop:
+            self._finish(task, result=stop.value)
+            return
+        except Exception as e:
+            self._finish(task, exception=e)
+            return
+
+        task.waiting_on = request
+        if isinstance(request, WaitReadable):
+            self.readers[request.sock] = task
+        elif isinstance(request, WaitWritable):
+            self.writers[request.sock] = task
+        elif isinstance(request, Sleep):
+            heapq.heappush(self.sleepers, (time.monotonic() + request.seconds, next(self.sequence), task))
+        elif request is None:
+            # A bare `yield` just gives other tasks a turn
+            task.waiting_on = None
+            self.ready.append((task, None))
+        else:
+            task.coro.close()
+            self._finish(task, exception=TypeError(f"Task yielded an unknown request: {request!r}"))
+
+    def _unpark(self, task):
+        request, task.waiting_on = task.waiting_on, None
+        if isinstance(request, WaitReadable):
+            self.readers.pop(request.sock, None)
+        elif isinstance(request, WaitWritable):
+            self.writers.pop(request.sock, None)
+        # Sleepers are dropped lazily from the heap; a queued ready entry is filtered out here
+        self.ready = deque(entry for entry in self.ready if entry[0] is not task)
+
+    def _finish(self, task, result=None, exception=None):
+        task.done = True
+        task.result = result
+        task.exception = exception
+        if task.on_done is not None:
+            task.on_done(task)
+
+    def run(self, coro):
+        """Runs 'coro' (and anything it spawns) on a private select() loop until it finishes."""
+        main = self.spawn(coro)
+        while not main.done:
+            timeout = self.next_timeout(time.monotonic())
+            readers, writers = self.read_socks(), self.write_socks()
+            if readers or writers:
+                readable, writable, _ = select.select(readers, writers, [], timeout)
+                for sock in readable:
+                    self.on_readable(sock)
+                for sock in writable:
+                    self.on_writable(sock)
+            elif timeout:
+                time.sleep(timeout)
+            self.run_ready()
+        if main.exception is not None:
+            raise main.exception
+        return main.result
+
+
+# --- Non-blocking socket helpers built on the wait requests ---
+
+async def sock_connect(sock, address):
+    """Connects a non-blocking socket without stalling the loop."""
+    sock.setblocking(False)
+    try:
+        sock.connect(address)
+    except BlockingIOError:
+        await wait_writable(sock)
+        error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            raise OSError(error, f"connect to {address} failed")
+
+
+async def sock_recv(sock, size):
+    while True:
+        try:
+            return sock.recv(size)
+        except BlockingIOError:
+            await wait_readable(sock)
+
+
+async def sock_recv_all(sock, chunk=65536):
+    """Reads until the peer closes the connection."""
+    parts = []
+    while True:
+        data = await sock_recv(sock, chunk)
+        if not data:
+            return b"".join(parts)
+        parts.append(data)
+
+
+async def sock_sendall(sock, data):
+    view = memoryview(data)
+    while view:
+        try:
+            sent = sock.send(view)
+        except BlockingIOError:
+            await wait_writable(sock)
+            continue
+        view = view[sent:]
@@ -0,0 +1,266 @@
+"""
+Loop-engine comparison: the same tiny HTTP handler on three event loop engines.
+
+    select   - the hand-rolled select.select() loop from the lesson
+    epoll    - the same loop on selectors.DefaultSelector (epoll on Linux, kqueue on macOS)
+    asyncio  - asyncio.start_server streams
+    server   - (optional) the full event_loop_server.py, to see what its features cost
+
+Each engine runs in its own process and is restarted for every concurrency level, then
+load_generator.py drives it. The results are written as JSON and charted as req/s and
+p99 latency against the number of concurrent connections.
+
+Example:
+    python engine_benchmark.py --concurrency 10,100,500,1000,2000 --requests 20000
+"""
+import os
+import sys
+import json
+import time
+import socket
+import select
+import asyncio
+import argparse
+import selectors
+import subprocess
+
+from load_generator import run_load, raise_fd_limit
+
+HOST = '127.0.0.1'
+BACKLOG = 1024
+RESPONSE = (
+    "HTTP/1.1 200 OK\r\n"
+    "Content-Type: text/plain\r\n"
+    "Content-Length: 26\r\n"
+    "Connection: close\r\n"
+    "\r\n"
+    "Hello from the event loop!"
+).encode('utf-8')
+
+ENGINES = ("select", "epoll", "asyncio", "server")
+
+
+def listening_socket(port):
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((HOST, port))
+    server_socket.listen(BACKLOG)
+    server_socket.setblocking(False)
+    return server_socket
+
+
+def on_client_data(sock, buffers):
+    """
+    The shared handler: buffer until the end of the headers, then answer and hang up.
+    Returns True when the socket is finished with and should be unregistered and closed.
+    """
+    try:
+        data = sock.recv(1024)
+    except ConnectionResetError:
+        return True
+    if not data:
+        return True
+    buffers[sock] += data
+    if b"\r\n\r\n" not in buffers[sock]:
+        return False
+    try:
+        sock.sendall(RESPONSE)
+    except OSError:
+        pass
+    return True
+
+
+def accept_all(server_socket):
+    """Drains the accept queue; returns the new, non-blocking client sockets."""
+    clients = []
+    while True:
+        try:
+            client_socket, _ = server_socket.accept()
+        except BlockingIOError:
+            return clients
+        client_socket.setblocking(False)
+        clients.append(client_socket)
+
+
+def serve_select(port):
+    """The lesson's loop. Note select() cannot watch file descriptors numbered 1024 or above."""
+    server_socket = listening_socket(port)
+    sockets = [server_socket]
+    buffers = {}
+    while True:
+        readable, _, _ = select.select(sockets, [], [])
+        for sock in readable:
+            if sock is server_socket:
+                for client in accept_all(server_socket):
+                    sockets.append(client)
+                    buffers[client] = b""
+            elif on_client_data(sock, buffers):
+                sockets.remove(sock)
+                del buffers[sock]
+                sock.close()
+
+
+def serve_epoll(port):
+    """The same loop on epoll: the kernel keeps the interest list, so each wakeup costs O(ready), not O(watched)."""
+    server_socket = listening_socket(port)
+    selector = selectors.DefaultSelector()
+    selector.register(server_socket, selectors.EVENT_READ)
+    buffers = {}
+    while True:
+        for key, _ in selector.select():
+            sock = key.fileobj
+            if sock is server_socket:
+                for client in accept_all(server_socket):
+                    selector.register(client, selectors.EVENT_READ)
+                    buffers[client] = b""
+            elif on_client_data(sock, buffers):
+                selector.unregister(sock)
+                del buffers[sock]
+                sock.close()
+
+
+def serve_asyncio(port):
+    """asyncio streams: the same handler written as a coroutine per connection."""
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(RESPONSE)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, HOST, port, backlog=BACKLOG)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+SERVE_FUNCS = {
+    "select": serve_select,
+    "epoll": serve_epoll,
+    "asyncio": serve_asyncio,
+}
+
+
+def start_engine(engine, port):
+    """Starts an engine in its own process and waits until it accepts connections."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    if engine == "server":
+        cmd = [sys.executable, os.path.join(here, "event_loop_server.py"), "--port", str(port), "--log-sample", "0"]
+    else:
+        cmd = [sys.executable, os.path.abspath(__file__), "serve", "--engine", engine, "--port", str(port)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{engine} exited on startup: {proc.stderr.read().decode()}")
+        try:
+            socket.create_connection((HOST, port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"{engine} did not start listening on port {port}")
+
+
+def stop_engine(proc):
+    """Stops an engine; returns its stderr if it had already died (e.g. select() hitting FD_SETSIZE)."""
+    crashed = proc.poll() is not None
+    if not crashed:
+        proc.terminate()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+    err = proc.stderr.read().decode().strip()
+    return err.splitlines()[-1] if crashed and err else None
+
+
+def run_benchmark(engines, levels, requests, port, timeout):
+    results = []
+    for engine in engines:
+        for connections in levels:
+            proc = start_engine(engine, port)
+            report = asyncio.run(run_load(host=HOST, port=port, connections=connections,
+                                          requests=max(requests, connections * 5), timeout=timeout))
+            crash = stop_engine(proc)
+            row = {
+                "engine": engine,
+                "connections": connections,
+                "throughput_rps": report["throughput_rps"],
+                "p50_ms": report["latency"]["p50_ms"],
+                "p99_ms": report["latency"]["p99_ms"],
+                "completed": report["completed"],
+                "errors": report["errors"],
+                "crash": crash,
+            }
+            results.append(row)
+            print(f"{engine:>8} @ {connections:>5} conns: {row['throughput_rps']:>9} req/s  "
+                  f"p99={row['p99_ms']} ms  errors={row['errors']}" + (f"  CRASHED: {crash}" if crash else ""))
+    return results
+
+
+def plot(results, path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, (ax_rps, ax_p99) = plt.subplots(1, 2, figsize=(12, 5))
+    for engine in dict.fromkeys(row["engine"] for row in results):
+        rows = [row for row in results if row["engine"] == engine]
+        xs = [row["connections"] for row in rows]
+        ax_rps.plot(xs, [row["throughput_rps"] or 0 for row in rows], marker="o", label=engine)
+        ax_p99.plot(xs, [row["p99_ms"] for row in rows], marker="o", label=engine)
+    for ax, title, ylabel in ((ax_rps, "Throughput", "requests / second"), (ax_p99, "Tail latency", "p99 (ms)")):
+        ax.set_xscale("log")
+        ax.set_xlabel("concurrent connections")
+        ax.set_ylabel(ylabel)
+        ax.set_title(title)
+        ax.grid(linestyle="--", alpha=0.5)
+        ax.legend()
+    fig.tight_layout()
+    fig.savefig(path, dpi=150)
+    print(f"Chart saved to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare select, epoll and asyncio loop engines.")
+    sub = parser.add_subparsers(dest="command")
+    serve = sub.add_parser("serve", help="Run a single engine (used internally by the benchmark)")
+    serve.add_argument("--engine", choices=list(SERVE_FUNCS), required=True)
+    serve.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--engines", default="select,epoll,asyncio",
+                        help=f"Comma-separated engines to compare, from: {', '.join(ENGINES)}")
+    parser.add_argument("--concurrency", default="10,50,100,500,1000",
+                        help="Comma-separated concurrent connection counts")
+    parser.add_argument("--requests", type=int, default=10000, help="Requests per engine per concurrency level")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout, in seconds")
+    parser.add_argument("--output", default="engine_benchmark.json")
+    parser.add_argument("--chart", default="engine_benchmark.png")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    if args.command == "serve":
+        SERVE_FUNCS[args.engine](args.port)
+        sys.exit(0)
+
+    engines = [name.strip() for name in args.engines.split(",")]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engine(s): {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    results = run_benchmark(engines, levels, args.requests, args.port, args.timeout)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+    try:
+        plot(results, args.chart)
+    except ImportError:
+        print("matplotlib is not installed; skipping the chart (pip install matplotlib).")
@@ -1,78 +1,585 @@
+import os
+import errno
 import socket
 import select
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from email.utils import formatdate
 
-# Create a TCP server socket
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-# Allow port reuse so we don't get "Address already in use" errors during dev
-server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-# Bind the socket to an IP address and a specific port
-server_socket.bind(('127.0.0.1', 8000))
-
-# Start listening for incoming connections
-server_socket.listen()
-
-# **CRITICAL**: Make the server socket non-blocking. 
-# It will return immediately rather than waiting (blocking) if there's nothing to do.
-server_socket.setblocking(False)
-
-# Store connections in a list. The event loop will ask the OS to monitor these.
-sockets = [server_socket]
-
-print("Server running on http://127.0.0.1:8000")
-
-# The Infinite Event Loop
-while True:
-    # Ask the Operating System: "Which of these sockets are ready for me to read?"
-    # select.select() blocks the loop here until at least ONE socket is ready.
-    readable, writable, exceptional = select.select(sockets, [], [])
-
-    # Process every socket that the OS says is ready
-    for sock in readable:
-        
-        # Case 1: The ready socket is our main server. This means a NEW CLIENT is knocking.
-        if sock == server_socket:
-            # Accept the new connection
-            client_socket, client_address = server_socket.accept()
-            
-            # Make the new client socket non-blocking too
-            client_socket.setblocking(False)
-            
-            # Add the new client to our list so the loop monitors it next time
-            sockets.append(client_socket)
-            print(f"Accepted connection from {client_address}")
-            
-        # Case 2: The ready socket is a client. This means they sent HTTP data.
+from timer_wheel import TimerWheel
+from static_files import FileCache, resolve_path, parse_range
+from loop_metrics import LoopMetrics, SampledLogger
+from coroutine_runtime import Runtime, TaskCancelled, sleep, sock_connect, sock_sendall, sock_recv_all
+
+HOST = '127.0.0.1'
+PORT = 8000
+
+# --- Connection deadlines (seconds) ---
+# Without these a Slowloris client can hold a socket (and a file descriptor) open forever.
+HEADER_TIMEOUT = 10.0   # The full request headers must arrive within this long of connecting
+IDLE_TIMEOUT = 5.0      # Maximum silence allowed between two chunks from the client (or two writes to it)
+REQUEST_TIMEOUT = 30.0  # Hard cap on the whole lifetime of a connection
+MAX_HEADER_BYTES = 8192 # Refuse to buffer more than this while waiting for "\r\n\r\n"
+
+# --- Accepting connections ---
+LISTEN_BACKLOG = 1024   # How many finished handshakes the kernel may queue up for us to accept()
+ACCEPT_BATCH = 64       # Most connections accepted per wakeup, so a connect storm can't starve existing clients
+# select() cannot watch a file descriptor numbered FD_SETSIZE or higher: it raises ValueError.
+# Clients may only use descriptors below FD_SETSIZE - FD_RESERVED, which leaves the rest for
+# the listener, the wakeup socketpair and the backend sockets coroutine handlers open.
+FD_SETSIZE = 1024
+FD_RESERVED = 128
+MAX_CONNECTIONS = FD_SETSIZE - FD_RESERVED  # Admission control: beyond this, new clients get an immediate 503
+
+# --- Static files ---
+STATIC_PREFIX = "/static/"
+SEND_CHUNK = 512 * 1024 # Bytes handed to the kernel per write-readiness event, so one big file can't hog the loop
+
+# --- Offloading blocking handlers ---
+OFFLOAD_THREADS = 16    # Workers for handlers marked @blocking() (slow I/O that would block the loop)
+OFFLOAD_PROCESSES = os.cpu_count() or 2  # Workers for @blocking(pool="process") (CPU-heavy, needs its own GIL)
+
+# --- Backend used by the /backend coroutine handler ---
+BACKEND = ('127.0.0.1', 8001)
+
+REASONS = {
+    200: "OK", 206: "Partial Content", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 408: "Request Timeout", 416: "Range Not Satisfiable",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error", 502: "Bad Gateway",
+    503: "Service Unavailable",
+}
+
+
+class Connection:
+    """Everything the loop needs to remember about one client between select() calls."""
+
+    def __init__(self, sock, address, now):
+        self.sock = sock
+        self.address = address
+        self.inbuf = bytearray()
+        self.accepted_at = now
+        self.last_activity = now
+        self.headers_done = False
+        # Set once a response is queued (even one sent before the headers finished, like a 431);
+        # from then on the connection's bytes belong to that response
+        self.responded = False
+
+        # The response being written: a header/body buffer, optionally followed by a slice of a file
+        self.outbuf = bytearray()
+        self.file = None
+        self.file_offset = 0
+        self.file_remaining = 0
+
+        # The coroutine handler, or the pool future, working on this request if it needed one
+        self.task = None
+        self.future = None
+
+    @property
+    def busy(self):
+        return self.task is not None or self.future is not None
+
+    def next_deadline(self):
+        """The earliest moment at which one of this connection's deadlines could trip."""
+        deadline = self.accepted_at + REQUEST_TIMEOUT
+        if not self.busy:
+            # The client is silent while a handler works for it; that is not idling
+            deadline = min(deadline, self.last_activity + IDLE_TIMEOUT)
+        if not self.headers_done:
+            deadline = min(deadline, self.accepted_at + HEADER_TIMEOUT)
+        return deadline
+
+    def expired(self, now):
+        """Returns the name of the deadline that has passed, or None if the connection is still healthy."""
+        if not self.headers_done and now - self.accepted_at >= HEADER_TIMEOUT:
+            return "header-read timeout"
+        if not self.busy and now - self.last_activity >= IDLE_TIMEOUT:
+            return "idle timeout"
+        if now - self.accepted_at >= REQUEST_TIMEOUT:
+            return "request timeout"
+        return None
+
+
+def parse_request(head):
+    """Splits raw header bytes into (method, path, headers). Header names are lower-cased."""
+    lines = head.decode('latin-1').split("\r\n")
+    method, target, _version = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return method, target.split("?", 1)[0], headers
+
+
+def build_head(status, headers):
+    lines = [f"HTTP/1.1 {status} {REASONS[status]}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+
+
+# --- Coroutine handlers ---
+# These run as tasks on the coroutine runtime, so they can wait for sockets or timers
+# as many times as they like without holding up any other client. Each returns (status, body).
+
+async def sleep_handler(method, path, headers):
+    """Waits a full second, yet thousands of these can be in flight at once."""
+    await sleep(1.0)
+    return 200, b"Slept for 1s without blocking anyone!"
+
+
+async def backend_handler(method, path, headers):
+    """Multi-step I/O: connect to a backend server, forward a request, relay the response body."""
+    backend = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        if backend.fileno() >= FD_SETSIZE:
+            # Parking on it would crash the loop's select() call; fail this request (502) instead
+            raise OSError(errno.EMFILE, "No file descriptor select() can watch is free for the backend")
+        await sock_connect(backend, BACKEND)
+        await sock_sendall(backend, f"GET / HTTP/1.1\r\nHost: {BACKEND[0]}\r\n\r\n".encode('utf-8'))
+        response = await sock_recv_all(backend)
+    finally:
+        backend.close()
+    _head, _, body = response.partition(b"\r\n\r\n")
+    return 200, body
+
+
+# --- Blocking handlers ---
+# Plain functions that block (sleep, legacy drivers, heavy CPU). Marked with @blocking they
+# run in a worker pool instead of on the loop, and the loop is woken when they finish.
+
+def blocking(pool="thread"):
+    """Marks a handler to run in the thread pool, or in the process pool for CPU-bound work."""
+    def mark(handler):
+        handler.blocking_pool = pool
+        return handler
+    return mark
+
+
+@blocking()
+def blocking_io_handler(method, path, headers):
+    """Stands in for a blocking client library (e.g. a synchronous database driver)."""
+    time.sleep(0.5)
+    return 200, b"Finished 0.5s of blocking I/O in a worker thread."
+
+
+@blocking(pool="process")
+def cpu_handler(method, path, headers):
+    """Pure-Python number crunching holds the GIL, so it gets a process of its own."""
+    total = sum(i * i for i in range(2_000_000))
+    return 200, f"Sum of squares below 2,000,000 = {total}".encode('utf-8')
+
+
+ROUTES = {
+    "/sleep": sleep_handler,
+    "/backend": backend_handler,
+    "/blocking": blocking_io_handler,
+    "/cpu": cpu_handler,
+}
+
+
+def main(host=HOST, port=PORT, static_dir=None, copy_mode="sendfile", log_sample=1,
+         backlog=LISTEN_BACKLOG, accept_batch=ACCEPT_BATCH, max_connections=MAX_CONNECTIONS,
+         threads=OFFLOAD_THREADS, processes=OFFLOAD_PROCESSES):
+    if not 0 < max_connections <= MAX_CONNECTIONS:
+        raise ValueError(f"max_connections must be between 1 and {MAX_CONNECTIONS} (select() stops at "
+                         f"file descriptor {FD_SETSIZE}), got {max_connections}")
+    # Create a TCP server socket
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    # Allow port reuse so we don't get "Address already in use" errors during dev
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    # Bind the socket to an IP address and a specific port
+    server_socket.bind((host, port))
+
+    # Start listening for incoming connections. The backlog is how many completed TCP
+    # handshakes the kernel holds for us; a burst larger than this gets SYNs dropped and
+    # clients retrying after a full second. (The kernel caps it at net.core.somaxconn.)
+    server_socket.listen(backlog)
+
+    # **CRITICAL**: Make the server socket non-blocking.
+    # It will return immediately rather than waiting (blocking) if there's nothing to do.
+    server_socket.setblocking(False)
+
+    # Store connections in a list. The event loop will ask the OS to monitor these.
+    sockets = [server_socket]
+    # Sockets with a response still to flush. We watch these for WRITE readiness instead.
+    writers = []
+    # Per-client state, keyed by socket
+    connections = {}
+    # One timer per connection, armed at its earliest deadline.
+    # Reads never touch the wheel: when a timer fires we re-check the real deadlines
+    # and simply re-arm it if the client was active in the meantime (O(1) amortised).
+    timers = TimerWheel()
+    # Hot files stay open so serving them costs no open()/stat() syscalls
+    file_cache = FileCache()
+    # Counters and histograms served at /metrics, and a logger that only prints 1 in 'log_sample' lines
+    metrics = LoopMetrics()
+    log = SampledLogger(log_sample)
+    # Coroutine handlers park here while they wait; their sockets join our select() call
+    runtime = Runtime()
+    # Worker pools for @blocking handlers. The process pool is only started if a route needs it.
+    pools = {"thread": ThreadPoolExecutor(max_workers=threads), "process": None}
+    # Finished pool jobs, appended from worker threads. A deque is safe to share without a lock.
+    completed = deque()
+    # The self-pipe trick: select() can only wait on sockets, so a worker that finishes
+    # writes one byte here, which makes 'wakeup_reader' readable and wakes the loop up.
+    wakeup_reader, wakeup_writer = socket.socketpair()
+    wakeup_reader.setblocking(False)
+    wakeup_writer.setblocking(False)
+    sockets.append(wakeup_reader)
+
+    # Built once: refusing a connection should cost one send() and one close(), nothing more
+    reject_response = build_head(503, {"Retry-After": 1, "Content-Length": 0})
+
+    def close_connection(conn, reason, message):
+        timers.cancel(conn)
+        if conn.task is not None:
+            runtime.cancel(conn.task)
+        if conn.future is not None:
+            # Too late to stop a job that already started; its result will just be dropped
+            conn.future.cancel()
+            conn.future = None
+        if conn.sock in writers:
+            writers.remove(conn.sock)
+        elif conn.sock in sockets:
+            sockets.remove(conn.sock)
+        if conn.file is not None:
+            file_cache.release(conn.file)
+            conn.file = None
+        del connections[conn.sock]
+        conn.sock.close()
+        metrics.on_close(reason)
+        log(message)
+
+    def respond(conn, status, headers=None, body=b"", file=None, offset=0, length=0):
+        """Queues a response and switches the connection from reading to writing."""
+        conn.responded = True
+        conn.outbuf += build_head(status, headers or {"Content-Type": "text/plain", "Content-Length": len(body)})
+        conn.outbuf += body
+        conn.file, conn.file_offset, conn.file_remaining = file, offset, length
+        if conn.sock in sockets:
+            sockets.remove(conn.sock)
+        writers.append(conn.sock)
+        metrics.on_response(status)
+
+    def serve_static(conn, method, path, headers):
+        file_path = resolve_path(static_dir, path[len(STATIC_PREFIX):]) if static_dir else None
+        if file_path is None:
+            respond(conn, 404, body=b"Not Found")
+            return
+        try:
+            cached = file_cache.acquire(file_path)
+        except OSError:
+            respond(conn, 404, body=b"Not Found")
+            return
+
+        file_headers = {
+            "Content-Type": cached.content_type,
+            "Accept-Ranges": "bytes",
+            "Last-Modified": formatdate(cached.mtime, usegmt=True),
+        }
+        try:
+            byte_range = parse_range(headers.get("range"), cached.size)
+        except ValueError:
+            file_cache.release(cached)
+            file_headers["Content-Range"] = f"bytes */{cached.size}"
+            file_headers["Content-Length"] = 0
+            respond(conn, 416, file_headers)
+            return
+
+        if byte_range is None:
+            status, start, length = 200, 0, cached.size
+        else:
+            start, end = byte_range
+            status, length = 206, end - start + 1
+            file_headers["Content-Range"] = f"bytes {start}-{end}/{cached.size}"
+        file_headers["Content-Length"] = length
+
+        if method == "HEAD":
+            file_cache.release(cached)
+            respond(conn, status, file_headers)
         else:
+            respond(conn, status, file_headers, file=cached, offset=start, length=length)
+
+    def start_task(conn, coro):
+        """Hands the request to a coroutine; the response is queued whenever it finishes."""
+        def on_done(task):
+            conn.task = None
+            if isinstance(task.exception, TaskCancelled):
+                return  # The connection was closed (e.g. timed out) while the handler ran
+            if task.exception is not None:
+                status = 502 if isinstance(task.exception, OSError) else 500
+                respond(conn, status, body=f"{REASONS[status]}: {task.exception}".encode('utf-8'))
+            else:
+                status, body = task.result
+                respond(conn, status, body=body)
+
+        # Stop reading from the client while the handler works for it
+        sockets.remove(conn.sock)
+        conn.task = runtime.spawn(coro, on_done)
+
+    def wake_loop():
+        try:
+            wakeup_writer.send(b"\0")
+        except OSError:
+            pass  # Buffer full: the loop already has a wakeup pending
+
+    def offload(conn, pool_name, handler, *args):
+        """Runs a blocking handler in a worker pool; finish_offloaded() queues its response."""
+        if pools[pool_name] is None:
+            pools[pool_name] = ProcessPoolExecutor(max_workers=processes)
+
+        def on_done(future):
+            # Runs on a worker thread: touch nothing but the deque and the wakeup socket
+            completed.append((conn, future))
+            wake_loop()
+
+        # Stop reading from the client while the worker handles it
+        sockets.remove(conn.sock)
+        conn.future = pools[pool_name].submit(handler, *args)
+        conn.future.add_done_callback(on_done)
+
+    def finish_offloaded():
+        while completed:
+            conn, future = completed.popleft()
+            if conn.future is not future:
+                continue  # The connection was closed (e.g. timed out) while the job ran
+            conn.future = None
             try:
-                # Read up to 1024 bytes of data from the client
-                request_data = sock.recv(1024)
-                
-                if request_data:
-                    # We received a request! Let's send a basic HTTP response back.
-                    http_response = (
-                        "HTTP/1.1 200 OK\r\n"
-                        "Content-Type: text/plain\r\n"
-                        "Connection: close\r\n"
-                        "\r\n"
-                        "Hello from the event loop!"
-                    )
-                    sock.sendall(http_response.encode('utf-8'))
-                    
-                    # Since we are done responding, remove the socket and close it
-                    sockets.remove(sock)
-                    sock.close()
-                    print("Handled request and disconnected client.")
-                    
-                else:
-                    # recv() returned empty bytes. The client gracefully disconnected.
-                    print("Client disconnected automatically.")
-                    sockets.remove(sock)
-                    sock.close()
-            
-            except ConnectionResetError:
-                # The client forcefully aborted the connection
-                print("Client abruptly dropped the connection.")
-                sockets.remove(sock)
-                sock.close()
+                status, body = future.result()
+            except Exception as e:
+                status, body = 500, f"{REASONS[500]}: {e}".encode('utf-8')
+            respond(conn, status, body=body)
+
+    def handle_request(conn):
+        head = bytes(conn.inbuf[:conn.inbuf.index(b"\r\n\r\n")])
+        try:
+            method, path, headers = parse_request(head)
+        except ValueError:
+            respond(conn, 400, body=b"Bad Request")
+            return
+
+        if path == "/metrics":
+            body = metrics.render(time.monotonic()).encode('utf-8')
+            respond(conn, 200, {"Content-Type": "text/plain; version=0.0.4", "Content-Length": len(body)}, body)
+        elif path.startswith(STATIC_PREFIX):
+            if method not in ("GET", "HEAD"):
+                respond(conn, 405, {"Allow": "GET, HEAD", "Content-Length": 0})
+            else:
+                serve_static(conn, method, path, headers)
+        elif path in ROUTES:
+            handler = ROUTES[path]
+            pool_name = getattr(handler, "blocking_pool", None)
+            if pool_name is not None:
+                offload(conn, pool_name, handler, method, path, headers)
+            else:
+                start_task(conn, handler(method, path, headers))
+        else:
+            respond(conn, 200, body=b"Hello from the event loop!")
+
+    def flush(conn):
+        """
+        Writes as much of the pending response as the kernel will take right now.
+        Returns True once everything has been sent.
+        """
+        if conn.outbuf:
+            sent = conn.sock.send(conn.outbuf)
+            del conn.outbuf[:sent]
+            metrics.bytes_out += sent
+            if conn.outbuf:
+                return False
+
+        if conn.file_remaining:
+            count = min(conn.file_remaining, SEND_CHUNK)
+            if copy_mode == "sendfile":
+                # Zero-copy: the kernel moves page-cache pages straight into the socket buffer
+                sent = os.sendfile(conn.sock.fileno(), conn.file.fd, conn.file_offset, count)
+            else:
+                # User-space copy: read the bytes into Python, then write them back into the kernel
+                sent = conn.sock.send(os.pread(conn.file.fd, count, conn.file_offset))
+            if sent == 0:
+                # The file shrank underneath us; there is nothing more to send
+                conn.file_remaining = 0
+            metrics.bytes_out += sent
+            conn.file_offset += sent
+            conn.file_remaining -= sent
+
+        return not conn.file_remaining
+
+    print(f"Server running on http://{host}:{port}")
+    if static_dir:
+        print(f"Serving files from {os.path.abspath(static_dir)} at {STATIC_PREFIX} using {copy_mode}")
+
+    # The Infinite Event Loop
+    while True:
+        # Ask the Operating System: "Which of these sockets are ready for me to read or write?"
+        # select.select() blocks until at least ONE socket is ready, or until the timer
+        # wheel or a sleeping coroutine needs attention (None = nothing armed, block forever).
+        now = time.monotonic()
+        timeouts = [t for t in (timers.next_timeout(now), runtime.next_timeout(now)) if t is not None]
+        timeout = min(timeouts) if timeouts else None
+        readable, writable, exceptional = select.select(
+            sockets + runtime.read_socks(), writers + runtime.write_socks(), [], timeout)
+        now = time.monotonic()
+        requests_this_wakeup = 0
+
+        # Process every socket that the OS says is ready
+        for sock in readable:
+
+            # Case 1: The ready socket is our main server. This means NEW CLIENTS are knocking.
+            if sock == server_socket:
+                # Drain the kernel's accept queue instead of taking one client per wakeup,
+                # but stop after 'accept_batch' so existing clients still get served promptly.
+                for _ in range(accept_batch):
+                    try:
+                        # Accept the new connection
+                        client_socket, client_address = server_socket.accept()
+                    except BlockingIOError:
+                        break  # EAGAIN: the accept queue is empty
+                    except OSError as e:
+                        # e.g. EMFILE: out of file descriptors. Leave the rest queued for later.
+                        log(f"accept() failed: {e}")
+                        break
+
+                    if len(connections) >= max_connections or client_socket.fileno() >= FD_SETSIZE - FD_RESERVED:
+                        # Admission control: refuse immediately without ever registering the socket.
+                        # Cached files and backend sockets take descriptors too, so a client can land
+                        # on one select() could not watch even below the connection limit.
+                        try:
+                            client_socket.send(reject_response)
+                        except OSError:
+                            pass
+                        client_socket.close()
+                        metrics.on_reject()
+                        continue
+
+                    # Make the new client socket non-blocking too
+                    client_socket.setblocking(False)
+
+                    # Add the new client to our list so the loop monitors it next time
+                    sockets.append(client_socket)
+                    conn = Connection(client_socket, client_address, now)
+                    connections[client_socket] = conn
+                    timers.schedule(conn, conn.next_deadline())
+                    metrics.on_accept(now)
+                    log(f"Accepted connection from {client_address}")
+
+            # Case 2: The ready socket is a client. This means they sent HTTP data.
+            elif sock in connections:
+                conn = connections[sock]
+                try:
+                    # Read up to 1024 bytes of data from the client
+                    request_data = sock.recv(1024)
+
+                    if request_data:
+                        conn.last_activity = now
+                        conn.inbuf += request_data
+                        metrics.bytes_in += len(request_data)
+
+                        # Keep buffering until the blank line that ends the HTTP headers arrives
+                        if b"\r\n\r\n" not in conn.inbuf:
+                            if len(conn.inbuf) > MAX_HEADER_BYTES:
+                                respond(conn, 431, {"Content-Length": 0})
+                            continue
+                        conn.headers_done = True
+
+                        # We received a full request! Queue the response; the write
+                        # readiness branch below sends it once the socket can take it.
+                        handle_request(conn)
+                        requests_this_wakeup += 1
+
+                    else:
+                        # recv() returned empty bytes. The client gracefully disconnected.
+                        close_connection(conn, "client-closed", "Client disconnected automatically.")
+
+                except ConnectionResetError:
+                    # The client forcefully aborted the connection
+                    close_connection(conn, "reset", "Client abruptly dropped the connection.")
+
+            # A worker thread finished a job and poked the self-pipe; swallow the wakeup bytes
+            elif sock is wakeup_reader:
+                try:
+                    while wakeup_reader.recv(4096):
+                        pass
+                except BlockingIOError:
+                    pass
+
+            # Case 3: A socket a coroutine handler is waiting on (e.g. a backend connection)
+            elif sock in runtime.readers:
+                runtime.on_readable(sock)
+
+        # Case 4: A socket with a pending response has room in its send buffer
+        for sock in writable:
+            if sock not in connections:
+                # ...or one a coroutine handler is waiting to write to
+                if sock in runtime.writers:
+                    runtime.on_writable(sock)
+                continue
+            conn = connections[sock]
+            try:
+                done = flush(conn)
+            except BlockingIOError:
+                continue
+            except (ConnectionResetError, BrokenPipeError):
+                close_connection(conn, "reset", "Client went away mid-response.")
+                continue
+            conn.last_activity = now
+            if done:
+                # Since we are done responding, remove the socket and close it
+                close_connection(conn, "done", "Handled request and disconnected client.")
+
+        # Resume every coroutine whose socket became ready or whose sleep is over
+        runtime.run_ready(now)
+        # Queue responses for pool jobs that finished since the last pass
+        finish_offloaded()
+
+        # Fire any timers whose bucket the wheel hand has passed
+        for conn in timers.advance(now):
+            reason = conn.expired(now)
+            if reason is None:
+                # The client was active since we armed it; push the timer out to the new deadline
+                timers.schedule(conn, conn.next_deadline())
+                continue
+            if not conn.headers_done and not conn.responded:
+                # A 408 written now would be spliced into a response still being flushed
+                try:
+                    conn.sock.send(build_head(408, {"Content-Length": 0}))
+                except OSError:
+                    pass
+            close_connection(conn, reason, f"Closed {conn.address}: {reason}.")
+
+        # Everything after select() returned is time other clients spent waiting on us
+        metrics.on_iteration(requests_this_wakeup, time.monotonic() - now)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A raw select() event loop HTTP server.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--backlog", type=int, default=LISTEN_BACKLOG, help="listen() backlog")
+    parser.add_argument("--accept-batch", type=int, default=ACCEPT_BATCH, help="Max accepts per loop wakeup")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS,
+                        help=f"Connections beyond this are answered with 503 and closed (at most {MAX_CONNECTIONS})")
+    parser.add_argument("--threads", type=int, default=OFFLOAD_THREADS, help="Thread pool size for @blocking handlers")
+    parser.add_argument("--processes", type=int, default=OFFLOAD_PROCESSES,
+                        help="Process pool size for @blocking(pool='process') handlers")
+    parser.add_argument("--backend", default=f"{BACKEND[0]}:{BACKEND[1]}", help="host:port proxied by /backend")
+    parser.add_argument("--static-dir", help=f"Serve files from this directory under {STATIC_PREFIX}")
+    parser.add_argument("--copy-mode", choices=["sendfile", "read"],
+                        default="sendfile" if hasattr(os, "sendfile") else "read",
+                        help="sendfile = kernel-side zero-copy, read = pread() into user space then send()")
+    parser.add_argument("--log-sample", type=int, default=1, metavar="N",
+                        help="Print only 1 in N per-connection log lines (0 = silent, best for benchmarks)")
+    args = parser.parse_args()
+    if not 0 < args.max_connections <= MAX_CONNECTIONS:
+        parser.error(f"--max-connections must be between 1 and {MAX_CONNECTIONS}: select() cannot watch "
+                     f"file descriptors numbered {FD_SETSIZE} or above")
+    backend_host, _, backend_port = args.backend.rpartition(":")
+    BACKEND = (backend_host, int(backend_port))
+    main(host=args.host, port=args.port, static_dir=args.static_dir, copy_mode=args.copy_mode,
+         log_sample=args.log_sample, backlog=args.backlog, accept_batch=args.accept_batch,
+         max_connections=args.max_connections, threads=args.threads, processes=args.processes)
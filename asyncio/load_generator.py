@@ -0,0 +1,243 @@
+"""
+An asyncio load generator for event_loop_server.py.
+
+simulate_clients.py walks through the four client behaviours one at a time so you
+can read the server's reaction. This script fires the same four behaviours from
+thousands of concurrent connections and reports throughput, errors and latency
+percentiles as JSON, so every server change can be measured against the last one.
+
+Example:
+    python load_generator.py --connections 2000 --requests 50000 --mix normal=90,slow=4,abrupt=3,reset=3
+"""
+import sys
+import json
+import math
+import time
+import random
+import socket
+import struct
+import asyncio
+import argparse
+from array import array
+
+SCENARIOS = ("normal", "slow", "abrupt", "reset")
+
+
+async def scenario_normal(host, port, path, slow_delay):
+    """Scenario 1: A normal quick HTTP request. Returns the response status code."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('utf-8'))
+        await writer.drain()
+        return _status_of(await reader.read())
+    finally:
+        writer.close()
+
+
+async def scenario_slow(host, port, path, slow_delay):
+    """Scenario 2: Sends the request line, goes quiet for 'slow_delay' seconds, then finishes (Slowloris style)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\n".encode('utf-8'))
+        await writer.drain()
+        await asyncio.sleep(slow_delay)
+        writer.write(f"Host: {host}\r\n\r\n".encode('utf-8'))
+        await writer.drain()
+        return _status_of(await reader.read())
+    finally:
+        writer.close()
+
+
+async def scenario_abrupt(host, port, path, slow_delay):
+    """Scenario 3: Connects and immediately closes without sending anything (graceful FIN)."""
+    _reader, writer = await asyncio.open_connection(host, port)
+    writer.close()
+    await writer.wait_closed()
+    return None
+
+
+async def scenario_reset(host, port, path, slow_delay):
+    """Scenario 4: Connects and forcefully resets the connection (TCP RST via SO_LINGER=0)."""
+    _reader, writer = await asyncio.open_connection(host, port)
+    writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+    writer.transport.abort()
+    return None
+
+
+SCENARIO_FUNCS = {
+    "normal": scenario_normal,
+    "slow": scenario_slow,
+    "abrupt": scenario_abrupt,
+    "reset": scenario_reset,
+}
+
+
+def _status_of(response):
+    """Extracts the status code from a raw HTTP response ('HTTP/1.1 200 OK...')."""
+    try:
+        return int(response.split(b" ", 2)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def parse_mix(text):
+    """Parses 'normal=90,slow=10' into {'normal': 90.0, 'slow': 10.0}."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}', expected one of {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return round(sorted_values[rank - 1], 3)
+
+
+def latency_summary(latencies_ms):
+    values = sorted(latencies_ms)
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 3) if values else None,
+        "p50_ms": percentile(values, 50),
+        "p99_ms": percentile(values, 99),
+        "p999_ms": percentile(values, 99.9),
+        "max_ms": round(values[-1], 3) if values else None,
+    }
+
+
+class Stats:
+    """Results for one scenario. Latencies live in a compact array('d') so a million samples stay small."""
+
+    def __init__(self):
+        self.ok = 0
+        self.latencies_ms = array('d')
+        self.errors = {}
+        self.statuses = {}
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+async def run_load(host="127.0.0.1", port=8000, connections=100, requests=1000, duration=None,
+                   mix=None, path="/", slow_delay=2.0, timeout=10.0, seed=None):
+    """
+    Keeps 'connections' clients busy until 'requests' operations have finished
+    (or 'duration' seconds have passed) and returns the report as a dict.
+    """
+    mix = mix or {"normal": 1.0}
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    rng = random.Random(seed)
+    stats = {name: Stats() for name in names}
+    remaining = [requests]
+    deadline = time.monotonic() + duration if duration else None
+
+    async def client():
+        while True:
+            if deadline is not None:
+                if time.monotonic() >= deadline:
+                    return
+            elif remaining[0] <= 0:
+                return
+            remaining[0] -= 1
+
+            name = rng.choices(names, weights)[0]
+            result = stats[name]
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(SCENARIO_FUNCS[name](host, port, path, slow_delay), timeout)
+            except asyncio.TimeoutError:
+                result.error("timeout")
+                continue
+            except ConnectionRefusedError:
+                result.error("refused")
+                continue
+            except ConnectionResetError:
+                result.error("reset")
+                continue
+            except OSError as e:
+                result.error(type(e).__name__)
+                continue
+            result.latencies_ms.append((time.perf_counter() - start) * 1000)
+            if status is not None:
+                result.statuses[status] = result.statuses.get(status, 0) + 1
+                if status != 200:
+                    result.error(f"http_{status}")
+                    continue
+            result.ok += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+
+    all_latencies = array('d')
+    for result in stats.values():
+        all_latencies.extend(result.latencies_ms)
+    total_ok = sum(result.ok for result in stats.values())
+    total_errors = sum(sum(result.errors.values()) for result in stats.values())
+    return {
+        "target": f"{host}:{port}{path}",
+        "connections": connections,
+        "mix": mix,
+        "elapsed_s": round(elapsed, 3),
+        "completed": total_ok,
+        "errors": total_errors,
+        "throughput_rps": round(total_ok / elapsed, 1) if elapsed else None,
+        "latency": latency_summary(all_latencies),
+        "scenarios": {
+            name: {
+                "completed": result.ok,
+                "errors": result.errors,
+                "statuses": {str(code): count for code, count in sorted(result.statuses.items())},
+                "latency": latency_summary(result.latencies_ms),
+            }
+            for name, result in stats.items()
+        },
+    }
+
+
+def raise_fd_limit():
+    """Thousands of concurrent sockets need thousands of file descriptors; lift the soft limit to the hard one."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load generator for the raw event loop server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--connections", type=int, default=100, help="Number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=1000, help="Total operations to run (ignored with --duration)")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of a fixed count")
+    parser.add_argument("--mix", default="normal=1", help="Weighted scenario mix, e.g. normal=90,slow=4,abrupt=3,reset=3")
+    parser.add_argument("--slow-delay", type=float, default=2.0, help="Pause inside a slow request, in seconds")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-operation timeout, in seconds")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    report = asyncio.run(run_load(
+        host=args.host, port=args.port, connections=args.connections, requests=args.requests,
+        duration=args.duration, mix=parse_mix(args.mix), path=args.path,
+        slow_delay=args.slow_delay, timeout=args.timeout, seed=args.seed,
+    ))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    sys.exit(1 if report["completed"] == 0 else 0)
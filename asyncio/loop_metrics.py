@@ -0,0 +1,155 @@
+import time
+from bisect import bisect_left
+from collections import deque
+
+
+class Histogram:
+    """A fixed-bucket histogram in the Prometheus style: observe() is one bisect and one increment."""
+
+    def __init__(self, name, help_text, bounds):
+        self.name = name
+        self.help_text = help_text
+        self.bounds = list(bounds)
+        # One slot per bound plus the implicit +Inf bucket
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.total:.6f}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class RateMeter:
+    """Events per second over a sliding window of whole-second buckets."""
+
+    def __init__(self, window=10):
+        self.window = window
+        self.buckets = deque()  # (second, count), oldest first
+
+    def mark(self, now, n=1):
+        second = int(now)
+        if self.buckets and self.buckets[-1][0] == second:
+            self.buckets[-1][1] += n
+        else:
+            self.buckets.append([second, n])
+        self._trim(second)
+
+    def rate(self, now):
+        self._trim(int(now))
+        return sum(count for _, count in self.buckets) / self.window
+
+    def _trim(self, second):
+        while self.buckets and self.buckets[0][0] <= second - self.window:
+            self.buckets.popleft()
+
+
+class LoopMetrics:
+    """
+    Counters and histograms describing what the event loop is doing.
+
+    Everything here is plain integer/float arithmetic on the loop thread (no locks,
+    no I/O), so recording a metric is far cheaper than the print() it replaces.
+    render() produces the Prometheus text exposition format served at /metrics.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.accepts = 0
+        self.accept_rate = RateMeter()
+        self.rejected = 0
+        self.active_connections = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.requests = 0
+        self.responses = {}  # status code -> count
+        self.closes = {}     # reason -> count
+        self.wakeups = 0
+        self.requests_per_wakeup = Histogram(
+            "loop_requests_per_wakeup", "Requests dispatched per select() wakeup.",
+            [0, 1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.iteration_seconds = Histogram(
+            "loop_iteration_seconds", "Time spent processing one loop iteration, excluding the select() wait.",
+            [0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25])
+
+    def on_accept(self, now):
+        self.accepts += 1
+        self.accept_rate.mark(now)
+        self.active_connections += 1
+
+    def on_reject(self):
+        self.rejected += 1
+
+    def on_close(self, reason):
+        self.active_connections -= 1
+        self.closes[reason] = self.closes.get(reason, 0) + 1
+
+    def on_response(self, status):
+        self.responses[status] = self.responses.get(status, 0) + 1
+
+    def on_iteration(self, requests, busy_seconds):
+        self.wakeups += 1
+        self.requests += requests
+        self.requests_per_wakeup.observe(requests)
+        self.iteration_seconds.observe(busy_seconds)
+
+    def render(self, now):
+        lines = [
+            "# TYPE loop_uptime_seconds gauge",
+            f"loop_uptime_seconds {now - self.started_at:.3f}",
+            "# TYPE loop_accepts_total counter",
+            f"loop_accepts_total {self.accepts}",
+            "# TYPE loop_accepts_per_second gauge",
+            f"loop_accepts_per_second {self.accept_rate.rate(now):.2f}",
+            "# TYPE loop_accepts_rejected_total counter",
+            f"loop_accepts_rejected_total {self.rejected}",
+            "# TYPE loop_active_connections gauge",
+            f"loop_active_connections {self.active_connections}",
+            "# TYPE loop_bytes_in_total counter",
+            f"loop_bytes_in_total {self.bytes_in}",
+            "# TYPE loop_bytes_out_total counter",
+            f"loop_bytes_out_total {self.bytes_out}",
+            "# TYPE loop_wakeups_total counter",
+            f"loop_wakeups_total {self.wakeups}",
+            "# TYPE loop_requests_total counter",
+            f"loop_requests_total {self.requests}",
+            "# TYPE loop_responses_total counter",
+        ]
+        lines += [f'loop_responses_total{{status="{status}"}} {count}' for status, count in sorted(self.responses.items())]
+        lines.append("# TYPE loop_connections_closed_total counter")
+        lines += [f'loop_connections_closed_total{{reason="{reason}"}} {count}' for reason, count in sorted(self.closes.items())]
+        lines += self.requests_per_wakeup.render()
+        lines += self.iteration_seconds.render()
+        return "\n".join(lines) + "\n"
+
+
+class SampledLogger:
+    """
+    Prints only one in every 'sample_every' messages (0 disables logging entirely).
+
+    Printing a line per connection is a blocking write to the terminal on the hot
+    path; under load it can cost more than handling the request itself.
+    """
+
+    def __init__(self, sample_every=0):
+        self.sample_every = sample_every
+        self.seen = 0
+
+    def __call__(self, message):
+        if not self.sample_every:
+            return
+        self.seen += 1
+        if self.seen % self.sample_every == 0:
+            print(message)
@@ -0,0 +1,130 @@
+import os
+import time
+import mimetypes
+from collections import OrderedDict
+
+
+class CachedFile:
+    """An open file descriptor plus the stat() result we took when opening it."""
+
+    def __init__(self, path, fd, stat_result, now):
+        self.path = path
+        self.fd = fd
+        self.size = stat_result.st_size
+        self.mtime = stat_result.st_mtime
+        self.identity = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.checked_at = now
+        # Number of in-flight responses still streaming from this fd
+        self.users = 0
+        self.evicted = False
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileCache:
+    """
+    Keeps hot files open so a request costs neither an open() nor a stat() syscall.
+
+    Every response streams with an explicit offset (os.sendfile / os.pread), never
+    the shared file position, so many connections can safely use the same fd at once.
+    Entries are re-validated with a stat() at most once every 'revalidate_after'
+    seconds, which catches files that were edited or replaced on disk.
+    """
+
+    def __init__(self, capacity=256, revalidate_after=1.0):
+        self.capacity = capacity
+        self.revalidate_after = revalidate_after
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, path):
+        """Returns a CachedFile for 'path' and pins it until release() is called. Raises OSError."""
+        now = time.monotonic()
+        entry = self.entries.get(path)
+        if entry is not None and now - entry.checked_at >= self.revalidate_after:
+            try:
+                st = os.stat(path)
+            except OSError:
+                # The file was deleted out from under us
+                self._evict(path)
+                raise
+            if (st.st_ino, st.st_mtime_ns, st.st_size) == entry.identity:
+                entry.checked_at = now
+            else:
+                self._evict(path)
+                entry = None
+
+        if entry is None:
+            self.misses += 1
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                st = os.fstat(fd)
+            except OSError:
+                os.close(fd)
+                raise
+            entry = CachedFile(path, fd, st, now)
+            self.entries[path] = entry
+            while len(self.entries) > self.capacity:
+                self._evict(next(iter(self.entries)))
+        else:
+            self.hits += 1
+            self.entries.move_to_end(path)
+
+        entry.users += 1
+        return entry
+
+    def release(self, entry):
+        entry.users -= 1
+        if entry.evicted and entry.users == 0:
+            entry.close()
+
+    def _evict(self, path):
+        entry = self.entries.pop(path)
+        entry.evicted = True
+        # Still being streamed to someone? The last release() closes it instead.
+        if entry.users == 0:
+            entry.close()
+
+
+def resolve_path(root, url_path):
+    """
+    Maps a URL path onto a file under 'root'.
+    Returns None if the path escapes the root (e.g. "/../../etc/passwd") or is not a regular file.
+    """
+    root = os.path.realpath(root)
+    candidate = os.path.realpath(os.path.join(root, url_path.lstrip("/")))
+    if os.path.commonpath([root, candidate]) != root or not os.path.isfile(candidate):
+        return None
+    return candidate
+
+
+def parse_range(header, size):
+    """
+    Parses a single-range 'Range: bytes=...' header against a file of 'size' bytes.
+
+    Returns (start, end) with 'end' inclusive, None if the whole file should be
+    served (no header, or a form we don't support such as multiple ranges), or
+    raises ValueError if the range cannot be satisfied (the caller answers 416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, dash, last = header[len("bytes="):].strip().partition("-")
+    # Syntactically invalid ranges are ignored, per RFC 9110
+    if not dash or not (first or last) or not (first.isdigit() or first == "") or not (last.isdigit() or last == ""):
+        return None
+    if first == "":
+        # "bytes=-500" means the final 500 bytes
+        start, end = max(0, size - int(last)), size - 1
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+    else:
+        start = int(first)
+        if last and int(last) < start:
+            return None  # "bytes=5-3" is invalid, not unsatisfiable: ignore it and serve the whole file
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, end
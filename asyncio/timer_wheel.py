@@ -0,0 +1,67 @@
+import time
+
+
+class TimerWheel:
+    """
+    A hashed timer wheel: a ring of buckets, each bucket covering one 'tick' of time.
+
+    Scheduling and cancelling a timer are both O(1): we hash the deadline into a
+    bucket and drop the entry into that bucket's set. Every tick the loop only
+    looks at the buckets the clock hand has moved past, so thousands of idle
+    connections cost nothing until their bucket comes around.
+    """
+
+    def __init__(self, tick=0.1, slots=512):
+        """
+        :param tick: Width of one bucket in seconds (the timer resolution).
+        :param slots: Number of buckets in the ring. A deadline further away than
+                      tick * slots simply waits for the hand to lap the ring again.
+        """
+        self.tick = tick
+        self.slots = slots
+        self.buckets = [set() for _ in range(slots)]
+        # Maps an entry to the absolute tick number it is due on
+        self.due_tick = {}
+        self.current_tick = int(time.monotonic() / tick)
+
+    def __len__(self):
+        return len(self.due_tick)
+
+    def schedule(self, entry, deadline):
+        """Arms (or re-arms) a timer for 'entry' at the absolute monotonic time 'deadline'."""
+        self.cancel(entry)
+        # Never schedule into a bucket the hand has already swept past
+        due = max(int(deadline / self.tick) + 1, self.current_tick + 1)
+        self.due_tick[entry] = due
+        self.buckets[due % self.slots].add(entry)
+
+    def cancel(self, entry):
+        due = self.due_tick.pop(entry, None)
+        if due is not None:
+            self.buckets[due % self.slots].discard(entry)
+
+    def next_timeout(self, now):
+        """
+        How long select() may sleep before the wheel needs attention.
+        Returns None (block forever) when no timers are armed.
+        """
+        if not self.due_tick:
+            return None
+        next_tick_at = (self.current_tick + 1) * self.tick
+        return max(0.0, next_tick_at - now)
+
+    def advance(self, now):
+        """Moves the hand up to 'now' and returns every entry whose tick has passed."""
+        target_tick = int(now / self.tick)
+        expired = []
+        # If we slept for longer than a full revolution, one lap covers every bucket
+        steps = min(target_tick - self.current_tick, self.slots)
+        for step in range(1, steps + 1):
+            bucket = self.buckets[(self.current_tick + step) % self.slots]
+            for entry in list(bucket):
+                if self.due_tick[entry] <= target_tick:
+                    bucket.discard(entry)
+                    del self.due_tick[entry]
+                    expired.append(entry)
+        self.current_tick = max(self.current_tick, target_tick)
+        return expired
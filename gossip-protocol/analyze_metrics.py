@@ -0,0 +1,335 @@
+"""
+Post-run analysis of experiment_metrics.csv (or .arrow), in bounded memory.
+
+The metrics file grows by one row per request, so a long run can hold tens of
+millions of rows, more than fits comfortably in a DataFrame. This reads it
+`chunk_rows` at a time and folds each chunk into running aggregates:
+
+  - latency histograms per group, with the same log-linear buckets as
+    LatencyHistogram (~3% error), so percentiles stay exact to a bucket however
+    many rows went in and merging chunks is adding counts
+  - ok / error / stale-read counts per group
+  - ok and error counts per (scenario, second), for throughput over time
+
+The aggregates are grouped three ways: by (scenario, operation, CL,
+coordinator), by (scenario, operation, CL), and by (scenario, active faults).
+Each chunk is bucketed with NumPy and counted with np.bincount, with no
+Python loop over rows. Memory is one chunk plus the aggregates, whose size
+depends on how many groups and seconds a run has, not on how many rows.
+
+Output (in --output-dir): a CSV per grouping, throughput.csv, latency.png,
+throughput.png, and report.html with the tables and both charts inlined.
+
+    python analyze_metrics.py experiment_metrics.csv --chunk-rows 1000000 --window 10
+"""
+import io
+import os
+import sys
+import time
+import base64
+import argparse
+import numpy as np
+import pandas as pd
+from latency_histogram import LatencyHistogram, SUB_BUCKET_BITS, SUB_BUCKETS
+
+MAX_BUCKET = SUB_BUCKETS + 40 * SUB_BUCKETS  # Room for latencies up to 2^45 us (about a year)
+GROUPINGS = {
+    "by_coordinator": ("scenario", "operation", "consistency_level", "coordinator_ip"),
+    "by_cl": ("scenario", "operation", "consistency_level"),
+    "by_faults": ("scenario", "active_faults"),
+}
+COLUMNS = ("timestamp", "scenario", "operation", "consistency_level", "success", "latency_ms", "coordinator_ip",
+           "is_stale_read", "active_faults")
+
+
+def latency_buckets(latency_ms):
+    """LatencyHistogram.bucket_of for a whole array of millisecond latencies at once."""
+    us = np.maximum(np.nan_to_num(np.asarray(latency_ms, dtype=np.float64) * 1000), 0).astype(np.int64)
+    _, bit_length = np.frexp(us.astype(np.float64))  # Exact for anything under 2^53 us
+    shift = np.maximum(bit_length - 1 - SUB_BUCKET_BITS, 0)
+    buckets = np.where(us < SUB_BUCKETS, us, SUB_BUCKETS + shift * SUB_BUCKETS + (us >> shift) - SUB_BUCKETS)
+    return np.minimum(buckets, MAX_BUCKET - 1)
+
+
+def cl_name(value):
+    """Consistency levels are logged as the driver's integer codes; show their names."""
+    from cassandra import ConsistencyLevel
+    try:
+        return ConsistencyLevel.value_to_name.get(int(value), str(value))
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _codes(series, label=str):
+    """(int64 codes, labels) for one column. Only the distinct values are converted, not every row."""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype("category")
+    codes = series.cat.codes.to_numpy(dtype=np.int64)
+    labels = [label(value) for value in series.cat.categories]
+    if (codes < 0).any():  # Empty cells
+        codes = np.where(codes < 0, len(labels), codes)
+        labels.append("")
+    return codes, labels or [""]
+
+
+def _flags(series):
+    if series.dtype == bool:
+        return series.to_numpy()
+    return series.astype(str).str.lower().eq("true").to_numpy()
+
+
+class GroupStats:
+    """Mergeable aggregates for one grouping: a row of bucket counts and a few counters per group key."""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = {}  # group key tuple -> row
+        self.histograms = np.zeros((0, MAX_BUCKET), dtype=np.int64)
+        self.counters = np.zeros((0, 3), dtype=np.int64)  # ok, errors, stale reads
+        self.max_ms = np.zeros(0)
+
+    def add(self, columns, ok, stale, latency_ms, buckets):
+        """`columns` maps each key column to (integer codes, labels) for this chunk."""
+        # One int64 per row encodes its whole key (mixed radix over the columns' codes), so grouping is one
+        # hash factorize over integers instead of building a tuple per row
+        combined = np.zeros(len(ok), dtype=np.int64)
+        for name in self.keys:
+            codes, labels = columns[name]
+            combined = combined * len(labels) + codes
+        codes, uniques = pd.factorize(combined)
+        n = len(uniques)
+        parts = []
+        for name in reversed(self.keys):
+            labels = columns[name][1]
+            parts.append([labels[i] for i in (uniques % len(labels)).tolist()])
+            uniques = uniques // len(labels)
+        rows = self._rows(list(zip(*reversed(parts))))
+
+        # Successful requests only, as LatencyRecorder does: a timeout's "latency" is just the timeout
+        flat = np.bincount(codes[ok] * MAX_BUCKET + buckets[ok], minlength=n * MAX_BUCKET)
+        self.histograms[rows] += flat.reshape(n, MAX_BUCKET)
+        self.counters[rows, 0] += np.bincount(codes, weights=ok, minlength=n).astype(np.int64)
+        self.counters[rows, 1] += np.bincount(codes, weights=~ok, minlength=n).astype(np.int64)
+        self.counters[rows, 2] += np.bincount(codes, weights=stale, minlength=n).astype(np.int64)
+        chunk_max = np.full(n, -np.inf)
+        np.maximum.at(chunk_max, codes[ok], latency_ms[ok])
+        self.max_ms[rows] = np.maximum(self.max_ms[rows], chunk_max)
+
+    def _rows(self, keys):
+        new = [key for key in keys if key not in self.index]
+        if new:
+            for key in new:
+                self.index[key] = len(self.index)
+            grow = len(new)
+            self.histograms = np.vstack([self.histograms, np.zeros((grow, MAX_BUCKET), dtype=np.int64)])
+            self.counters = np.vstack([self.counters, np.zeros((grow, 3), dtype=np.int64)])
+            self.max_ms = np.concatenate([self.max_ms, np.zeros(grow)])
+        return np.array([self.index[key] for key in keys], dtype=np.int64)
+
+    def histogram(self, row):
+        hist = LatencyHistogram()
+        counts = self.histograms[row]
+        nonzero = np.flatnonzero(counts)
+        hist.counts = dict(zip(nonzero.tolist(), counts[nonzero].tolist()))
+        hist.total = int(counts.sum())
+        hist.max_us = int(self.max_ms[row] * 1000) if hist.total else 0
+        return hist
+
+    def frame(self):
+        records = []
+        for key, row in self.index.items():
+            hist = self.histogram(row)
+            ok, errors, stale = self.counters[row].tolist()
+            records.append({
+                **dict(zip(self.keys, key)),
+                "ok": ok, "errors": errors,
+                "error_rate": round(errors / (ok + errors), 4) if ok + errors else None,
+                "stale_reads": stale,
+                "p50_ms": hist.percentile(50), "p90_ms": hist.percentile(90), "p99_ms": hist.percentile(99),
+                "p999_ms": hist.percentile(99.9), "max_ms": round(float(self.max_ms[row]), 3) if ok else None,
+            })
+        return pd.DataFrame(records).sort_values(list(self.keys), key=lambda col: col.astype(str),
+                                                 ignore_index=True) if records else pd.DataFrame(records)
+
+
+class MetricsAnalysis:
+    """Folds metric chunks into GroupStats for each grouping plus per-second counts per scenario."""
+
+    def __init__(self, groupings=GROUPINGS):
+        self.groups = {name: GroupStats(keys) for name, keys in groupings.items()}
+        self.seconds = {}  # (scenario, epoch second) -> [ok, errors]
+        self.rows = 0
+
+    def add(self, chunk):
+        columns = {}
+        for name in ("scenario", "operation", "consistency_level", "coordinator_ip", "active_faults"):
+            columns[name] = _codes(chunk[name], cl_name if name == "consistency_level" else str)
+        ok = _flags(chunk["success"])
+        stale = _flags(chunk["is_stale_read"])
+        latency_ms = chunk["latency_ms"].to_numpy(dtype=np.float64)
+        buckets = latency_buckets(latency_ms)
+        for stats in self.groups.values():
+            stats.add(columns, ok, stale, latency_ms, buckets)
+
+        seconds = pd.to_datetime(chunk["timestamp"], format="ISO8601").to_numpy(dtype="datetime64[s]").astype(np.int64)
+        scenario_codes, scenarios = columns["scenario"]
+        codes, keys = pd.factorize(seconds * len(scenarios) + scenario_codes)
+        ok_counts = np.bincount(codes, weights=ok, minlength=len(keys)).astype(np.int64)
+        all_counts = np.bincount(codes, minlength=len(keys))
+        for key, ok_count, count in zip(keys.tolist(), ok_counts.tolist(), all_counts.tolist()):
+            second, scenario = divmod(key, len(scenarios))
+            counts = self.seconds.setdefault((scenarios[scenario], second), [0, 0])
+            counts[0] += ok_count
+            counts[1] += count - ok_count
+        self.rows += len(chunk)
+
+    def throughput(self, window=10):
+        """Per-second ok/error counts per scenario, gaps filled with zeros, plus a `window`-second rolling mean."""
+        if not self.seconds:
+            return pd.DataFrame(columns=["scenario", "second", "ok", "errors", "ok_rolling", "error_rate_rolling"])
+        frame = pd.DataFrame([(scenario, second, ok, errors) for (scenario, second), (ok, errors) in self.seconds.items()],
+                             columns=["scenario", "second", "ok", "errors"])
+        pieces = []
+        for scenario, part in frame.groupby("scenario", sort=False):
+            part = part.set_index("second").sort_index()[["ok", "errors"]]
+            part = part.reindex(range(part.index.min(), part.index.max() + 1), fill_value=0)
+            part.insert(0, "scenario", scenario)
+            rolling = part[["ok", "errors"]].rolling(window, min_periods=1).sum()
+            part["ok_rolling"] = rolling["ok"] / window
+            part["error_rate_rolling"] = rolling["errors"] / (rolling["ok"] + rolling["errors"]).replace(0, np.nan)
+            pieces.append(part.rename_axis("second").reset_index())
+        return pd.concat(pieces, ignore_index=True).sort_values(["second", "scenario"], ignore_index=True)
+
+
+def read_chunks(path, chunk_rows=1_000_000):
+    """Yields DataFrames of at most about `chunk_rows` rows from a metrics .csv or Arrow stream."""
+    if path.endswith(".arrow"):
+        import pyarrow as pa
+        with pa.OSFile(path, "rb") as source:
+            reader = pa.ipc.open_stream(source)
+            batches, rows = [], 0
+            for batch in reader:
+                batches.append(batch)
+                rows += batch.num_rows
+                if rows >= chunk_rows:
+                    yield pa.Table.from_batches(batches).to_pandas(strings_to_categorical=True)
+                    batches, rows = [], 0
+            if batches:
+                yield pa.Table.from_batches(batches).to_pandas(strings_to_categorical=True)
+        return
+    dtypes = {"scenario": "category", "operation": "category", "consistency_level": "category",
+              "coordinator_ip": "category", "active_faults": "category", "latency_ms": np.float64}
+    header = pd.read_csv(path, nrows=0).columns
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype={k: v for k, v in dtypes.items() if k in header}):
+        if "active_faults" not in chunk:  # Files from before fault timelines
+            chunk["active_faults"] = "none"
+        yield chunk
+
+
+def analyze(path, chunk_rows=1_000_000):
+    analysis = MetricsAnalysis()
+    began = time.perf_counter()
+    for chunk in read_chunks(path, chunk_rows):
+        analysis.add(chunk)
+        print(f"  {analysis.rows:,} rows analysed ({analysis.rows / (time.perf_counter() - began):,.0f} rows/sec)")
+    return analysis
+
+
+def plot_latency(frame, path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    frame = frame[frame["ok"] > 0]
+    labels = [f"{row.scenario}\n{row.operation} {row.consistency_level}" for row in frame.itertuples()]
+    fig, ax = plt.subplots(figsize=(max(8, 0.45 * len(frame)), 5))
+    xs = np.arange(len(frame))
+    ax.bar(xs - 0.2, frame["p50_ms"], width=0.4, label="p50")
+    ax.bar(xs + 0.2, frame["p99_ms"], width=0.4, label="p99")
+    ax.set_xticks(xs)
+    ax.set_xticklabels(labels, rotation=75, ha="right", fontsize=7)
+    ax.set_yscale("log")
+    ax.set_ylabel("latency (ms)")
+    ax.set_title("Latency per scenario, operation and CL")
+    ax.grid(axis="y", linestyle="--", alpha=0.5)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+
+
+def plot_throughput(frame, path, window):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, (ax_ok, ax_err) = plt.subplots(2, 1, figsize=(11, 6), sharex=True)
+    start = frame["second"].min()
+    for scenario, part in frame.groupby("scenario", sort=False):
+        ax_ok.plot(part["second"] - start, part["ok_rolling"], label=scenario)
+        ax_err.plot(part["second"] - start, part["error_rate_rolling"] * 100, label=scenario)
+    ax_ok.set_ylabel(f"ok/sec ({window}s rolling)")
+    ax_err.set_ylabel("error rate (%)")
+    ax_err.set_xlabel("seconds since the first request")
+    ax_ok.set_title("Throughput and errors over the run")
+    for ax in (ax_ok, ax_err):
+        ax.grid(linestyle="--", alpha=0.5)
+    ax_ok.legend(fontsize="x-small", ncol=2)
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+
+
+def write_report(analysis, output_dir, window=10, source=""):
+    os.makedirs(output_dir, exist_ok=True)
+    tables = {name: stats.frame() for name, stats in analysis.groups.items()}
+    throughput = analysis.throughput(window)
+    for name, frame in tables.items():
+        frame.to_csv(os.path.join(output_dir, f"{name}.csv"), index=False)
+    throughput.to_csv(os.path.join(output_dir, "throughput.csv"), index=False)
+
+    images = {}
+    try:
+        if not tables["by_cl"].empty:
+            plot_latency(tables["by_cl"], os.path.join(output_dir, "latency.png"))
+            images["Latency"] = "latency.png"
+        if not throughput.empty:
+            plot_throughput(throughput, os.path.join(output_dir, "throughput.png"), window)
+            images["Throughput"] = "throughput.png"
+    except ImportError:
+        print("matplotlib is not installed; the report has tables only (pip install matplotlib).", file=sys.stderr)
+
+    sections = [f"<h1>Experiment metrics</h1><p>{analysis.rows:,} requests from {source}</p>"]
+    for title, name in images.items():
+        with open(os.path.join(output_dir, name), "rb") as f:
+            encoded = base64.b64encode(f.read()).decode()
+        sections.append(f'<h2>{title}</h2><img src="data:image/png;base64,{encoded}">')
+    for name, title in (("by_cl", "Per scenario, operation and CL"), ("by_faults", "Per active fault set"),
+                        ("by_coordinator", "Per coordinator")):
+        sections.append(f"<h2>{title}</h2>" + tables[name].to_html(index=False, na_rep="-", float_format="%.2f"))
+    html = io.StringIO()
+    html.write("<!doctype html><html><head><meta charset='utf-8'><title>Experiment metrics</title><style>"
+               "body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;font-size:12px}"
+               "td,th{border:1px solid #ccc;padding:2px 6px;text-align:right}img{max-width:100%}"
+               "</style></head><body>")
+    html.write("\n".join(sections))
+    html.write("</body></html>")
+    path = os.path.join(output_dir, "report.html")
+    with open(path, "w") as f:
+        f.write(html.getvalue())
+    print(f"Report saved to {path}")
+    return tables, throughput
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate experiment metrics in bounded memory and build a report.")
+    parser.add_argument("metrics", nargs="?", default="experiment_metrics.csv",
+                        help="experiment_metrics.csv or experiment_metrics.arrow")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000,
+                        help="Rows held in memory at once (about 300 bytes each)")
+    parser.add_argument("--window", type=int, default=10, help="Seconds in the rolling throughput window")
+    parser.add_argument("--output-dir", default="analysis")
+    args = parser.parse_args()
+
+    print(f"Analysing {args.metrics} in chunks of {args.chunk_rows:,} rows")
+    write_report(analyze(args.metrics, args.chunk_rows), args.output_dir, args.window, args.metrics)
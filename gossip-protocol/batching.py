@@ -0,0 +1,52 @@
+"""
+Grouping writes into batches that one coordinator can serve locally.
+
+A batch in Cassandra is not a bulk-load shortcut: the coordinator that receives
+it forwards every row to that row's replicas. In a batch of rows from all over
+the ring, the coordinator fans out to most of the cluster and the request waits
+for the slowest of them. When every row of a batch shares one replica set, a
+token-aware driver sends the batch to one of those replicas, and the batch costs
+one round trip to the same RF nodes a single-row write would touch.
+
+chaos_lab.test_data has one row per partition (id is the whole primary key), so
+"same partition" can only mean "same replicas". The grouping here is by the
+replica set that owns each row's token.
+"""
+from cassandra.murmur3 import murmur3
+from cassandra.metadata import Murmur3Token
+
+
+def token_of(row_id):
+    """The Murmur3 token Cassandra assigns to a UUID partition key."""
+    return murmur3(row_id.bytes)
+
+
+def driver_replicas(cluster, keyspace):
+    """replicas_of(token) from the driver's token map, or None (no grouping) while the map is unknown."""
+    def replicas_of(token):
+        token_map = cluster.metadata.token_map
+        if token_map is None:
+            return None
+        return tuple(sorted(host.address for host in token_map.get_replicas(keyspace, Murmur3Token(token))))
+    return replicas_of
+
+
+def group_batches(rows, batch_size, replicas_of=None):
+    """
+    Splits `rows` (tuples whose first element is the UUID partition key) into batches
+    of at most `batch_size`. With `replicas_of`, each batch only holds rows owned by
+    the same replica set; a set's last batch may be short. Without it, rows are
+    batched in the order given, wherever they live.
+    """
+    if replicas_of is None:
+        return [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+    batches, open_batches = [], {}
+    for row in rows:
+        replicas = replicas_of(token_of(row[0]))
+        batch = open_batches.setdefault(replicas, [])
+        batch.append(row)
+        if len(batch) == batch_size:
+            batches.append(batch)
+            open_batches[replicas] = []
+    batches.extend(batch for batch in open_batches.values() if batch)
+    return batches
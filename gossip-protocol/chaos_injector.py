@@ -1,28 +1,99 @@
 import docker
 import time
+import threading
 import subprocess
+from cassandra.policies import HostStateListener
+from chaos_proxy import parse_delay, parse_loss, parse_rate
 
-client = docker.from_env()
+_client = None
+
+
+def docker_client():
+    """Connects to the Docker daemon on first use, so proxy-only fault injection works without one."""
+    global _client
+    if _client is None:
+        _client = docker.from_env()
+    return _client
+
+
+class _HostEvents(HostStateListener):
+    """Wakes the wait_until_* methods as soon as the driver marks a host up, down, added or removed."""
 
-class ChaosInjector:
     def __init__(self):
+        self.changed = threading.Condition()
+
+    def _notify(self, host):
+        with self.changed:
+            self.changed.notify_all()
+
+    on_up = on_down = on_add = on_remove = _notify
+
+
+class ChaosInjector:
+    """
+    Faults on the Docker containers. With a ChaosProxy, latency, loss, bandwidth and
+    partitions are applied to the proxy's client links instead: instantly, with no
+    root, tc or Docker network changes. Crashes and restarts always act on containers.
+    """
+
+    def __init__(self, cluster=None, proxy=None, poll_interval=0.5):
         self.network_name = "cassandra-net"
+        self.proxy = proxy
+        self.poll_interval = poll_interval
+        self._addresses = {}
+        self._changed_at = {}  # node -> when its last fault or heal was applied, so waits time the whole transition
+        self._netem = {}       # node -> the netem options currently applied to its eth0
+        self._tc_ready = set()
+        self._events = _HostEvents()
+        # The driver Cluster whose view of the ring wait_until_down/up/all_up watch
+        self.cluster = None
+        if cluster is not None:
+            self.attach(cluster)
+
+    def attach(self, cluster):
+        self.cluster = cluster
+        cluster.register_listener(self._events)
+
+    def proxy_routes(self):
+        """Each node's advertised address -> its proxy port, for ProxyEndPointFactory."""
+        return {self._address(name): self.proxy.address(name) for name in self.proxy.upstreams}
+
+    def _address(self, node_name):
+        # Looked up before the first fault and cached: a disconnected container has no address on the network
+        if node_name not in self._addresses:
+            networks = docker_client().containers.get(node_name).attrs["NetworkSettings"]["Networks"]
+            self._addresses[node_name] = networks[self.network_name]["IPAddress"]
+        return self._addresses[node_name]
+
+    def _changed(self, node_name):
+        if self.proxy is None:
+            self._address(node_name)
+        self._changed_at[node_name] = time.perf_counter()
 
     def stop_node(self, node_name="cassandra-node3"):
         print(f"Injecting Fault: Stopping {node_name}")
-        container = client.containers.get(node_name)
+        self._changed(node_name)
+        container = docker_client().containers.get(node_name)
         container.stop()
         print(f"{node_name} stopped.")
 
     def start_node(self, node_name="cassandra-node3"):
         print(f"Healing: Starting {node_name}")
-        container = client.containers.get(node_name)
+        self._changed(node_name)
+        container = docker_client().containers.get(node_name)
         container.start()
         print(f"{node_name} started.")
 
     def partition_network(self, node_name="cassandra-node2"):
+        if self.proxy is not None:
+            print(f"Injecting Fault: Blackholing the proxy link to {node_name}")
+            self._changed(node_name)
+            self.proxy.link(node_name).blackholed = True
+            print(f"{node_name} partitioned from the client.")
+            return
         print(f"Injecting Fault: Disconnecting {node_name} from {self.network_name}")
-        network = client.networks.list(names=[self.network_name])[0]
+        self._changed(node_name)
+        network = docker_client().networks.list(names=[self.network_name])[0]
         try:
             network.disconnect(node_name)
             print(f"{node_name} partitioned.")
@@ -30,28 +101,133 @@ class ChaosInjector:
             print(f"Failed to disconnect: {e}")
 
     def heal_network(self, node_name="cassandra-node2"):
+        if self.proxy is not None:
+            print(f"Healing: Reopening the proxy link to {node_name}")
+            self._changed(node_name)
+            self.proxy.link(node_name).blackholed = False
+            print(f"{node_name} reconnected.")
+            return
         print(f"Healing: Reconnecting {node_name} to {self.network_name}")
-        network = client.networks.list(names=[self.network_name])[0]
+        self._changed(node_name)
+        network = docker_client().networks.list(names=[self.network_name])[0]
         try:
             network.connect(node_name)
             print(f"{node_name} reconnected.")
         except Exception as e:
             print(f"Failed to connect: {e}")
 
-    def inject_latency(self, node_name="cassandra-node1", delay="200ms"):
-        print(f"Injecting Fault: Adding {delay} latency to {node_name}")
-        cmd = f"docker exec -u root {node_name} apt-get update && apt-get install -y iproute2"
-        subprocess.run(cmd, shell=True)
-        cmd_delay = f"docker exec -u root {node_name} tc qdisc add dev eth0 root netem delay {delay}"
-        subprocess.run(cmd_delay, shell=True)
+    def _shape(self, node_name, **options):
+        """Sets netem options (delay, loss, rate) on the container, keeping the ones already applied."""
+        if node_name not in self._tc_ready:
+            cmd = f"docker exec -u root {node_name} sh -c 'apt-get update && apt-get install -y iproute2'"
+            subprocess.run(cmd, shell=True)
+            self._tc_ready.add(node_name)
+        netem = self._netem.setdefault(node_name, {})
+        netem.update(options)
+        spec = " ".join(f"{name} {value}" for name, value in netem.items())
+        subprocess.run(f"docker exec -u root {node_name} tc qdisc replace dev eth0 root netem {spec}", shell=True)
+
+    def inject_latency(self, node_name="cassandra-node1", delay="200ms", jitter=None):
+        print(f"Injecting Fault: Adding {delay} latency to {node_name}" + (f" (+/- {jitter})" if jitter else ""))
+        if self.proxy is not None:
+            link = self.proxy.link(node_name)
+            link.delay = parse_delay(delay)
+            link.jitter = parse_delay(jitter) if jitter else 0.0
+        else:
+            self._shape(node_name, delay=f"{delay} {jitter}" if jitter else delay)
         print(f"Latency injected.")
 
+    def inject_loss(self, node_name="cassandra-node1", loss="1%"):
+        print(f"Injecting Fault: Dropping {loss} of packets to and from {node_name}")
+        if self.proxy is not None:
+            self.proxy.link(node_name).loss = parse_loss(loss)
+        else:
+            self._shape(node_name, loss=f"{parse_loss(loss) * 100:g}%")
+        print(f"Packet loss injected.")
+
+    def limit_bandwidth(self, node_name="cassandra-node1", rate="10mbit"):
+        print(f"Injecting Fault: Capping {node_name}'s bandwidth at {rate}")
+        if self.proxy is not None:
+            self.proxy.link(node_name).rate = parse_rate(rate)
+        else:
+            self._shape(node_name, rate=rate)
+        print(f"Bandwidth capped.")
+
     def heal_latency(self, node_name="cassandra-node1"):
+        """Removes every link fault set by inject_latency, inject_loss and limit_bandwidth."""
         print(f"Healing: Removing latency from {node_name}")
-        cmd = f"docker exec -u root {node_name} tc qdisc del dev eth0 root netem"
-        subprocess.run(cmd, shell=True)
+        if self.proxy is not None:
+            self.proxy.link(node_name).reset()
+        else:
+            self._netem.pop(node_name, None)
+            subprocess.run(f"docker exec -u root {node_name} tc qdisc del dev eth0 root netem", shell=True)
         print(f"Latency removed.")
 
+    def cpu_seconds(self, node_name="cassandra-node1"):
+        """Total CPU time the container has consumed so far (from the Docker stats API)."""
+        stats = docker_client().containers.get(node_name).stats(stream=False)
+        return stats["cpu_stats"]["cpu_usage"]["total_usage"] / 1e9
+
+    def repair(self, node_name="cassandra-node1", keyspace="chaos_lab"):
+        # We call docker exec to run nodetool locally inside the container
+        subprocess.run(f"docker exec {node_name} nodetool repair {keyspace}", shell=True, check=True)
+
+    # --- waiting for the cluster to react ---
+
+    def _host_is_up(self, node_name):
+        if self.proxy is not None:
+            # Through the proxy every host's endpoint is its node's proxy port
+            proxied = self.proxy.address(node_name)
+            return any(host.is_up for host in self.cluster.metadata.all_hosts()
+                       if (host.endpoint.address, host.endpoint.port) == proxied)
+        address = self._address(node_name)
+        for host in self.cluster.metadata.all_hosts():
+            # The contact point may be known by its published address (127.0.0.1), so check every address it has
+            if address in (host.address, host.broadcast_address, host.broadcast_rpc_address, host.listen_address):
+                return bool(host.is_up)
+        return False
+
+    def _wait_until(self, reached, started, timeout, description):
+        """
+        Returns the seconds from `started` until reached() is true, or None after `timeout` seconds.
+        Host events wake the loop at once; polling covers changes that arrive without one.
+        """
+        if self.cluster is None:
+            raise RuntimeError("ChaosInjector needs the driver Cluster to wait for state changes")
+        deadline = time.perf_counter() + timeout
+        with self._events.changed:
+            while not reached():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    print(f"Gave up after {timeout}s waiting until {description}.")
+                    return None
+                self._events.changed.wait(min(self.poll_interval, remaining))
+        elapsed = time.perf_counter() - started
+        print(f"{description[0].upper()}{description[1:]} after {elapsed:.2f}s.")
+        return elapsed
+
+    def wait_until_down(self, node_name="cassandra-node3", timeout=60.0):
+        """Blocks until the driver has marked `node_name` down; returns seconds since the fault was injected."""
+        started = self._changed_at.get(node_name, time.perf_counter())
+        return self._wait_until(lambda: not self._host_is_up(node_name), started, timeout,
+                                f"the driver saw {node_name} DOWN")
+
+    def wait_until_up(self, node_name="cassandra-node3", timeout=180.0):
+        """Blocks until the driver has connected to `node_name` again; returns seconds since it was healed."""
+        started = self._changed_at.get(node_name, time.perf_counter())
+        return self._wait_until(lambda: self._host_is_up(node_name), started, timeout,
+                                f"the driver saw {node_name} UP")
+
+    def wait_until_all_up(self, timeout=300.0):
+        """Blocks until every host in the ring is up; returns seconds since the last node was touched."""
+        started = max(self._changed_at.values(), default=time.perf_counter())
+
+        def all_up():
+            hosts = self.cluster.metadata.all_hosts()
+            return bool(hosts) and all(host.is_up for host in hosts)
+
+        return self._wait_until(all_up, started, timeout, "the driver saw every node UP")
+
 if __name__ == "__main__":
     injector = ChaosInjector()
     
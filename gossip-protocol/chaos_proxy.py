@@ -0,0 +1,250 @@
+"""
+A local asyncio TCP proxy between the driver and every Cassandra node, for
+injecting network faults without touching the containers.
+
+Each node gets its own listening port. The driver is pointed at those ports
+(ProxyEndPointFactory rewrites the addresses it learns from system.peers), so
+every byte between the client and a node passes through that node's link,
+where it can be:
+
+  delayed      by delay +/- jitter (uniform, as netem does), in each direction
+  rate-capped  bytes leave no faster than the link's bandwidth
+  lost         a lost segment costs a retransmission timeout, as it would in TCP
+  blackholed   nothing gets through until the link is healed (a partition)
+
+Changing a link takes effect on the next chunk, with no apt-get, root or
+Docker network involved. What it cannot reach is traffic *between* nodes:
+gossip and replication still run on the Docker network, so a blackholed node
+is cut off from the client but not from its peers.
+
+Standalone, e.g. to put cqlsh behind a slow link:
+    python chaos_proxy.py --upstream cassandra-node1=127.0.0.1:9042 --delay 50ms --jitter 10ms --loss 1%
+"""
+import re
+import math
+import random
+import asyncio
+import argparse
+import threading
+from cassandra.connection import DefaultEndPoint, DefaultEndPointFactory
+
+CHUNK = 64 * 1024
+SEGMENT = 1460               # Bytes per TCP segment on an Ethernet MTU
+RETRANSMIT_TIMEOUT = 0.2     # Linux's minimum RTO: what one lost segment costs
+BLACKHOLE_POLL = 0.01
+QUEUED_CHUNKS = 64           # Per direction; beyond this the proxy stops reading and TCP pushes back
+
+
+def parse_delay(delay):
+    """netem-style "500ms" / "1s" / "250us" -> seconds."""
+    match = re.fullmatch(r"\s*([\d.]+)\s*(us|ms|s)?\s*", str(delay))
+    if not match:
+        raise ValueError(f"Cannot parse delay: {delay}")
+    value, unit = float(match.group(1)), match.group(2) or "ms"
+    return value * {"us": 1e-6, "ms": 1e-3, "s": 1.0}[unit]
+
+
+def parse_rate(rate):
+    """netem-style "1mbit" / "500kbit" / "2mbps" -> bytes per second (bit units are bits, bps units bytes)."""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([kmg]?)(bit|bps)\s*", str(rate).lower())
+    if not match:
+        raise ValueError(f"Cannot parse rate: {rate}")
+    value = float(match.group(1)) * {"": 1, "k": 1e3, "m": 1e6, "g": 1e9}[match.group(2)]
+    return value / 8 if match.group(3) == "bit" else value
+
+
+def parse_loss(loss):
+    """"1%" or 0.01 -> 0.01."""
+    text = str(loss).strip()
+    return float(text[:-1]) / 100 if text.endswith("%") else float(text)
+
+
+class LinkFaults:
+    """What one node's link currently does to traffic. Read by the proxy on every chunk."""
+
+    def __init__(self):
+        self.blackholed = False
+        self.bytes_forwarded = 0
+        self.reset()
+
+    def reset(self):
+        self.delay = 0.0
+        self.jitter = 0.0
+        self.loss = 0.0
+        self.rate = None  # bytes per second; None = unlimited
+
+    def __repr__(self):
+        rate = f"{self.rate * 8 / 1e6:g}mbit" if self.rate else "unlimited"
+        return (f"LinkFaults(delay={self.delay * 1000:g}ms, jitter={self.jitter * 1000:g}ms, loss={self.loss:.2%}, "
+                f"rate={rate}, blackholed={self.blackholed})")
+
+
+class ProxyEndPointFactory(DefaultEndPointFactory):
+    """Sends the driver to each node's proxy port instead of the rpc_address the node advertises."""
+
+    def __init__(self, routes, port=None):
+        super().__init__(port)
+        self.routes = routes  # advertised node address -> (proxy host, proxy port)
+
+    def create(self, row):
+        endpoint = super().create(row)
+        route = self.routes.get(endpoint.address)
+        return DefaultEndPoint(*route) if route else endpoint
+
+
+class ChaosProxy:
+    """
+    One listening port per node, all served by a single event loop on a background
+    thread. Fault settings are plain attributes on each LinkFaults, so the injector
+    can change them from any thread.
+    """
+
+    def __init__(self, upstreams, host="127.0.0.1", base_port=19042):
+        self.upstreams = dict(upstreams)  # node name -> (host, port) the node's CQL port is reachable on
+        self.listen = {name: (host, base_port + i) for i, name in enumerate(self.upstreams)}
+        self.links = {name: LinkFaults() for name in self.upstreams}
+        self._loop = None
+        self._thread = None
+        self._servers = []
+
+    def address(self, node_name):
+        return self.listen[node_name]
+
+    def link(self, node_name):
+        return self.links[node_name]
+
+    def start(self):
+        ready = threading.Event()
+        failure = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._loop.run_until_complete(self._listen())
+            except Exception as e:
+                failure.append(e)
+                ready.set()
+                return
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="chaos-proxy", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failure:
+            raise failure[0]
+        for name, (host, port) in self.listen.items():
+            print(f"Proxy for {name}: {host}:{port} -> {':'.join(map(str, self.upstreams[name]))}")
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        async def close():
+            for server in self._servers:
+                server.close()
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task():
+                    task.cancel()
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _listen(self):
+        for name, (host, port) in self.listen.items():
+            server = await asyncio.start_server(
+                lambda reader, writer, name=name: self._connection(name, reader, writer), host, port)
+            self._servers.append(server)
+
+    async def _connection(self, name, client_reader, client_writer):
+        link = self.links[name]
+        try:
+            # Partitioned: the connection opens locally but nothing answers, so the driver's connect times out
+            while link.blackholed:
+                await asyncio.sleep(BLACKHOLE_POLL)
+            node_reader, node_writer = await asyncio.open_connection(*self.upstreams[name])
+            await asyncio.gather(self._pipe(client_reader, node_writer, link),
+                                 self._pipe(node_reader, client_writer, link))
+        except OSError:
+            client_writer.close()
+        except asyncio.CancelledError:  # stop(): asyncio's stream server expects handlers to finish quietly
+            client_writer.close()
+
+    async def _pipe(self, reader, writer, link):
+        """Copies one direction of a connection, holding each chunk back until the link would deliver it."""
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(QUEUED_CHUNKS)
+
+        async def deliver():
+            while True:
+                due, data = await chunks.get()
+                if data is None:
+                    break
+                while link.blackholed:
+                    await asyncio.sleep(BLACKHOLE_POLL)
+                wait = due - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                writer.write(data)
+                await writer.drain()
+                link.bytes_forwarded += len(data)
+
+        delivering = asyncio.ensure_future(deliver())
+        free_at = last_due = 0.0
+        try:
+            while True:
+                data = await reader.read(CHUNK)
+                if not data:
+                    break
+                now = loop.time()
+                sent = now
+                if link.rate:
+                    # The link serialises one chunk after another at its bandwidth
+                    free_at = sent = max(free_at, now) + len(data) / link.rate
+                due = sent + max(0.0, link.delay + random.uniform(-link.jitter, link.jitter))
+                if link.loss:
+                    # Loss is per segment; a chunk is late if any of its segments had to be resent
+                    segments = math.ceil(len(data) / SEGMENT)
+                    if random.random() < 1 - (1 - link.loss) ** segments:
+                        due += RETRANSMIT_TIMEOUT
+                # TCP delivers in order, so a late chunk holds back everything behind it
+                last_due = due = max(due, last_due)
+                await chunks.put((due, data))
+            await chunks.put((0.0, None))
+            await delivering
+        except (ConnectionError, OSError):
+            delivering.cancel()
+        finally:
+            writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the chaos proxy in front of one or more Cassandra nodes.")
+    parser.add_argument("--upstream", action="append", required=True, metavar="NAME=HOST:PORT",
+                        help="A node to proxy (repeatable); ports are assigned from --base-port in order")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=19042)
+    parser.add_argument("--delay", default="0ms")
+    parser.add_argument("--jitter", default="0ms")
+    parser.add_argument("--loss", default="0")
+    parser.add_argument("--rate", default=None, help='Bandwidth cap, e.g. "10mbit"')
+    args = parser.parse_args()
+
+    upstreams = {}
+    for spec in args.upstream:
+        name, _, target = spec.partition("=")
+        host, _, port = target.rpartition(":")
+        upstreams[name] = (host, int(port))
+    proxy = ChaosProxy(upstreams, args.host, args.base_port)
+    for link in proxy.links.values():
+        link.delay, link.jitter = parse_delay(args.delay), parse_delay(args.jitter)
+        link.loss = parse_loss(args.loss)
+        link.rate = parse_rate(args.rate) if args.rate else None
+    proxy.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        proxy.stop()
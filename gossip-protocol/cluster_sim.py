@@ -0,0 +1,1394 @@
+"""
+An in-process, discrete-event stand-in for the three-container Cassandra cluster.
+
+Nothing here sleeps. Every message, timeout and gossip round is an event on a
+heap ordered by *virtual* time, and the clock jumps straight from one event to
+the next. A scenario that waits 20 seconds for the ring to settle finishes in
+a few milliseconds, and the same code runs a 300-node ring.
+
+What is modelled:
+  - a token ring (Murmur3, several vnodes per node) with SimpleStrategy replication
+  - gossip: every node bumps its heartbeat once a second and exchanges heartbeat
+    digests with a random live peer, sometimes a down peer, and a seed
+  - phi-accrual failure detection on each node's own view of every peer
+  - coordinators, consistency levels (ONE / TWO / QUORUM / ALL), Unavailable and
+    timeout errors, hinted handoff, read repair and last-write-wins timestamps
+  - logged and unlogged batches (one message per replica; a logged batch goes
+    to the batchlog on two other nodes first)
+  - lightweight transactions as Paxos v1 (prepare, read, propose, commit, with
+    randomised backoff when preempted) and counters (a leader replica
+    increments its own shard and replicates it)
+  - crashes, restarts (with boot time), network isolation, netem-style delay and
+    loss, and a per-node egress bandwidth cap
+
+What is not: compaction, memory pressure, or queueing inside a node, so a
+heavy-load run measures latency under faults, not saturation. Load sessions
+(connect(concurrent=True)) overlap their requests in virtual time; other
+requests run one at a time.
+
+SimCluster.connect() returns a session with the subset of the driver API the lab
+uses (execute, execute_async, prepare, paging futures), and SimInjector has the
+same methods as ChaosInjector, so LabRunner runs every scenario unchanged:
+
+    python experiment_runner.py --simulate --sim-nodes 300
+
+`python cluster_sim.py` runs a few regression checks on the error paths.
+"""
+import time
+import heapq
+import bisect
+import random
+import threading
+import itertools
+import numpy as np
+from collections import namedtuple, deque
+from cassandra import ConsistencyLevel, Unavailable, WriteTimeout, WriteType, ReadTimeout, OperationTimedOut
+from cassandra.cluster import NoHostAvailable
+from cassandra.query import Statement, BoundStatement, BatchStatement, BatchType
+from cassandra.murmur3 import murmur3
+from statements import (INSERT_ROW, SELECT_VALUE, SCAN_RANGE, SELECT_HOT, INSERT_HOT, INSERT_HOT_IF_NOT_EXISTS,
+                        UPDATE_HOT_IF, INCREMENT_COUNTER, SELECT_COUNTER)
+from merkle_repair import repair_pair, transfer_seconds
+from chaos_proxy import parse_delay, parse_loss, parse_rate, RETRANSMIT_TIMEOUT
+
+GOSSIP_INTERVAL = 1.0
+PHI_FACTOR = 0.434          # 1/ln(10): phi = -log10(chance of hearing nothing for this long)
+PHI_CONVICT_THRESHOLD = 8.0  # Cassandra's default phi_convict_threshold
+BOOT_TIME = 8.0             # A restarted node is unreachable while its JVM starts and it replays its commit log
+WRITE_TIMEOUT = 2.0         # write_request_timeout_in_ms
+READ_TIMEOUT = 5.0          # read_request_timeout_in_ms
+CLIENT_TIMEOUT = 5.0        # The driver's request_timeout
+HOP_LATENCY = 0.0003        # One hop across the Docker bridge network
+HOP_JITTER = 0.0002
+SERVICE_TIME = 0.00005      # Work a replica does per mutation or read
+PARSE_TIME = 0.0002         # Coordinator CQL parsing, paid on every simple (unprepared) statement
+ROW_SCAN_TIME = 0.000002    # Per row returned by a range scan
+GOSSIP_CPU = 0.00002
+HINT_RETRY = 10.0           # Resend hints if no acknowledgement arrives within this long
+REPAIR_BANDWIDTH_MBPS = 100.0  # Streaming throughput during repair (stream_throughput_outbound_megabits_per_sec)
+CAS_CONTENTION_TIMEOUT = 1.0   # cas_contention_timeout_in_ms: how long a contended LWT keeps retrying
+PAXOS_BACKOFF = 0.1            # A preempted Paxos round sleeps a random 0-100ms before trying a higher ballot
+MESSAGE_BYTES = 300            # Typical size of one internode message, used when a node's bandwidth is capped
+
+# Where each routable query keeps its partition key among the bound values
+_KEY_INDEX = {INSERT_ROW: 0, SELECT_VALUE: 0, SELECT_HOT: 0, INSERT_HOT: 0, INSERT_HOT_IF_NOT_EXISTS: 0,
+              UPDATE_HOT_IF: 1, INCREMENT_COUNTER: 0, SELECT_COUNTER: 0}
+
+Row = namedtuple("Row", "id value")
+ValueRow = namedtuple("ValueRow", "value")
+CountRow = namedtuple("CountRow", "count")
+CasRow = namedtuple("CasRow", "applied value")  # The driver names the "[applied]" column "applied"
+
+
+def required_replicas(cl, rf):
+    if cl in (ConsistencyLevel.ONE, ConsistencyLevel.LOCAL_ONE, ConsistencyLevel.ANY):
+        return 1
+    if cl == ConsistencyLevel.TWO:
+        return min(2, rf)
+    if cl == ConsistencyLevel.THREE:
+        return min(3, rf)
+    if cl == ConsistencyLevel.ALL:
+        return rf
+    return rf // 2 + 1  # QUORUM / LOCAL_QUORUM / EACH_QUORUM in a single DC
+
+
+class PeerTable:
+    """
+    One node's view of every node in the ring, held as numpy arrays indexed by node
+    number so that merging a gossip digest or running failure detection is a
+    handful of vector operations rather than a Python loop over hundreds of peers.
+
+    Heartbeats are packed as generation << 32 | version, so "newer" is a plain
+    integer comparison and a restart (new generation) always wins.
+    """
+
+    def __init__(self, size, me):
+        self.me = me
+        self.heartbeat = np.full(size, 1 << 32, dtype=np.int64)
+        self.last_heard = np.zeros(size)              # NaN = never heard from this process
+        self.interval_sum = np.zeros(size)
+        self.interval_count = np.zeros(size)
+        self.alive = np.ones(size, dtype=bool)
+
+    def forget(self):
+        """A freshly restarted process: it knows the ring, but not who is up."""
+        self.last_heard[:] = np.nan
+        self.interval_sum[:] = 0.0
+        self.interval_count[:] = 0.0
+        self.alive[:] = False
+        self.alive[self.me] = True
+
+    def merge(self, digest, now):
+        """Takes every heartbeat in `digest` newer than ours; returns the indices of peers that came back UP."""
+        newer = digest > self.heartbeat
+        newer[self.me] = False
+        if not newer.any():
+            return ()
+        same_process = newer & ((digest >> 32) == (self.heartbeat >> 32)) & ~np.isnan(self.last_heard)
+        self.interval_sum[same_process] += now - self.last_heard[same_process]
+        self.interval_count[same_process] += 1
+        restarted = newer & ~same_process  # Old timings say nothing about a new process
+        self.interval_sum[restarted] = 0.0
+        self.interval_count[restarted] = 0.0
+        full = self.interval_count > 100  # Keep the mean roughly a sliding window
+        self.interval_sum[full] *= 0.5
+        self.interval_count[full] *= 0.5
+        self.heartbeat[newer] = digest[newer]
+        self.last_heard[newer] = now
+        revived = newer & ~self.alive
+        self.alive |= newer
+        return np.flatnonzero(revived)
+
+    def convict(self, now):
+        """Marks DOWN every peer whose phi has crossed the threshold; returns their indices."""
+        mean = np.where(self.interval_count > 0, self.interval_sum / np.maximum(self.interval_count, 1),
+                        GOSSIP_INTERVAL)
+        with np.errstate(invalid="ignore"):
+            phi = PHI_FACTOR * (now - self.last_heard) / mean
+            dead = self.alive & (phi > PHI_CONVICT_THRESHOLD)  # NaN (never heard) compares False
+        dead[self.me] = False
+        self.alive[dead] = False
+        return np.flatnonzero(dead)
+
+
+class SimNode:
+    def __init__(self, index, name, address, tokens):
+        self.index = index
+        self.name = name
+        self.address = address
+        self.tokens = tokens
+        self.up = True
+        self.booting = False
+        self.isolated = False
+        # netem on the node's eth0: every message it sends is delayed by egress_delay +/- egress_jitter,
+        # and with chance egress_loss is lost once and resent after a retransmission timeout
+        self.egress_delay = 0.0
+        self.egress_jitter = 0.0
+        self.egress_loss = 0.0
+        # tbf on eth0: with egress_rate (bytes/sec) set, messages leave one after another, each taking
+        # MESSAGE_BYTES / egress_rate on the wire, and wait while the link is still busy with earlier ones
+        self.egress_rate = None
+        self.egress_free_at = 0.0
+        self.generation = 1
+        self.version = 0
+        self.cpu = 0.0
+        self.data = {}          # key bytes -> (value, write timestamp, row id)
+        # The contention benchmark's tables, kept apart from test_data so scans and repair never see them
+        self.hot = {}           # key bytes -> (value, write timestamp)
+        self.counters = {}      # key bytes -> {leader node name: (clock, count)}, one shard per leader
+        self.paxos = {}         # key bytes -> [promised ballot, accepted ballot, accepted value, committed ballot]
+        self.hints = {}         # target node name -> [(key, value, ts, row_id), ...]
+        self.hints_sent_at = {}  # target node name -> virtual time of the unacknowledged hint batch
+        self.peers = None       # PeerTable
+        self._index = None      # Sorted (tokens, keys) for range scans, rebuilt after new keys arrive
+
+    @property
+    def reachable(self):
+        return self.up and not self.booting and not self.isolated
+
+    def apply(self, key, value, ts, row_id):
+        """Last-write-wins: keep whichever version has the newer timestamp (ties go to the larger value)."""
+        current = self.data.get(key)
+        if current is None:
+            self._index = None
+        elif (ts, value) <= (current[1], current[0]):
+            return
+        self.data[key] = (value, ts, row_id)
+
+    def scan(self, tokens_of, start, end):
+        """Rows with start < token <= end, in token order."""
+        if self._index is None:
+            pairs = sorted((tokens_of[key], key) for key in self.data)
+            self._index = ([token for token, _ in pairs], [key for _, key in pairs])
+        tokens, keys = self._index
+        lo, hi = bisect.bisect_right(tokens, start), bisect.bisect_right(tokens, end)
+        return {key: self.data[key] for key in keys[lo:hi]}
+
+
+class SimCluster:
+    def __init__(self, nodes=3, replication_factor=3, seed=0, tokens_per_node=8, seeds=1):
+        self.random = random.Random(seed)
+        self.now = 0.0
+        self.start_wall = time.time()
+        self.rf = min(replication_factor, nodes)
+        self._events = []
+        self._seq = itertools.count()
+        self._lock = threading.RLock()
+        self._tokens = {}  # key bytes -> Murmur3 token
+        self.membership_events = []  # (virtual time, observer, peer, "UP" / "DOWN")
+        self._last_ballot = 0
+
+        self.nodes = {}
+        self.node_list = []
+        ring = []
+        for i in range(1, nodes + 1):
+            tokens = [self.random.randint(-2 ** 63 + 1, 2 ** 63 - 1) for _ in range(tokens_per_node)]
+            node = SimNode(i - 1, f"cassandra-node{i}", f"10.0.{i // 250}.{i % 250 + 1}", tokens)
+            self.nodes[node.name] = node
+            self.node_list.append(node)
+            ring.extend((token, node) for token in tokens)
+        ring.sort(key=lambda entry: entry[0])
+        self._ring_tokens = [token for token, _ in ring]
+        self._ring_nodes = [node for _, node in ring]
+        self._replica_cache = {}
+        self.seeds = list(self.nodes)[:seeds]
+
+        # Start from a settled ring: everyone already knows everyone else is up
+        for node in self.nodes.values():
+            node.peers = PeerTable(nodes, node.index)
+            self._schedule(self.random.random() * GOSSIP_INTERVAL, self._gossip_tick, node, node.generation)
+
+    # --- driver-facing API ---
+
+    def connect(self, concurrent=False):
+        return SimSession(self, concurrent)
+
+    def shutdown(self):
+        pass
+
+    def clock(self):
+        return self.now
+
+    def wall_time(self):
+        return self.start_wall + self.now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._run(until=self.now + seconds)
+
+    def run_until(self, predicate):
+        """Advances virtual time until predicate() holds: what a client does instead of blocking."""
+        with self._lock:
+            self._run(done=predicate)
+
+    def call_later(self, delay, fn, *args):
+        """Runs fn(*args) `delay` seconds of virtual time from now, in order with every other event."""
+        with self._lock:
+            self._schedule(delay, fn, *args)
+
+    # --- event loop ---
+
+    def _schedule(self, delay, fn, *args):
+        heapq.heappush(self._events, (self.now + delay, next(self._seq), fn, args))
+
+    def _run(self, until=None, done=None):
+        while self._events:
+            if done is not None and done():
+                return
+            if until is not None and self._events[0][0] > until:
+                break
+            when, _, fn, args = heapq.heappop(self._events)
+            self.now = when
+            fn(*args)
+        if until is not None:
+            self.now = max(self.now, until)
+
+    def _send(self, src, dst, fn, *args, work=0.0):
+        """
+        Delivers fn(*args) at dst after one network hop plus `work` seconds of processing at src.
+        src or dst may be None, meaning the client. Messages to or from an unreachable node are lost.
+        """
+        if (src is not None and not src.reachable) or (dst is not None and not dst.reachable):
+            return
+        delay = work + HOP_LATENCY + self.random.expovariate(1 / HOP_JITTER)
+        if src is not None:
+            jitter = self.random.uniform(-src.egress_jitter, src.egress_jitter) if src.egress_jitter else 0.0
+            delay += max(0.0, src.egress_delay + jitter)
+            if src.egress_loss and self.random.random() < src.egress_loss:
+                delay += RETRANSMIT_TIMEOUT
+            if src.egress_rate:
+                src.egress_free_at = max(self.now, src.egress_free_at) + MESSAGE_BYTES / src.egress_rate
+                delay += src.egress_free_at - self.now
+        self._schedule(delay, self._deliver, src, dst, fn, args)
+
+    def _deliver(self, src, dst, fn, args):
+        # The destination may have crashed or been cut off while the message was on the wire
+        if dst is None or dst.reachable:
+            fn(*args)
+
+    # --- ring ---
+
+    def token_of(self, key):
+        token = self._tokens.get(key)
+        if token is None:
+            token = self._tokens[key] = murmur3(key)
+        return token
+
+    def _replicas_at(self, index):
+        """SimpleStrategy: the owner of ring position `index`, then the next distinct nodes clockwise."""
+        replicas = self._replica_cache.get(index)
+        if replicas is None:
+            replicas = []
+            for step in range(len(self._ring_nodes)):
+                node = self._ring_nodes[(index + step) % len(self._ring_nodes)]
+                if node not in replicas:
+                    replicas.append(node)
+                    if len(replicas) == self.rf:
+                        break
+            self._replica_cache[index] = replicas
+        return replicas
+
+    def replicas(self, token):
+        return self._replicas_at(bisect.bisect_left(self._ring_tokens, token) % len(self._ring_tokens))
+
+    def _segments(self, start, end):
+        """Splits the token range (start, end] at ring tokens: [(start, end, replicas), ...]."""
+        segments = []
+        index = bisect.bisect_right(self._ring_tokens, start)
+        while index < len(self._ring_tokens) and self._ring_tokens[index] < end:
+            segments.append((start, self._ring_tokens[index], self._replicas_at(index)))
+            start = self._ring_tokens[index]
+            index += 1
+        segments.append((start, end, self._replicas_at(index % len(self._ring_tokens))))
+        return segments
+
+    # --- gossip and failure detection ---
+
+    def _gossip_tick(self, node, generation):
+        if node.generation != generation or not node.up:
+            return  # This timer belongs to a process that has since been stopped or restarted
+        self._schedule(GOSSIP_INTERVAL, self._gossip_tick, node, generation)
+        if node.booting:
+            return
+        node.version += 1
+        node.cpu += GOSSIP_CPU
+        live = np.flatnonzero(node.peers.alive)
+        live = live[live != node.index]
+        dead = np.flatnonzero(~node.peers.alive)
+        targets = set()
+        if len(live):
+            targets.add(int(live[self.random.randrange(len(live))]))
+        if len(dead) and self.random.random() < len(dead) / (len(live) + 1):
+            targets.add(int(dead[self.random.randrange(len(dead))]))
+        seed = self.nodes[self.random.choice(self.seeds)]
+        if seed is not node and (not len(live) or self.random.random() < len(self.seeds) / len(self.nodes)):
+            targets.add(seed.index)
+        digest = self._digest(node)
+        for index in targets:
+            target = self.node_list[index]
+            self._send(node, target, self._on_gossip, target, digest, node)
+        self._convict(node)
+        self._dispatch_hints(node)
+
+    def _digest(self, node):
+        digest = node.peers.heartbeat.copy()
+        digest[node.index] = node.generation << 32 | node.version
+        return digest
+
+    def _on_gossip(self, node, digest, reply_to):
+        """Merges a peer's heartbeats; the first message of an exchange is answered with our own digest."""
+        for index in node.peers.merge(digest, self.now):
+            self.membership_events.append((self.now, node.name, self.node_list[index].name, "UP"))
+        if reply_to is not None:
+            self._send(node, reply_to, self._on_gossip, reply_to, self._digest(node), None)
+
+    def _convict(self, node):
+        for index in node.peers.convict(self.now):
+            self.membership_events.append((self.now, node.name, self.node_list[index].name, "DOWN"))
+
+    def believes_up(self, observer, node):
+        return bool(observer.peers.alive[node.index])
+
+    # --- hinted handoff ---
+
+    def _store_hint(self, coordinator, target, key, value, ts, row_id):
+        coordinator.hints.setdefault(target.name, []).append((key, value, ts, row_id))
+
+    def _dispatch_hints(self, node):
+        for name, hints in node.hints.items():
+            if not hints or not node.peers.alive[self.nodes[name].index]:
+                continue
+            sent_at = node.hints_sent_at.get(name)
+            if sent_at is not None and self.now - sent_at < HINT_RETRY:
+                continue
+            node.hints_sent_at[name] = self.now
+            batch = list(hints)
+            target = self.nodes[name]
+            self._send(node, target, self._on_hints, target, node, batch, work=SERVICE_TIME * len(batch))
+
+    def _on_hints(self, target, sender, batch):
+        for key, value, ts, row_id in batch:
+            target.apply(key, value, ts, row_id)
+        target.cpu += SERVICE_TIME * len(batch)
+        self._send(target, sender, self._on_hints_ack, sender, target.name, len(batch))
+
+    def _on_hints_ack(self, sender, name, count):
+        del sender.hints[name][:count]
+        sender.hints_sent_at.pop(name, None)
+
+    # --- coordinator: writes ---
+
+    def coordinate_write(self, coordinator, key, value, ts, row_id, cl, respond):
+        replicas = self.replicas(self.token_of(key))
+        required = required_replicas(cl, len(replicas))
+        believed = [r for r in replicas if self.believes_up(coordinator, r)]
+        if len(believed) < required:
+            respond(error=Unavailable("Cannot achieve consistency level", consistency=cl,
+                                      required_replicas=required, alive_replicas=len(believed)))
+            return
+        for replica in replicas:
+            if replica not in believed:
+                self._store_hint(coordinator, replica, key, value, ts, row_id)
+
+        acked = set()
+        state = {"finished": False}
+
+        def on_ack(name):
+            acked.add(name)
+            if not state["finished"] and len(acked) >= required:
+                state["finished"] = True
+                respond()
+
+        def on_timeout():
+            # Replicas that never acknowledged get a hint, whether or not the client already has its answer
+            for replica in believed:
+                if replica.name not in acked:
+                    self._store_hint(coordinator, replica, key, value, ts, row_id)
+            if not state["finished"]:
+                state["finished"] = True
+                respond(error=WriteTimeout("Coordinator timed out waiting for replicas", consistency=cl,
+                                           required_responses=required, received_responses=len(acked),
+                                           write_type=WriteType.SIMPLE))
+
+        for replica in believed:
+            self._send(coordinator, replica, self._on_mutation, replica, coordinator, key, value, ts, row_id, on_ack)
+        self._schedule(WRITE_TIMEOUT, on_timeout)
+
+    def _on_mutation(self, replica, coordinator, key, value, ts, row_id, on_ack):
+        replica.apply(key, value, ts, row_id)
+        replica.cpu += SERVICE_TIME
+        if on_ack is not None:
+            self._send(replica, coordinator, on_ack, replica.name, work=SERVICE_TIME)
+
+    def coordinate_batch(self, coordinator, mutations, cl, logged, respond):
+        """
+        A batch of (key, value, ts, row_id) mutations. Each replica gets one message
+        carrying every mutation it owns, and the batch succeeds once each mutation has
+        as many acks as `cl` needs. A logged batch first goes to the batchlog on up to
+        two other nodes, and the mutations are only sent once it is there.
+        """
+        owners = [self.replicas(self.token_of(key)) for key, *_ in mutations]
+        required = required_replicas(cl, self.rf)
+        for replicas in owners:
+            alive = sum(self.believes_up(coordinator, r) for r in replicas)
+            if alive < required:
+                respond(error=Unavailable("Cannot achieve consistency level", consistency=cl,
+                                          required_replicas=required, alive_replicas=alive))
+                return
+
+        acks = [0] * len(mutations)
+        routed = {}  # replica name -> indexes of the mutations sent to it
+        acked_by = set()
+        state = {"finished": False, "waiting": len(mutations)}
+        batchlog = []
+        if logged:
+            # Cassandra writes the batchlog to two live nodes other than the coordinator where it can
+            others = [n for n in self.node_list if n is not coordinator and self.believes_up(coordinator, n)]
+            batchlog = self.random.sample(others, min(2, len(others))) or [coordinator]
+
+        def send_mutations():
+            for index, (mutation, replicas) in enumerate(zip(mutations, owners)):
+                for replica in replicas:
+                    if self.believes_up(coordinator, replica):
+                        routed.setdefault(replica.name, []).append(index)
+                    else:
+                        self._store_hint(coordinator, replica, *mutation)
+            for name, indexes in routed.items():
+                replica = self.nodes[name]
+                self._send(coordinator, replica, self._on_mutations, replica, coordinator,
+                           [mutations[i] for i in indexes], on_ack)
+
+        def on_ack(name):
+            acked_by.add(name)
+            for index in routed[name]:
+                acks[index] += 1
+                if acks[index] == required:
+                    state["waiting"] -= 1
+            if not state["finished"] and state["waiting"] == 0:
+                state["finished"] = True
+                respond()
+                for endpoint in batchlog:
+                    self._send(coordinator, endpoint, self._on_batchlog_remove, endpoint)
+
+        def on_timeout():
+            for name, indexes in routed.items():
+                if name not in acked_by:
+                    for index in indexes:
+                        self._store_hint(coordinator, self.nodes[name], *mutations[index])
+            if not state["finished"]:
+                state["finished"] = True
+                respond(error=WriteTimeout("Coordinator timed out waiting for replicas", consistency=cl,
+                                           required_responses=required, received_responses=min(acks),
+                                           write_type=WriteType.BATCH_LOG if logged and not routed
+                                           else WriteType.BATCH if logged else WriteType.UNLOGGED_BATCH))
+
+        if logged:
+            pending = {endpoint.name for endpoint in batchlog}
+
+            def on_logged(name):
+                pending.discard(name)
+                if not pending and not state["finished"]:
+                    send_mutations()
+
+            for endpoint in batchlog:
+                self._send(coordinator, endpoint, self._on_batchlog, endpoint, coordinator, len(mutations), on_logged)
+        else:
+            send_mutations()
+        self._schedule(WRITE_TIMEOUT, on_timeout)
+
+    def _on_mutations(self, replica, coordinator, mutations, on_ack):
+        for mutation in mutations:
+            replica.apply(*mutation)
+        replica.cpu += SERVICE_TIME * len(mutations)
+        # The mutation stage's threads (concurrent_writes) apply the rows side by side, not one after another
+        self._send(replica, coordinator, on_ack, replica.name, work=SERVICE_TIME)
+
+    def _on_batchlog(self, endpoint, coordinator, size, on_logged):
+        endpoint.cpu += SERVICE_TIME * size
+        self._send(endpoint, coordinator, on_logged, endpoint.name, work=SERVICE_TIME * size)
+
+    def _on_batchlog_remove(self, endpoint):
+        endpoint.cpu += SERVICE_TIME
+
+    # --- coordinator: reads ---
+
+    def _read_targets(self, coordinator, replicas, cl):
+        required = required_replicas(cl, len(replicas))
+        believed = [r for r in replicas if self.believes_up(coordinator, r)]
+        if len(believed) < required:
+            raise Unavailable("Cannot achieve consistency level", consistency=cl,
+                              required_replicas=required, alive_replicas=len(believed))
+        # Read locally when possible, otherwise from any replica believed to be up
+        believed.sort(key=lambda r: (r is not coordinator, self.random.random()))
+        return believed[:required]
+
+    def coordinate_read(self, coordinator, key, cl, respond):
+        try:
+            targets = self._read_targets(coordinator, self.replicas(self.token_of(key)), cl)
+        except Unavailable as e:
+            respond(error=e)
+            return
+        responses = {}
+
+        def on_response(replica, found):
+            responses[replica.name] = (replica, found)
+            if len(responses) != len(targets):
+                return
+            versions = [found for _, found in responses.values() if found is not None]
+            newest = max(versions, key=lambda v: (v[1], v[0])) if versions else None
+            for replica, found in responses.values():
+                if newest is not None and found != newest:
+                    # Read repair: push the winning version to the replica that answered with an older one
+                    self._send(coordinator, replica, self._on_mutation, replica, coordinator,
+                               key, newest[0], newest[1], newest[2], None)
+            respond(rows=[ValueRow(newest[0])] if newest else [])
+
+        self._scatter(coordinator, targets, lambda replica: replica.data.get(key), on_response,
+                      READ_TIMEOUT, cl, respond)
+
+    def coordinate_scan(self, coordinator, start, end, cl, respond):
+        segments = self._segments(start, end)
+        try:
+            plan = [(seg_start, seg_end, self._read_targets(coordinator, replicas, cl))
+                    for seg_start, seg_end, replicas in segments]
+        except Unavailable as e:
+            respond(error=e)
+            return
+        targets = list({replica for _, _, chosen in plan for replica in chosen})
+        responses = {}
+
+        def read_segments(replica):
+            return [replica.scan(self._tokens, seg_start, seg_end) if replica in chosen else {}
+                    for seg_start, seg_end, chosen in plan]
+
+        def on_response(replica, found):
+            responses[replica.name] = found
+            if len(responses) != len(targets):
+                return
+            rows = []
+            for index, (_, _, chosen) in enumerate(plan):
+                merged = {}
+                for replica in chosen:
+                    for key, version in responses[replica.name][index].items():
+                        current = merged.get(key)
+                        if current is None or (version[1], version[0]) > (current[1], current[0]):
+                            merged[key] = version
+                rows.extend(Row(version[2], version[0])
+                            for _, version in sorted(merged.items(), key=lambda item: self._tokens[item[0]]))
+            respond(rows=rows)
+
+        self._scatter(coordinator, targets, read_segments, on_response, READ_TIMEOUT, cl, respond)
+
+    def _scatter(self, coordinator, targets, read, on_response, timeout, cl, respond):
+        """Sends a read to every target; on_response(replica, result) runs as each one answers."""
+        state = {"answered": 0, "finished": False}
+
+        def answered(replica, found):
+            if state["finished"]:
+                return
+            state["answered"] += 1
+            if state["answered"] == len(targets):
+                state["finished"] = True
+            on_response(replica, found)
+
+        def on_read(replica):
+            found = read(replica)
+            rows = sum(len(part) for part in found) if isinstance(found, list) else 1
+            work = SERVICE_TIME + ROW_SCAN_TIME * rows
+            replica.cpu += work
+            self._send(replica, coordinator, answered, replica, found, work=work)
+
+        def on_timeout():
+            if not state["finished"]:
+                state["finished"] = True
+                respond(error=ReadTimeout("Coordinator timed out waiting for replicas", consistency=cl,
+                                          required_responses=len(targets), received_responses=state["answered"],
+                                          data_retrieved=False))
+
+        for replica in targets:
+            if replica is coordinator:
+                self._schedule(0.0, on_read, replica)
+            else:
+                self._send(coordinator, replica, on_read, replica)
+        self._schedule(timeout, on_timeout)
+
+    # --- contention benchmark: plain rows, lightweight transactions, counters ---
+
+    def _round(self, coordinator, targets, required, handler, on_done, timeout=WRITE_TIMEOUT):
+        """
+        Runs handler(replica) -> (ok, payload) on every target and sends each answer back.
+        on_done gets the payloads once `required` replicas said ok, False as soon as too
+        many refused for that to happen, or None on timeout. It is called once.
+        """
+        state = {"done": False, "refused": 0}
+        payloads = []
+
+        def finish(result):
+            if not state["done"]:
+                state["done"] = True
+                on_done(result)
+
+        def answered(ok, payload):
+            if ok:
+                payloads.append(payload)
+                if len(payloads) >= required:
+                    finish(payloads)
+            else:
+                state["refused"] += 1
+                if state["refused"] > len(targets) - required:
+                    finish(False)
+
+        def on_request(replica):
+            ok, payload = handler(replica)
+            replica.cpu += SERVICE_TIME
+            self._send(replica, coordinator, answered, ok, payload, work=SERVICE_TIME)
+
+        if required <= 0:
+            finish(payloads)
+            return
+        for replica in targets:
+            self._send(coordinator, replica, on_request, replica)
+        self._schedule(timeout, finish, None)
+
+    def _hot_targets(self, coordinator, key, cl):
+        """(replicas believed up, how many must answer); raises Unavailable."""
+        replicas = self.replicas(self.token_of(key))
+        required = required_replicas(cl, len(replicas))
+        believed = [r for r in replicas if self.believes_up(coordinator, r)]
+        if len(believed) < required:
+            raise Unavailable("Cannot achieve consistency level", consistency=cl,
+                              required_replicas=required, alive_replicas=len(believed))
+        return believed, required
+
+    def coordinate_hot_read(self, coordinator, key, cl, respond, counter=False):
+        try:
+            targets = self._read_targets(coordinator, self.replicas(self.token_of(key)), cl)
+        except Unavailable as e:
+            respond(error=e)
+            return
+
+        def on_done(found):
+            if not found:
+                respond(error=ReadTimeout("Coordinator timed out waiting for replicas", consistency=cl,
+                                          required_responses=len(targets), received_responses=0,
+                                          data_retrieved=False))
+            elif counter:
+                shards = {}
+                for replica_shards in found:
+                    for leader, shard in replica_shards.items():
+                        shards[leader] = max(shards.get(leader, shard), shard)
+                respond(rows=[CountRow(sum(count for _, count in shards.values()))] if shards else [])
+            else:
+                versions = [version for version in found if version is not None]
+                newest = max(versions, key=lambda v: (v[1], v[0])) if versions else None
+                respond(rows=[ValueRow(newest[0])] if newest else [])
+
+        read = (lambda r: (True, dict(r.counters.get(key, {})))) if counter else (lambda r: (True, r.hot.get(key)))
+        self._round(coordinator, targets, len(targets), read, on_done, READ_TIMEOUT)
+
+    def _apply_hot(self, replica, key, value, ts):
+        current = replica.hot.get(key)
+        if current is None or (ts, value) > (current[1], current[0]):
+            replica.hot[key] = (value, ts)
+
+    def coordinate_hot_write(self, coordinator, key, value, ts, cl, respond):
+        """A plain (last-write-wins) write to hot_rows."""
+        try:
+            targets, required = self._hot_targets(coordinator, key, cl)
+        except Unavailable as e:
+            respond(error=e)
+            return
+
+        def write(replica):
+            self._apply_hot(replica, key, value, ts)
+            return True, None
+
+        def on_done(result):
+            if result:
+                respond()
+            else:
+                respond(error=WriteTimeout("Coordinator timed out waiting for replicas", consistency=cl,
+                                           required_responses=required, received_responses=0,
+                                           write_type=WriteType.SIMPLE))
+
+        self._round(coordinator, targets, required, write, on_done)
+
+    def _ballot(self):
+        # Ballots are time-based UUIDs in Cassandra; here a strictly increasing microsecond timestamp
+        self._last_ballot = max(int(self.wall_time() * 1e6), self._last_ballot + 1)
+        return self._last_ballot
+
+    def coordinate_cas(self, coordinator, key, condition, value, cl, respond):
+        """
+        INSERT ... IF NOT EXISTS (condition None) or UPDATE ... IF value = condition, as
+        Paxos v1: prepare and promise, a quorum read, propose and accept, then commit at
+        `cl`. Each phase is a round trip to a quorum of replicas. A round preempted by a
+        higher ballot backs off for a random 0-100ms and starts again. After
+        cas_contention_timeout the client gets a CAS WriteTimeout.
+        """
+        replicas = self.replicas(self.token_of(key))
+        serial = required_replicas(ConsistencyLevel.SERIAL, len(replicas))
+        deadline = self.now + CAS_CONTENTION_TIMEOUT
+
+        def paxos(replica):
+            return replica.paxos.setdefault(key, [0, 0, None, 0])
+
+        def fail(result, write_type=WriteType.CAS):
+            if result is None or write_type == WriteType.CAS:
+                respond(error=WriteTimeout("CAS operation timed out", consistency=ConsistencyLevel.SERIAL,
+                                           required_responses=serial, received_responses=0, write_type=write_type))
+
+        def attempt():
+            if self.now > deadline:
+                fail(None)
+                return
+            live = [r for r in replicas if self.believes_up(coordinator, r)]
+            if len(live) < serial:
+                respond(error=Unavailable("Cannot achieve consistency level", consistency=ConsistencyLevel.SERIAL,
+                                          required_replicas=serial, alive_replicas=len(live)))
+                return
+            ballot = self._ballot()
+
+            def prepare(replica):
+                state = paxos(replica)
+                if ballot <= state[0]:
+                    return False, None
+                state[0] = ballot
+                return True, (state[3], state[1], state[2])
+
+            def promised(result):
+                if not result:
+                    return retry(result)
+                # A replica may have missed a commit the others saw: only a proposal newer than
+                # every commit in the quorum is really unfinished
+                latest_commit = max(committed for committed, _, _ in result)
+                in_progress = [(accepted, proposal) for _, accepted, proposal in result if accepted > latest_commit]
+                if in_progress:
+                    # An earlier round was accepted but never committed: finish it first, then start over
+                    _, unfinished = max(in_progress, key=lambda proposal: proposal[0])
+                    return propose(live, ballot, unfinished, lambda: attempt())
+                self._round(coordinator, live, serial, lambda r: (True, r.hot.get(key)), read)
+
+            def read(result):
+                if not result:
+                    return retry(result)
+                versions = [version for version in result if version is not None]
+                current = max(versions, key=lambda v: (v[1], v[0])) if versions else None
+                if (current is not None) if condition is None else (current is None or current[0] != condition):
+                    respond(rows=[CasRow(False, current[0] if current else None)])
+                    return
+                propose(live, ballot, value, lambda: respond(rows=[CasRow(True, None)]))
+
+            self._round(coordinator, live, serial, prepare, promised)
+
+        def propose(live, ballot, proposal, then):
+            def accept(replica):
+                state = paxos(replica)
+                if ballot < state[0]:
+                    return False, None
+                state[0], state[1], state[2] = ballot, ballot, proposal
+                return True, None
+
+            def accepted(result):
+                if not result:
+                    return retry(result)
+                commit_cl = required_replicas(cl, len(replicas))
+                self._round(coordinator, live, commit_cl, lambda r: commit(r, ballot, proposal),
+                            lambda done: then() if done else fail(done, WriteType.SIMPLE))
+
+            self._round(coordinator, live, serial, accept, accepted)
+
+        def commit(replica, ballot, proposal):
+            state = paxos(replica)
+            self._apply_hot(replica, key, proposal, ballot)
+            state[3] = max(state[3], ballot)
+            return True, None
+
+        def retry(result):
+            if result is None:
+                fail(None)  # Replicas stopped answering: the client's CAS times out
+            else:
+                self._schedule(self.random.uniform(0, PAXOS_BACKOFF), attempt)
+
+        attempt()
+
+    def coordinate_counter(self, coordinator, key, delta, cl, respond):
+        """
+        A counter update. One replica, the leader, adds `delta` to its own shard of the
+        counter and sends the new shard to the other replicas. A counter's value is the
+        sum of every leader's shard, so concurrent increments never overwrite each other.
+        """
+        try:
+            targets, required = self._hot_targets(coordinator, key, cl)
+        except Unavailable as e:
+            respond(error=e)
+            return
+        leader = coordinator if coordinator in targets else self.random.choice(targets)
+
+        def timed_out():
+            respond(error=WriteTimeout("Coordinator timed out waiting for replicas", consistency=cl,
+                                       required_responses=required, received_responses=0, write_type=WriteType.COUNTER))
+
+        def on_leader(leader):
+            shards = leader.counters.setdefault(key, {})
+            clock, count = shards.get(leader.name, (0, 0))
+            shard = shards[leader.name] = (clock + 1, count + delta)
+            leader.cpu += SERVICE_TIME * 2  # Counters read before they write
+
+            def store(replica):
+                shards = replica.counters.setdefault(key, {})
+                shards[leader.name] = max(shards.get(leader.name, shard), shard)
+                return True, None
+
+            others = [r for r in targets if r is not leader]
+            self._round(leader, others, required - 1, store,
+                        lambda done: self._send(leader, coordinator, respond) if done
+                        else self._send(leader, coordinator, timed_out))
+
+        self._send(coordinator, leader, on_leader, leader)
+
+    # --- anti-entropy ---
+
+    def repair(self, node):
+        """
+        Full repair of every range `node` replicates, done like nodetool repair: every pair of
+        replicas of those ranges compares Merkle trees and streams only the rows in leaves
+        that differ. Returns the combined cost (see merkle_repair.repair_pair).
+        """
+        group = [node]
+        for index in range(len(self._ring_tokens)):
+            replicas = self._replicas_at(index)
+            if node in replicas:
+                group.extend(r for r in replicas if r not in group)
+        unreachable = [r.name for r in group if not r.reachable]
+        if unreachable:
+            raise RuntimeError(f"Repair failed: replica(s) {', '.join(unreachable)} are down")
+
+        totals = {"mismatched_ranges": 0, "rows_streamed": 0, "rows_repaired": 0, "bytes": 0}
+        for a, b in itertools.combinations(group, 2):
+            def shared(holder):
+                # Only rows in ranges all three of node, a and b replicate take part in this pair's trees
+                return {key: version for key, version in holder.data.items()
+                        if {node, a, b}.issubset(self.replicas(self.token_of(key)))}
+
+            def applier(replica):
+                def apply(key, version):
+                    replica.apply(key, *version)
+                    replica.cpu += SERVICE_TIME
+                return apply
+
+            stats = repair_pair(shared(a), shared(b), token_of=self.token_of, apply_a=applier(a), apply_b=applier(b))
+            for name in totals:
+                totals[name] += stats[name]
+        return totals
+
+
+class _Host:
+    def __init__(self, address):
+        self.address = address
+
+
+class SimResult(list):
+    def one(self):
+        return self[0] if self else None
+
+
+class SimFuture:
+    """The parts of the driver's ResponseFuture the lab uses. Results always arrive as a single page."""
+
+    has_more_pages = False
+
+    def __init__(self, session):
+        self.session = session
+        self.coordinator_host = None
+        self.done = False
+        self._rows = None
+        self._page = None
+        self._error = None
+        self._callbacks = []
+
+    def finish(self, rows=None, error=None):
+        if self.done:
+            return
+        self.done = True
+        self._rows = SimResult(rows or [])
+        # Callbacks get what the driver's ResponseFuture passes: a plain list of rows, or None for a write
+        self._page = list(rows) if rows is not None else None
+        self._error = error
+        for callbacks in self._callbacks:
+            self._fire(*callbacks)
+
+    def result(self):
+        if not self.done:
+            self.session.cluster.run_until(lambda: self.done)
+        if self._error is not None:
+            raise self._error
+        return self._rows
+
+    def add_callbacks(self, callback, errback, callback_args=(), errback_args=()):
+        if self.done:
+            self._fire(callback, errback, callback_args, errback_args)
+        else:
+            self._callbacks.append((callback, errback, callback_args, errback_args))
+
+    def _fire(self, callback, errback, callback_args, errback_args):
+        if self._error is not None:
+            self.session._call(errback, self._error, *errback_args)
+        else:
+            self.session._call(callback, self._page, *callback_args)
+
+    def start_fetching_next_page(self):
+        raise RuntimeError("Simulated results have no further pages")
+
+
+class SimPrepared:
+    def __init__(self, query):
+        self.query_string = query
+        # What the driver's BatchStatement reads when a bound statement is added to it
+        self.query_id = query.encode()
+        self.keyspace = None
+        self.routing_key_indexes = None
+        self.is_idempotent = False
+
+    def bind(self, values):
+        return SimBound(self, tuple(values))
+
+
+class SimBound(BoundStatement):
+    # A BoundStatement subclass only so that the driver's BatchStatement accepts it
+    def __init__(self, prepared, values):
+        Statement.__init__(self)
+        self.prepared_statement = prepared
+        self.query_string = prepared.query_string
+        self.values = values
+        self.fetch_size = None
+
+
+class SimSession:
+    """
+    Runs each request to completion on the cluster's virtual clock, then hands the
+    already-finished future back. Callbacks are run from a per-thread queue rather
+    than recursively, so callback chains (the verifier starts its next range scan
+    from inside a callback) don't grow the stack.
+
+    A `concurrent` session returns each future as soon as the request is sent, so
+    many requests share the virtual timeline. Its caller has to advance the clock
+    while it waits (SimCluster.run_until), as WindowedLoad does with `wait_until`.
+    """
+
+    def __init__(self, cluster, concurrent=False):
+        self.cluster = cluster
+        self.concurrent = concurrent
+        self._round_robin = itertools.count()
+        self._last_timestamp = 0
+        self._local = threading.local()
+
+    def prepare(self, query):
+        return SimPrepared(query)
+
+    def execute(self, statement, parameters=None):
+        return self.execute_async(statement, parameters).result()
+
+    def execute_async(self, statement, parameters=None):
+        if isinstance(statement, BatchStatement):
+            return self._execute_batch(statement)
+        if isinstance(statement, str):
+            query, values, cl, prepared = statement, parameters, None, False
+        elif isinstance(statement, SimBound):
+            query, values, cl, prepared = statement.query_string, statement.values, statement.consistency_level, True
+        else:  # SimpleStatement
+            query, values, cl, prepared = statement.query_string, parameters, statement.consistency_level, False
+        query = query.strip().replace("%s", "?")
+        cl = ConsistencyLevel.QUORUM if cl is None else cl
+        values = tuple(values or ())
+
+        cluster = self.cluster
+        future = SimFuture(self)
+        with cluster._lock:
+            # Token-aware routing needs the partition key, which only bound statements carry
+            key_index = _KEY_INDEX.get(query) if prepared else None
+            routing_key = values[key_index].bytes if key_index is not None else None
+            coordinator = self._pick_coordinator(routing_key)
+            if coordinator is None:
+                future.finish(error=NoHostAvailable("Unable to connect to any servers", {}))
+                return future
+            future.coordinator_host = _Host(coordinator.address)
+
+            def respond(rows=None, error=None):
+                cluster._send(coordinator, None, future.finish, rows, error)
+
+            if query == INSERT_ROW:
+                row_id, value, _updated_at = values
+                handler = (cluster.coordinate_write, coordinator, row_id.bytes, value, self._timestamp(), row_id, cl, respond)
+            elif query == SELECT_VALUE:
+                handler = (cluster.coordinate_read, coordinator, values[0].bytes, cl, respond)
+            elif query == SCAN_RANGE:
+                handler = (cluster.coordinate_scan, coordinator, values[0], values[1], cl, respond)
+            elif query == SELECT_HOT:
+                handler = (cluster.coordinate_hot_read, coordinator, values[0].bytes, cl, respond)
+            elif query == INSERT_HOT:
+                handler = (cluster.coordinate_hot_write, coordinator, values[0].bytes, values[1], self._timestamp(), cl, respond)
+            elif query == INSERT_HOT_IF_NOT_EXISTS:
+                handler = (cluster.coordinate_cas, coordinator, values[0].bytes, None, values[1], cl, respond)
+            elif query == UPDATE_HOT_IF:
+                handler = (cluster.coordinate_cas, coordinator, values[1].bytes, values[2], values[0], cl, respond)
+            elif query == INCREMENT_COUNTER:
+                handler = (cluster.coordinate_counter, coordinator, values[0].bytes, 1, cl, respond)
+            elif query == SELECT_COUNTER:
+                handler = (cluster.coordinate_hot_read, coordinator, values[0].bytes, cl, respond, True)
+            elif query.split(None, 1)[0].upper() in ("CREATE", "ALTER", "DROP", "USE", "TRUNCATE"):
+                handler = (lambda *_: respond(),)
+            else:
+                raise ValueError(f"The simulator does not understand this query: {query}")
+
+            def on_request(fn, *args):
+                parse = 0.0 if prepared else PARSE_TIME
+                coordinator.cpu += SERVICE_TIME + parse
+                cluster._schedule(parse, fn, *args)
+
+            cluster._send(None, coordinator, on_request, *handler)
+            cluster._schedule(CLIENT_TIMEOUT, lambda: future.finish(
+                error=OperationTimedOut(errors={coordinator.address: "Client request timeout"})))
+            if not self.concurrent:
+                cluster._run(done=lambda: future.done)
+        return future
+
+    def _execute_batch(self, batch):
+        entries = batch._statements_and_parameters  # (is_prepared, query id or CQL text, values) per statement
+        if any(not prepared or query_id != INSERT_ROW.encode() for prepared, query_id, _ in entries):
+            raise ValueError("The simulator only runs batches of prepared INSERT_ROW statements")
+        cl = ConsistencyLevel.QUORUM if batch.consistency_level is None else batch.consistency_level
+        cluster = self.cluster
+        future = SimFuture(self)
+        with cluster._lock:
+            # The driver routes a batch by its first statement's partition key
+            coordinator = self._pick_coordinator(entries[0][2][0].bytes if entries else None)
+            if coordinator is None:
+                future.finish(error=NoHostAvailable("Unable to connect to any servers", {}))
+                return future
+            future.coordinator_host = _Host(coordinator.address)
+            ts = self._timestamp()  # One client timestamp for the whole batch, as the driver sends it
+            mutations = [(row_id.bytes, value, ts, row_id) for _, _, (row_id, value, _updated_at) in entries]
+            logged = batch.batch_type == BatchType.LOGGED
+
+            def respond(rows=None, error=None):
+                cluster._send(coordinator, None, future.finish, rows, error)
+
+            def on_request():
+                coordinator.cpu += SERVICE_TIME * max(1, len(mutations))
+                cluster.coordinate_batch(coordinator, mutations, cl, logged, respond)
+
+            cluster._send(None, coordinator, on_request)
+            cluster._schedule(CLIENT_TIMEOUT, lambda: future.finish(
+                error=OperationTimedOut(errors={coordinator.address: "Client request timeout"})))
+            if not self.concurrent:
+                cluster._run(done=lambda: future.done)
+        return future
+
+    def _pick_coordinator(self, routing_key):
+        """Like the driver: a live replica of the partition if the key is known, else round-robin over live hosts."""
+        cluster = self.cluster
+        if routing_key is not None:
+            replicas = [r for r in cluster.replicas(cluster.token_of(routing_key)) if r.reachable]
+            if replicas:
+                return cluster.random.choice(replicas)
+        hosts = [node for node in cluster.nodes.values() if node.reachable]
+        if not hosts:
+            return None
+        return hosts[next(self._round_robin) % len(hosts)]
+
+    def _timestamp(self):
+        # The driver assigns monotonic client-side timestamps (microseconds); last write wins on these
+        self._last_timestamp = max(int(self.cluster.wall_time() * 1e6), self._last_timestamp + 1)
+        return self._last_timestamp
+
+    def _call(self, fn, *args):
+        pending = getattr(self._local, "pending", None)
+        if pending is not None:
+            pending.append((fn, args))
+            return
+        self._local.pending = pending = deque([(fn, args)])
+        try:
+            while pending:
+                fn, args = pending.popleft()
+                fn(*args)
+        finally:
+            self._local.pending = None
+
+
+class SimInjector:
+    """ChaosInjector's interface, acting on a SimCluster instead of Docker containers."""
+
+    def __init__(self, cluster, poll_interval=0.1):
+        self.cluster = cluster
+        self.network_name = "cassandra-net"
+        self.poll_interval = poll_interval
+        self._changed_at = {}  # node -> virtual time of its last fault or heal
+
+    def _node(self, node_name):
+        return self.cluster.nodes[node_name]
+
+    def _changed(self, node_name):
+        self._changed_at[node_name] = self.cluster.now
+
+    def stop_node(self, node_name="cassandra-node3"):
+        print(f"Injecting Fault: Stopping {node_name}")
+        with self.cluster._lock:
+            self._changed(node_name)
+            self._node(node_name).up = False
+        print(f"{node_name} stopped.")
+
+    def start_node(self, node_name="cassandra-node3"):
+        print(f"Healing: Starting {node_name}")
+        cluster = self.cluster
+        with cluster._lock:
+            self._changed(node_name)
+            node = self._node(node_name)
+            if node.up:
+                print(f"{node_name} started.")
+                return
+            # A fresh process: new gossip generation, and no idea yet who else is alive
+            node.up, node.booting = True, True
+            node.generation += 1
+            node.version = 0
+            node.hints_sent_at.clear()
+            node.peers.forget()
+
+            def booted():
+                if node.generation == generation:
+                    node.booting = False
+
+            generation = node.generation
+            cluster._schedule(BOOT_TIME, booted)
+            cluster._schedule(BOOT_TIME + cluster.random.random() * GOSSIP_INTERVAL,
+                              cluster._gossip_tick, node, generation)
+        print(f"{node_name} started.")
+
+    def partition_network(self, node_name="cassandra-node2"):
+        print(f"Injecting Fault: Disconnecting {node_name} from {self.network_name}")
+        with self.cluster._lock:
+            self._changed(node_name)
+            self._node(node_name).isolated = True
+        print(f"{node_name} partitioned.")
+
+    def heal_network(self, node_name="cassandra-node2"):
+        print(f"Healing: Reconnecting {node_name} to {self.network_name}")
+        with self.cluster._lock:
+            self._changed(node_name)
+            self._node(node_name).isolated = False
+        print(f"{node_name} reconnected.")
+
+    def inject_latency(self, node_name="cassandra-node1", delay="200ms", jitter=None):
+        print(f"Injecting Fault: Adding {delay} latency to {node_name}" + (f" (+/- {jitter})" if jitter else ""))
+        with self.cluster._lock:
+            node = self._node(node_name)
+            node.egress_delay = parse_delay(delay)
+            node.egress_jitter = parse_delay(jitter) if jitter else 0.0
+        print(f"Latency injected.")
+
+    def inject_loss(self, node_name="cassandra-node1", loss="1%"):
+        print(f"Injecting Fault: Dropping {loss} of packets to and from {node_name}")
+        with self.cluster._lock:
+            self._node(node_name).egress_loss = parse_loss(loss)
+        print(f"Packet loss injected.")
+
+    def limit_bandwidth(self, node_name="cassandra-node1", rate="10mbit"):
+        print(f"Injecting Fault: Capping {node_name}'s bandwidth at {rate}")
+        with self.cluster._lock:
+            self._node(node_name).egress_rate = parse_rate(rate)
+        print(f"Bandwidth capped.")
+
+    def heal_latency(self, node_name="cassandra-node1"):
+        """Removes every link fault set by inject_latency, inject_loss and limit_bandwidth."""
+        print(f"Healing: Removing latency from {node_name}")
+        with self.cluster._lock:
+            node = self._node(node_name)
+            node.egress_delay = node.egress_jitter = node.egress_loss = 0.0
+            node.egress_rate = None
+        print(f"Latency removed.")
+
+    def cpu_seconds(self, node_name="cassandra-node1"):
+        return self._node(node_name).cpu
+
+    def repair(self, node_name="cassandra-node1", keyspace="chaos_lab"):
+        print(f"Running nodetool repair {keyspace} on {node_name}")
+        with self.cluster._lock:
+            stats = self.cluster.repair(self._node(node_name))
+            # Validation compactions to build the trees take a while, then the streams cross the network
+            self.cluster._run(until=self.cluster.now + 5.0 + transfer_seconds(stats["bytes"], REPAIR_BANDWIDTH_MBPS))
+        print(f"Repair finished: {stats['mismatched_ranges']} mismatched ranges, {stats['rows_streamed']} rows "
+              f"streamed ({stats['bytes'] / 1e6:.2f} MB), {stats['rows_repaired']} rows repaired.")
+
+    # --- waiting for the cluster to react ---
+    # There is no driver here to ask, so "down" and "up" are what the rest of the ring's gossip believes
+
+    def _seen(self, node, alive):
+        """True once every other reachable node's failure detector agrees on `node`."""
+        observers = [other for other in self.cluster.nodes.values() if other is not node and other.reachable]
+        return all(self.cluster.believes_up(other, node) == alive for other in observers)
+
+    def _wait_until(self, reached, started, timeout, description):
+        cluster = self.cluster
+        with cluster._lock:
+            deadline = cluster.now + timeout
+            while not reached():
+                if cluster.now >= deadline:
+                    print(f"Gave up after {timeout}s waiting until {description}.")
+                    return None
+                cluster._run(until=min(cluster.now + self.poll_interval, deadline))
+            elapsed = cluster.now - started
+        print(f"{description[0].upper()}{description[1:]} after {elapsed:.2f}s.")
+        return elapsed
+
+    def wait_until_down(self, node_name="cassandra-node3", timeout=60.0):
+        node = self._node(node_name)
+        started = self._changed_at.get(node_name, self.cluster.now)
+        return self._wait_until(lambda: self._seen(node, alive=False), started, timeout,
+                                f"the ring saw {node_name} DOWN")
+
+    def wait_until_up(self, node_name="cassandra-node3", timeout=180.0):
+        node = self._node(node_name)
+        started = self._changed_at.get(node_name, self.cluster.now)
+        return self._wait_until(lambda: node.reachable and self._seen(node, alive=True), started, timeout,
+                                f"the ring saw {node_name} UP")
+
+    def wait_until_all_up(self, timeout=300.0):
+        started = max(self._changed_at.values(), default=self.cluster.now)
+        nodes = list(self.cluster.nodes.values())
+        # Every node reachable, and every node's own view has every peer alive
+        return self._wait_until(lambda: all(node.reachable and node.peers.alive.all() for node in nodes),
+                                started, timeout, "the ring saw every node UP")
+
+
+def _check_write_timeout():
+    """A write at ALL with one replica stopped (but not yet convicted) times out as a SIMPLE WriteTimeout."""
+    import uuid
+    from datetime import datetime
+    sim = SimCluster(seed=1)
+    session = sim.connect()
+    SimInjector(sim).stop_node("cassandra-node3")
+    statement = session.prepare(INSERT_ROW).bind((uuid.uuid4(), 1, datetime.utcnow()))
+    statement.consistency_level = ConsistencyLevel.ALL
+    try:
+        session.execute(statement)
+    except WriteTimeout as e:
+        assert e.write_type == WriteType.SIMPLE, e.write_type
+    else:
+        raise AssertionError("A write at ALL with a replica down succeeded")
+
+
+def _check_batch_timeout():
+    """An unlogged batch at ALL with one replica stopped times out as UNLOGGED_BATCH."""
+    import uuid
+    from datetime import datetime
+    sim = SimCluster(seed=1)
+    session = sim.connect()
+    SimInjector(sim).stop_node("cassandra-node3")
+    prepared = session.prepare(INSERT_ROW)
+    batch = BatchStatement(batch_type=BatchType.UNLOGGED, consistency_level=ConsistencyLevel.ALL)
+    for i in range(5):
+        batch.add(prepared.bind((uuid.uuid4(), i, datetime.utcnow())))
+    try:
+        session.execute(batch)
+    except WriteTimeout as e:
+        assert e.write_type == WriteType.UNLOGGED_BATCH, e.write_type
+    else:
+        raise AssertionError("A batch at ALL with a replica down succeeded")
+
+
+def _check_cas_and_counter_timeouts():
+    """With two of three replicas cut off, LWTs and counter updates at QUORUM time out with their own write types."""
+    import uuid
+    from statements import INSERT_HOT_IF_NOT_EXISTS, INCREMENT_COUNTER
+    sim = SimCluster(seed=1)
+    session = sim.connect()
+    injector = SimInjector(sim)
+    injector.stop_node("cassandra-node2")
+    injector.stop_node("cassandra-node3")
+    for query, parameters, write_type in ((INSERT_HOT_IF_NOT_EXISTS, (uuid.uuid4(), 1), WriteType.CAS),
+                                          (INCREMENT_COUNTER, (uuid.uuid4(),), WriteType.COUNTER)):
+        try:
+            session.execute(session.prepare(query).bind(parameters))
+        except WriteTimeout as e:
+            assert e.write_type == write_type, e.write_type
+        else:
+            raise AssertionError(f"{query} succeeded without a quorum")
+
+
+def _check_callback_results():
+    """Callbacks get a list of rows for a read and None for a write, as from the driver."""
+    import uuid
+    from datetime import datetime
+    sim = SimCluster(seed=1)
+    session = sim.connect()
+    row_id = uuid.uuid4()
+    results = []
+    for query, parameters in ((INSERT_ROW, (row_id, 7, datetime.utcnow())), (SELECT_VALUE, (row_id,))):
+        future = session.execute_async(session.prepare(query).bind(parameters))
+        future.add_callbacks(results.append, lambda e: results.append(e))
+        future.result()
+    assert results[0] is None and type(results[1]) is list and results[1][0].value == 7, results
+
+
+def _check_bandwidth_cap():
+    """A capped node's messages queue on its link: 100 of them at 8kbit take 100 * 300 / 1000 = 30s."""
+    sim = SimCluster(seed=1)
+    node = sim.nodes["cassandra-node1"]
+    injector = SimInjector(sim)
+    injector.limit_bandwidth(node.name, "8kbit")
+    delivered = []
+    with sim._lock:
+        for _ in range(100):
+            sim._send(node, None, lambda: delivered.append(sim.now))
+    sim.run_until(lambda: len(delivered) == 100)
+    assert 29.9 < delivered[-1] < 31, delivered[-1]
+    injector.heal_latency(node.name)
+    assert node.egress_rate is None
+
+
+if __name__ == "__main__":
+    # Regression checks for the error paths the lab's scenarios only hit now and then
+    for check in (_check_write_timeout, _check_batch_timeout, _check_cas_and_counter_timeouts,
+                  _check_callback_results, _check_bandwidth_cap):
+        check()
+        print(f"{check.__name__}: ok")
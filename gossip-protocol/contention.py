@@ -0,0 +1,166 @@
+"""
+Many writers incrementing a few hot keys: last-write-wins vs lightweight transactions vs counters.
+
+Each writer repeatedly picks one of the hot keys and adds 1 to it. There are three ways to do that:
+
+  lww      read the value, then write value + 1. Two writers that read the same value
+           both write the same result and one increment disappears, yet both were
+           acknowledged. Nothing reports the loss.
+  lwt      read the value, then write value + 1 IF value = what was read (INSERT ... IF NOT
+           EXISTS for the first write). Paxos makes the replicas agree on one winner. A
+           loser gets the current value back and tries again from it. No increment is
+           lost, but each attempt costs four round trips, and retries grow with contention.
+           Paxos can also apply one more than was acknowledged: a coordinator preempted
+           after some replicas accepted its proposal retries, while the next coordinator
+           finishes that proposal for it. The retry then sees the condition fail and
+           answers "not applied", and the client increments again.
+  counter  UPDATE ... SET count = count + 1. The replica that leads the update adds to its
+           own shard of the counter and never reads another writer's value, so concurrent
+           increments do not overwrite each other. A timed-out increment cannot be safely
+           retried, though: it may already have been applied.
+
+Lost updates = acknowledged increments missing from the final values read back at QUORUM;
+extra applies = increments in the final values that were never acknowledged.
+"""
+import uuid
+import random
+import threading
+from cassandra import ConsistencyLevel
+from statements import (SELECT_HOT, INSERT_HOT, INSERT_HOT_IF_NOT_EXISTS, UPDATE_HOT_IF, INCREMENT_COUNTER,
+                        SELECT_COUNTER)
+from latency_histogram import LatencyHistogram
+
+MODES = ("lww", "lwt", "counter")
+
+
+class ContentionBenchmark:
+    """
+    Runs `writers` concurrent increment loops against `keys` hot keys. Every writer is
+    a chain of callbacks: each response sends that writer's next request, so exactly
+    `writers` requests are in flight however slow the cluster is. Waiting works like
+    WindowedLoad: a threading.Event with the driver, `wait_until` under the simulator.
+    """
+
+    def __init__(self, session, statements, clock, wait_until=None, on_request=None, seed=0):
+        self.session = session
+        self.statements = statements
+        self.clock = clock
+        self.wait_until = wait_until
+        # on_request(operation, success, latency_ms, coordinator), once per CQL request
+        self.on_request = on_request
+        self.random = random.Random(seed)
+
+    def run(self, mode, writers, keys, increments, cl=ConsistencyLevel.QUORUM):
+        """Makes `increments` increments in total, spread over `writers`, and returns a summary dict."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown contention mode {mode!r} (expected one of {MODES})")
+        hot_keys = [uuid.UUID(int=self.random.getrandbits(128), version=4) for _ in range(keys)]
+        acked = dict.fromkeys(hot_keys, 0)
+        latency = LatencyHistogram()
+        lock = threading.Lock()
+        all_done = threading.Event()
+        state = {"issued": 0, "finished": 0, "ok": 0, "errors": 0, "retries": 0}
+
+        def send(query, parameters, then, operation):
+            statement, parameters = self.statements.request(query, parameters, cl)
+            started = self.clock()
+
+            def on_success(rows, future):
+                report(operation, True, started, future)
+                then(rows[0] if rows else None, None)
+
+            def on_error(error, future):
+                report(operation, False, started, future)
+                then(None, error)
+
+            try:
+                future = self.session.execute_async(statement, parameters)
+            except Exception as e:
+                report(operation, False, started, None)
+                then(None, e)
+                return
+            future.add_callbacks(on_success, on_error, callback_args=(future,), errback_args=(future,))
+
+        def report(operation, success, started, future):
+            if self.on_request is not None:
+                host = future.coordinator_host if future is not None else None
+                self.on_request(operation, success, (self.clock() - started) * 1000,
+                                host.address if host else "UNKNOWN")
+
+        def next_increment():
+            with lock:
+                if state["issued"] == increments:
+                    return
+                state["issued"] += 1
+                key = self.random.choice(hot_keys)
+            started = self.clock()
+
+            def done(error):
+                with lock:
+                    if error is None:
+                        acked[key] += 1
+                        state["ok"] += 1
+                        latency.record((self.clock() - started) * 1000)
+                    else:
+                        state["errors"] += 1
+                    state["finished"] += 1
+                    last = state["finished"] == increments
+                if last:
+                    all_done.set()
+                else:
+                    next_increment()
+
+            if mode == "counter":
+                send(INCREMENT_COUNTER, (key,), lambda _row, error: done(error), "COUNTER_INCREMENT")
+                return
+
+            def write(current):
+                if mode == "lww":
+                    send(INSERT_HOT, (key, (current or 0) + 1), lambda _row, error: done(error), "HOT_WRITE")
+                elif current is None:
+                    send(INSERT_HOT_IF_NOT_EXISTS, (key, 1), applied, "LWT_INSERT")
+                else:
+                    send(UPDATE_HOT_IF, (current + 1, key, current), applied, "LWT_UPDATE")
+
+            def applied(row, error):
+                if error is not None or row.applied:
+                    done(error)
+                    return
+                # Lost the Paxos round: the answer carries the value that won, so retry from it
+                with lock:
+                    state["retries"] += 1
+                write(getattr(row, "value", None))
+
+            send(SELECT_HOT, (key,), lambda row, error: done(error) if error else write(row.value if row else None),
+                 "HOT_READ")
+
+        if increments <= 0:
+            all_done.set()
+        begin = self.clock()
+        for _ in range(min(writers, increments)):
+            next_increment()
+        if self.wait_until is None:
+            all_done.wait()
+        else:
+            self.wait_until(all_done.is_set)
+        elapsed = self.clock() - begin
+
+        final = self._final_values(mode, hot_keys)
+        lost = sum(max(0, acked[key] - final[key]) for key in hot_keys)
+        extra = sum(max(0, final[key] - acked[key]) for key in hot_keys)
+        return {
+            "mode": mode, "writers": writers, "hot_keys": keys,
+            "consistency_level": ConsistencyLevel.value_to_name.get(cl, cl),
+            "acknowledged": state["ok"], "errors": state["errors"], "retries": state["retries"],
+            "ops_per_sec": round(state["ok"] / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": latency.percentile(50), "p99_ms": latency.percentile(99),
+            "final_total": sum(final.values()), "lost_updates": lost, "extra_applies": extra,
+        }
+
+    def _final_values(self, mode, hot_keys):
+        query = SELECT_COUNTER if mode == "counter" else SELECT_HOT
+        final = {}
+        for key in hot_keys:
+            row = self.session.execute(*self.statements.request(query, (key,), ConsistencyLevel.QUORUM)).one()
+            final[key] = (row.count if mode == "counter" else row.value) if row else 0
+        return final
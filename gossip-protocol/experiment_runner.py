@@ -2,46 +2,125 @@ import time
 import uuid
 import threading
 from datetime import datetime
-import pandas as pd
-from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
-from cassandra.policies import DCAwareRoundRobinPolicy, RetryPolicy
 from cassandra import ConsistencyLevel
-from cassandra.query import SimpleStatement
-from chaos_injector import ChaosInjector
+from load_engine import WindowedLoad
+from load_workers import connect, ProcessLoad
+from statements import StatementCache, INSERT_ROW, SELECT_VALUE
+from batching import group_batches, driver_replicas
+from contention import ContentionBenchmark, MODES as CONTENTION_MODES
+from metrics_sink import MetricsSink
+from latency_histogram import LatencyRecorder, LatencyHistogram
+from verifier import WriteLedger, TokenRangeVerifier, write_reports
+from fault_timeline import FaultScheduler, DEFAULT_TIMELINE, load_timeline, timeline_length
+from cluster_sim import SimCluster, SimInjector
+
+NODES = ["cassandra-node1", "cassandra-node2", "cassandra-node3"]
 
 class ExperimentLogger:
-    def __init__(self, filename="experiment_metrics.csv"):
-        self.filename = filename
-        self.metrics = []
+    COLUMNS = ("timestamp", "scenario", "operation", "consistency_level", "success",
+               "latency_ms", "coordinator_ip", "is_stale_read", "active_faults")
+
+    def __init__(self, filename=None, fmt="csv", chunk_rows=10000, clock=time.time):
+        # Rows stream to disk in chunks from a background thread, so memory stays flat
+        # however long the run is, and concurrent run_load threads can all log at once.
+        self.filename = filename or f"experiment_metrics.{fmt}"
+        self.sink = MetricsSink(self.filename, self.COLUMNS, fmt=fmt, chunk_rows=chunk_rows)
+        # Latency histograms per (scenario, operation, CL, coordinator) and 1-second buckets
+        self.recorder = LatencyRecorder()
+        # Set by each LabRunner scenario so every row knows which experiment produced it
+        self.scenario = "setup"
+        # The timeline faults active right now ("none" outside a timeline run)
+        self.faults = "none"
+        # While a timeline runs: latency histograms per active fault set
+        self.fault_recorder = None
+        # Wall-clock seconds; virtual under the simulator so timestamps follow simulated time
+        self.clock = clock
 
     def log(self, op_type, cl, success, latency_ms, coordinator, is_stale=False):
-        self.metrics.append({
-            "timestamp": datetime.utcnow().isoformat(),
-            "operation": op_type,
-            "consistency_level": cl,
-            "success": success,
-            "latency_ms": latency_ms,
-            "coordinator_ip": coordinator,
-            "is_stale_read": is_stale
-        })
+        now = self.clock()
+        faults = self.faults
+        self.sink.append((datetime.utcfromtimestamp(now).isoformat(), self.scenario, op_type, cl, success,
+                          latency_ms, coordinator, is_stale, faults))
+        cl_name = ConsistencyLevel.value_to_name.get(cl, cl)
+        self.recorder.record(self.scenario, op_type, cl_name, coordinator, success, latency_ms, now)
+        if self.fault_recorder is not None:
+            self.fault_recorder.record(self.scenario, op_type, cl_name, faults, success, latency_ms, now)
+
+    def log_rows(self, op_type, cl, rows):
+        """
+        Metrics rows a load worker process already timed and put in its histograms,
+        as (timestamp, success, latency_ms, coordinator): written to the file only.
+        """
+        scenario, faults = self.scenario, self.faults
+        for timestamp, success, latency_ms, coordinator in rows:
+            self.sink.append((timestamp, scenario, op_type, cl, success, latency_ms, coordinator, False, faults))
 
     def save(self):
-        df = pd.DataFrame(self.metrics)
-        df.to_csv(self.filename, index=False)
-        print(f"Metrics saved to {self.filename}")
+        self.sink.close()
+        print(f"Metrics saved to {self.filename} ({self.sink.rows_written} rows)")
+        self.recorder.write_report("experiment_latency_summary.csv", "experiment_timeseries.csv")
+
+
+def _ms(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+def _per_sec(count, seconds):
+    return round(count / seconds, 1) if seconds > 0 else 0.0
 
 
 class LabRunner:
-    def __init__(self, contact_points=['127.0.0.1']):
-        profile = ExecutionProfile(
-            load_balancing_policy=DCAwareRoundRobinPolicy(local_dc='datacenter1'),
-            request_timeout=5.0,
-            consistency_level=ConsistencyLevel.QUORUM
-        )
-        self.cluster = Cluster(contact_points, execution_profiles={EXEC_PROFILE_DEFAULT: profile}, protocol_version=5)
-        self.session = self.cluster.connect()
-        self.logger = ExperimentLogger()
-        self.injector = ChaosInjector()
+    def __init__(self, contact_points=['127.0.0.1'], load_window=128, target_rate=None, use_prepared=True,
+                 metrics_format="csv", load_processes=None, sim=None, use_proxy=False):
+        self.contact_points = contact_points
+        self.proxy = None
+        self.routes = None
+        if sim is None:
+            # Imported here so --simulate runs without the docker SDK installed
+            from chaos_injector import ChaosInjector
+            if use_proxy:
+                # Latency, loss and partitions go on local proxy links in front of each node's published CQL port
+                from chaos_proxy import ChaosProxy
+                self.proxy = ChaosProxy({name: ("127.0.0.1", 9042 + i) for i, name in enumerate(NODES)}).start()
+            self.injector = ChaosInjector(proxy=self.proxy)
+            if self.proxy is not None:
+                self.routes = self.injector.proxy_routes()
+            self.cluster, self.session = connect(contact_points, self.routes)
+            self.injector.attach(self.cluster)
+            self.clock, self.sleep, wall_clock = time.perf_counter, time.sleep, time.time
+            self.call_later = None
+            self.load_session, self.wait_until = self.session, None
+            self.replicas_of = driver_replicas(self.cluster, "chaos_lab")
+        else:
+            # Same scenarios, run against cluster_sim on virtual time: every sleep and timeout is instant
+            self.cluster, self.session = sim, sim.connect()
+            self.injector = SimInjector(sim)
+            self.clock, self.sleep, wall_clock = sim.clock, sim.sleep, sim.wall_time
+            self.call_later = sim.call_later  # Timeline faults become events on the virtual clock
+            # The load gets a session whose requests overlap in virtual time, as the driver's do in real time
+            self.load_session, self.wait_until = sim.connect(concurrent=True), sim.run_until
+            self.replicas_of = lambda token: tuple(sorted(node.name for node in sim.replicas(token)))
+            load_processes = 1  # Worker processes would each need their own copy of the simulated cluster
+        # Each distinct query is prepared once and bound per request (or sent as plain text if use_prepared=False)
+        self.statements = StatementCache(self.session, prepared=use_prepared)
+        self.logger = ExperimentLogger(fmt=metrics_format, clock=wall_clock)
+        # Every acknowledged write's id and value, checked by the full-table verifier
+        self.ledger = WriteLedger()
+        self.verifier = TokenRangeVerifier(self.session, self.statements, clock=self.clock)
+        self.consistency_reports = []
+        # How long each fault and heal took to become visible (failure detection, rejoin)
+        self.transition_reports = []
+        # Every fault applied or healed by a timeline, with when it actually happened
+        self.fault_events = []
+        # Rows/sec and request latency per (CL, batching mode) from run_batch_comparison
+        self.batch_reports = []
+        # Throughput, latency and lost updates per (mode, writers, hot keys) from run_contention_benchmark
+        self.contention_reports = []
+        # How many writes run_load keeps in flight, and an optional fixed offered load (ops/sec)
+        self.load_window = load_window
+        self.target_rate = target_rate
+        # Worker processes for heavy-load scenarios (default: one per client core)
+        self.load_processes = load_processes
 
     def setup_schema(self):
         self.session.execute("""
@@ -55,47 +134,145 @@ class LabRunner:
                 updated_at TIMESTAMP
             );
         """)
+        # Hot keys for the contention benchmark: one small row or counter per key
+        self.session.execute("""
+            CREATE TABLE IF NOT EXISTS chaos_lab.hot_rows (
+                id UUID PRIMARY KEY,
+                value INT
+            );
+        """)
+        self.session.execute("""
+            CREATE TABLE IF NOT EXISTS chaos_lab.hot_counters (
+                id UUID PRIMARY KEY,
+                count COUNTER
+            );
+        """)
         print("\nSchema initialized.")
 
-    def run_load(self, count=1000, cl=ConsistencyLevel.QUORUM):
-        print(f"Generating {count} writes at CL={cl}")
-        statement = SimpleStatement(
-            "INSERT INTO chaos_lab.test_data (id, value, updated_at) VALUES (%s, %s, %s)",
-            consistency_level=cl
-        )
-        for i in range(count):
-            start = time.time()
-            success = False
-            coordinator = "UNKNOWN"
-            try:
-                future = self.session.execute_async(statement, (uuid.uuid4(), i, datetime.utcnow()))
-                future.result()
-                coordinator = future.coordinator_host.address if future.coordinator_host else "UNKNOWN"
-                success = True
-            except Exception as e:
-                # print(f"Write failed: {e}")
-                pass
-            latency = (time.time() - start) * 1000
-            self.logger.log("WRITE", cl, success, latency, coordinator)
+    def run_load(self, count=1000, cl=ConsistencyLevel.QUORUM, window=None, target_rate=None,
+                 statements=None, op_type="WRITE", batch_size=1, logged=False, grouped=True):
+        window = window or self.load_window
+        target_rate = target_rate or self.target_rate
+        statements = statements or self.statements
+        if batch_size > 1:
+            return self._run_batched_load(count, cl, window, target_rate, statements, op_type, batch_size, logged,
+                                          grouped)
+        rate_desc = f"{target_rate} ops/sec" if target_rate else "as fast as possible"
+        print(f"Generating {count} writes at CL={cl} (window={window}, {rate_desc})")
+
+        ids = {}  # request index -> row id, only while the write is in flight
+
+        def make_request(i):
+            row_id = ids[i] = uuid.uuid4()
+            return statements.request(INSERT_ROW, (row_id, i, datetime.utcnow()), cl)
+
+        def on_complete(i, success, latency, coordinator):
+            row_id = ids.pop(i)
+            if success:
+                self.ledger.record(row_id, i)
+            self.logger.log(op_type, cl, success, latency, coordinator)
+
+        load = WindowedLoad(self.load_session, window=window, target_rate=target_rate, on_complete=on_complete,
+                            clock=self.clock, sleep=self.sleep, wait_until=self.wait_until)
+        began = self.clock()
+        summary = load.run(count, make_request)
+        # Acknowledged rows over the unrounded run time, comparable with the batch modes' rows/sec
+        summary["rows_written"] = summary["succeeded"]
+        summary["rows_per_sec"] = _per_sec(summary["succeeded"], self.clock() - began)
+        print(f"  -> {summary['succeeded']} ok, {summary['failed']} failed, "
+              f"{summary['ops_per_sec']} ops/sec over {summary['elapsed_s']}s")
+        return summary
+
+    def _run_batched_load(self, count, cl, window, target_rate, statements, op_type, batch_size, logged, grouped):
+        """
+        run_load's batch mode: the `count` rows go out as batches of up to `batch_size`, each
+        batch one request in the window. With `grouped` every batch holds rows owned by the
+        same replicas (see batching.py). `target_rate` stays in rows/sec. Latency and each
+        metrics row are per batch.
+        """
+        kind = "logged" if logged else "unlogged"
+        rows = [(uuid.uuid4(), i) for i in range(count)]
+        batches = group_batches(rows, batch_size, self.replicas_of if grouped else None)
+        rate_desc = f"{target_rate} rows/sec" if target_rate else "as fast as possible"
+        print(f"Generating {count} writes at CL={cl} in {len(batches)} {kind} batches of up to {batch_size}"
+              f"{' grouped by replica set' if grouped else ''} (window={window}, {rate_desc})")
+        state = {"rows": 0}
+        lock = threading.Lock()
+
+        def make_request(b):
+            now = datetime.utcnow()
+            return statements.batch(INSERT_ROW, [(row_id, i, now) for row_id, i in batches[b]], cl, logged)
+
+        def on_complete(b, success, latency, coordinator):
+            if success:
+                for row_id, i in batches[b]:
+                    self.ledger.record(row_id, i)
+                with lock:
+                    state["rows"] += len(batches[b])
+            self.logger.log(op_type, cl, success, latency, coordinator)
+
+        load = WindowedLoad(self.load_session, window=window,
+                            target_rate=target_rate * len(batches) / count if target_rate else None,
+                            on_complete=on_complete, clock=self.clock, sleep=self.sleep, wait_until=self.wait_until)
+        began = self.clock()
+        summary = load.run(len(batches), make_request)
+        summary["rows_written"] = state["rows"]
+        summary["rows_per_sec"] = _per_sec(state["rows"], self.clock() - began)
+        print(f"  -> {summary['succeeded']} batches ok, {summary['failed']} failed, "
+              f"{summary['rows_per_sec']} rows/sec over {summary['elapsed_s']}s")
+        return summary
+
+    def run_load_multiprocess(self, count, cl=ConsistencyLevel.QUORUM, processes=None, op_type="WRITE"):
+        load = ProcessLoad(self.contact_points, processes=processes or self.load_processes, window=self.load_window,
+                           target_rate=self.target_rate, use_prepared=self.statements.prepared,
+                           recorder=self.logger.recorder, routes=self.routes, ledger=self.ledger,
+                           on_rows=lambda rows: self.logger.log_rows(op_type, cl, rows))
+        print(f"Generating {count} writes at CL={cl} across {load.processes} worker processes "
+              f"(window={self.load_window} each)")
+        summary = load.run(count, cl, scenario=self.logger.scenario, op_type=op_type)
+        print(f"  -> {summary['succeeded']} ok, {summary['failed']} failed, "
+              f"{summary['ops_per_sec']} ops/sec over {summary['elapsed_s']}s")
+        return summary
 
     def verify_consistency(self, cl=ConsistencyLevel.QUORUM):
-        print(f"Verifying reads at CL={cl}")
-        statement = SimpleStatement("SELECT * FROM chaos_lab.test_data LIMIT 1000", consistency_level=cl)
-        start = time.time()
-        try:
-            future = self.session.execute_async(statement)
-            rows = future.result()
-            coordinator = future.coordinator_host.address if future.coordinator_host else "UNKNOWN"
-            self.logger.log("READ", cl, True, (time.time() - start) * 1000, coordinator, is_stale=False)
-            print(f"Read {len(list(rows))} rows successfully.")
-        except Exception as e:
-            print(f"Read failed: {e}")
-            self.logger.log("READ", cl, False, (time.time() - start) * 1000, "UNKNOWN", is_stale=True)
+        print(f"Verifying every row at CL={cl} against the {len(self.ledger)} writes acknowledged so far")
+
+        def on_range(success, latency, coordinator, stale_rows):
+            self.logger.log("READ", cl, success, latency, coordinator, is_stale=stale_rows > 0)
+
+        report = self.verifier.verify(self.ledger, cl, on_range=on_range)
+        report = {"scenario": self.logger.scenario, **report}
+        self.consistency_reports.append(report)
+        print(f"  -> {report['rows_scanned']} rows scanned in {report['elapsed_s']}s: "
+              f"{report['missing']} missing, {report['stale']} stale, {report['unledgered']} not in the ledger"
+              + (f", {report['failed_ranges']} token ranges unreadable at this CL" if report["failed_ranges"] else ""))
+        return report
+
+    def wait_for(self, state, node_name=None, timeout=None):
+        """
+        Waits until the cluster reaches `state` - "down" or "up" for `node_name`, or "all_up" -
+        instead of sleeping a fixed time, and records how long the transition took.
+        """
+        if state == "all_up":
+            seconds = self.injector.wait_until_all_up(timeout or 300.0)
+        elif state == "down":
+            seconds = self.injector.wait_until_down(node_name, timeout or 60.0)
+        else:
+            seconds = self.injector.wait_until_up(node_name, timeout or 180.0)
+        self.transition_reports.append({
+            "scenario": self.logger.scenario,
+            "node": node_name or "all",
+            "state": state.upper(),
+            "seconds": None if seconds is None else round(seconds, 3),
+            "timed_out": seconds is None,
+        })
+        return seconds
 
     # --- EXPLICIT EXPERIMENTS FROM THE LAB ARCHITECTURE ---
 
     def run_scenario_1_baseline(self):
         print("\n=== Scenario 1: Baseline Healthy Cluster ===")
+        self.logger.scenario = "scenario_1_baseline"
         print("WHAT IT IS: The normal state of the database where all 3 nodes (computers) are awake and talking.")
         print("WHY IT MATTERS: A distributed database spreads your data across multiple machines so it's always safe. ")
         print("                'QUORUM' means we only consider a save successful if the majority (2 out of 3) agree they got it.")
@@ -107,33 +284,35 @@ class LabRunner:
 
     def run_scenario_2_node_crash(self):
         print("\n=== Scenario 2: Single Node Crash ===")
+        self.logger.scenario = "scenario_2_node_crash"
         print("WHAT IT IS: We are yanking the power cord on Node 3. It's totally dead.")
         print("WHY IT MATTERS: In a normal database (like MySQL), if the server dies, your app goes down.")
         print("                Here, because our Consistency Level is QUORUM (2 of 3), Node 1 and Node 2 can still process")
         print("                everything without Node 3! Notice how the Gossip protocol figures out Node 3 is dead and stops bothering it.")
         print("\n[Action]: Stopping Node 3...")
         self.injector.stop_node("cassandra-node3")
-        time.sleep(10) # Wait for Gossip to mark DOWN
+        self.wait_for("down", "cassandra-node3")  # Failure detection: how long until the cluster stops trying it
         print("[Action]: Proving the database still works anyway because 2 nodes are still alive.")
         self.run_load(200, ConsistencyLevel.QUORUM)
         self.verify_consistency(ConsistencyLevel.QUORUM)
         print("[Action]: Turning Node 3 back on. It will quietly catch up on what it missed.")
         self.injector.start_node("cassandra-node3")
+        self.wait_for("up", "cassandra-node3")  # Ring rejoin
         print("Node 3 restarted. Scenario 2 Complete.")
-        time.sleep(15) # Wait for ring rejoin
 
     def run_scenario_3_write_one_during_failure(self):
         print("\n=== Scenario 3: Write with Consistency 'ONE' During Failure ===")
+        self.logger.scenario = "scenario_3_write_one_during_failure"
         print("WHAT IT IS: We lower our standards. 'ConsistencyLevel.ONE' means 'I only need 1 computer to save this data'.")
         print("WHY IT MATTERS: If 2 of your 3 nodes crash, your database is technically still alive if you only require 1 vote!")
         print("                But there's a risk: If only 1 node gets the info, the others are out-of-date (Stale Data).")
         print("                This teaches the tradeoff between 'Being Available no matter what' vs 'Being 100% Correct'.")
         print("\n[Action]: Stopping Node 3 and writing new data while asking only ONE node to confirm.")
         self.injector.stop_node("cassandra-node3")
-        time.sleep(10)
+        self.wait_for("down", "cassandra-node3")
         self.run_load(200, ConsistencyLevel.ONE)
         self.injector.start_node("cassandra-node3")
-        time.sleep(10) # Give it time to boot, but Hinted Handoff might not be instant
+        self.wait_for("up", "cassandra-node3")  # Booted, but Hinted Handoff might not be instant
         print("[Action]: Reading back the data. First at Level ONE (might get old data), then QUORUM (forces consensus).")
         self.verify_consistency(ConsistencyLevel.ONE)
         self.verify_consistency(ConsistencyLevel.QUORUM)
@@ -141,38 +320,37 @@ class LabRunner:
 
     def run_scenario_4_partition(self):
         print("\n=== Scenario 4: Network Partition (Split Brain) ===")
+        self.logger.scenario = "scenario_4_partition"
         print("WHAT IT IS: Node 2 is still running, but somebody unplugged its network cable. It can't talk to Node 1 or 3.")
         print("WHY IT MATTERS: Network cables fail all the time. If Node 2 is isolated, it thinks the *others* died.")
         print("                This is a 'Partition'. If an app talks to Node 2 right now, it will get totally different answers")
         print("                than an app talking to Node 1. The database diverges, and must merge later when the cable is plugged back in.")
         print("\n[Action]: Disconnecting Node 2 from the network.")
         self.injector.partition_network("cassandra-node2")
-        time.sleep(5)
+        self.wait_for("down", "cassandra-node2")  # Nothing closes the sockets here; only the failure detector notices
         print("[Action]: Saving data while the brain is split.")
         self.run_load(200, ConsistencyLevel.ONE) 
         print("[Action]: Reconnecting Node 2. Watch them argue and figure out who has the newest data based on timestamps (Last-Write-Wins).")
         self.injector.heal_network("cassandra-node2")
-        time.sleep(15)
+        self.wait_for("up", "cassandra-node2")
         self.verify_consistency(ConsistencyLevel.QUORUM)
         print("Scenario 4 Complete.")
 
     def run_scenario_5_conflicting_writes(self):
         print("\n=== Scenario 5: Conflicting Writes (The Timestamp Battle) ===")
+        self.logger.scenario = "scenario_5_conflicting_writes"
         print("WHAT IT IS: Two people click 'Save' on the exact same row at the exact same millisecond.")
         print("WHY IT MATTERS: Cassandra doesn't 'lock' the row (like traditional databases) because locks are slow.")
         print("                Instead, whoever's clock timestamp is literally 1 microsecond newer overwrites the other.")
         print("                This teaches you that distributed systems heavily rely on perfect server clocks!")
         
         conflict_id = uuid.uuid4()
-        statement = SimpleStatement(
-            "INSERT INTO chaos_lab.test_data (id, value, updated_at) VALUES (%s, %s, %s)",
-            consistency_level=ConsistencyLevel.ONE
-        )
         print(f"\n[Action]: Forcefully inserting value 100 and value 200 at the Exact Same Time for ID: {conflict_id}.")
         
         def write_task(val):
             try:
-                self.session.execute(statement, (conflict_id, val, datetime.utcnow()))
+                self.session.execute(*self.statements.request(
+                    INSERT_ROW, (conflict_id, val, datetime.utcnow()), ConsistencyLevel.ONE))
             except Exception:
                 pass
 
@@ -183,29 +361,39 @@ class LabRunner:
         t1.join()
         t2.join()
         
-        row = self.session.execute(f"SELECT value FROM chaos_lab.test_data WHERE id={conflict_id}").one()
+        row = self.session.execute(*self.statements.request(SELECT_VALUE, (conflict_id,), ConsistencyLevel.QUORUM)).one()
+        if row:
+            # Neither client can know which write won; the QUORUM answer is what every replica must converge to
+            self.ledger.record(conflict_id, row.value)
         print(f"[Result]: The winner was Value: {row.value if row else 'None'}. The loser was silently erased!")
         print("Scenario 5 Complete.")
 
     def run_scenario_6_heavy_load(self):
         print("\n=== Scenario 6: Heavy Traffic Load ===")
+        self.logger.scenario = "scenario_6_heavy_load"
         print("WHAT IT IS: We simulate thousands of furious users hammering the database all at once.")
         print("WHY IT MATTERS: A system behaves perfectly when idle, but when rushed, CPUs peak and memory fills up.")
         print("                Cassandra handles this gracefully by dropping connections instead of crashing outright.")
-        print("\n[Action]: Creating 10 simultaneous threads to barrage the nodes with writes.")
-        threads = []
-        for i in range(10):
-            t = threading.Thread(target=self.run_load, args=(500, ConsistencyLevel.QUORUM))
-            threads.append(t)
-            t.start()
-        for t in threads:
-            t.join()
+        if self.load_processes == 1:
+            print("\n[Action]: Creating 10 simultaneous threads to barrage the nodes with writes.")
+            threads = []
+            for i in range(10):
+                t = threading.Thread(target=self.run_load, args=(500, ConsistencyLevel.QUORUM))
+                threads.append(t)
+                t.start()
+            for t in threads:
+                t.join()
+        else:
+            # Threads share one GIL and one driver event loop; separate processes each get their own
+            print("\n[Action]: Starting one load process per CPU core, each with its own connections, to barrage the nodes.")
+            self.run_load_multiprocess(5000, ConsistencyLevel.QUORUM)
         print("[Action]: Reading back to ensure data wasn't corrupted under pressure.")
         self.verify_consistency(ConsistencyLevel.QUORUM)
         print("Scenario 6 Complete.")
 
     def run_scenario_7_full_shutdown(self):
         print("\n=== Scenario 7: Full Cluster Shutdown & Recovery ===")
+        self.logger.scenario = "scenario_7_full_shutdown"
         print("WHAT IT IS: We completely turn off the entire data center at the exact same moment.")
         print("WHY IT MATTERS: Power outages happen! When 3 panicked nodes boot up at the same time, they use Gossip")
         print("                (like whispering secrets in a classroom) to figure out who is awake, who has data, and how to rebuild the ring.")
@@ -214,16 +402,17 @@ class LabRunner:
         self.injector.stop_node("cassandra-node1")
         self.injector.stop_node("cassandra-node2")
         self.injector.stop_node("cassandra-node3")
-        print("Entire cluster stopped. Waiting 10s...")
-        time.sleep(10)
+        print("Entire cluster stopped. Waiting until every node is seen down...")
+        for node in NODES:
+            self.wait_for("down", node)
         
         print("\n[Action]: Starting them back up. Watch the chaotic Gossip bootup sequence...")
         self.injector.start_node("cassandra-node1")
-        time.sleep(15) # Seeds boot first
+        self.wait_for("up", "cassandra-node1")  # Seeds boot first
         self.injector.start_node("cassandra-node2")
-        time.sleep(15)
+        self.wait_for("up", "cassandra-node2")
         self.injector.start_node("cassandra-node3")
-        time.sleep(20) # Stabilization
+        self.wait_for("all_up")  # Stabilization
         
         print("[Action]: Proving our data survived the apocalypse.")
         self.verify_consistency(ConsistencyLevel.QUORUM)
@@ -231,6 +420,7 @@ class LabRunner:
 
     def run_scenario_8_network_latency(self):
         print("\n=== Scenario 8: Network Latency (The 'Slow' Node) ===")
+        self.logger.scenario = "scenario_8_network_latency"
         print("WHAT IT IS: Instead of a node crashing completely, it just becomes very slow.")
         print("WHY IT MATTERS: In real life, network cables go bad or servers get bogged down.")
         print("                A slow node is often worse than a dead node because it holds up the whole system waiting for a response.")
@@ -249,39 +439,229 @@ class LabRunner:
 
     def run_scenario_9_anti_entropy_repair(self):
         print("\n=== Scenario 9: Anti-Entropy Repair (Manual Data Synchronization) ===")
+        self.logger.scenario = "scenario_9_anti_entropy_repair"
         print("WHAT IT IS: Cassandra doesn't immediately fix all broken data by itself.")
         print("WHY IT MATTERS: If a node is offline for too long (default 3 hours), the cluster gives up holding missed messages (Hinted Handoffs).")
         print("                You must manually run a 'repair' tool to sync differences using Merkle Trees.")
         
         print("\n[Action]: Stopping Node 3 to break the data circle...")
         self.injector.stop_node("cassandra-node3")
-        time.sleep(10)
+        self.wait_for("down", "cassandra-node3")
         
         print("[Action]: Writing to Node 1 & Node 2 while Node 3 is asleep.")
         self.run_load(100, ConsistencyLevel.QUORUM)
         
         print("\n[Action]: Restarting Node 3. It is now missing 100 rows of data.")
         self.injector.start_node("cassandra-node3")
-        time.sleep(15) # Wait for Gossip to see it alive
+        self.wait_for("up", "cassandra-node3")  # Wait for Gossip to see it alive
         
         print("[Action]: Taking matters into our own hands. Running 'nodetool repair' internally on Node 1.")
         print("          This command scans all 3 nodes, finds differences, and copies the missing files over.")
-        import subprocess
         try:
-            # We call docker exec to run nodetool locally inside the container
-            subprocess.run("docker exec cassandra-node1 nodetool repair chaos_lab", shell=True, check=True)
+            self.injector.repair("cassandra-node1", "chaos_lab")
             print("Repair completed successfully. All data is perfectly in sync.")
         except Exception as e:
             print(f"Repair command failed (which happens in chaos!): {e}")
 
         print("Scenario 9 Complete.")
 
+    def run_scenario_10_fault_timeline(self, timeline=None, rate=500, cl=ConsistencyLevel.QUORUM):
+        print("\n=== Scenario 10: Overlapping Faults Under Continuous Load ===")
+        self.logger.scenario = "scenario_10_fault_timeline"
+        print("WHAT IT IS: Traffic never stops while faults come and go on a schedule, sometimes several at once.")
+        print("WHY IT MATTERS: The other scenarios pause traffic while they break or fix something, so they never show")
+        print("                the moment a node dies mid-request, or how long latency takes to settle after a heal.")
+        print("                Every request here is tagged with the faults active when it finished.")
+        timeline = timeline or DEFAULT_TIMELINE
+        length = timeline_length(timeline)
+        print("\n[Action]: Writing continuously for", length + 10, "seconds while this timeline plays out:")
+        for event in sorted(timeline, key=lambda e: e["at"]):
+            args = ", ".join(f"{k}={v}" for k, v in event.get("args", {}).items())
+            print(f"          t+{event['at']}s  {event['fault']} on {event['node']} for {event['duration']}s"
+                  + (f" ({args})" if args else ""))
+
+        def on_change(label):
+            self.logger.faults = label
+            print(f"[Timeline]: active faults now: {label}")
+
+        self.logger.fault_recorder = LatencyRecorder()
+        scheduler = FaultScheduler(self.injector, timeline, clock=self.clock, call_later=self.call_later,
+                                   on_change=on_change).start()
+        try:
+            # A fixed offered load, not flat out, so requests keep arriving at the same rate through every fault;
+            # the 10s tail after the last heal shows the recovery
+            self.run_load(int(rate * (length + 10)), cl, target_rate=rate)
+            remaining = length - (self.clock() - scheduler.started)
+            if remaining > 0:
+                self.sleep(remaining)
+        finally:
+            scheduler.finish()
+            self.logger.faults = "none"
+            self.fault_events.extend({"scenario": self.logger.scenario, **event} for event in scheduler.events)
+        by_faults, self.logger.fault_recorder = self.logger.fault_recorder, None
+
+        print(f"\n{'active faults':<60}{'ok':>8}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}")
+        for row in by_faults.summary_rows():
+            print(f"{row['coordinator_ip']:<60}{row['ok']:>8}{row['errors']:>8}"
+                  f"{_ms(row['p50_ms']):>9}{_ms(row['p99_ms']):>9}")
+        self.wait_for("all_up")
+        print("Scenario 10 Complete.")
+
+    def cluster_cpu_seconds(self):
+        """CPU seconds consumed so far by all three Cassandra containers together."""
+        try:
+            return sum(self.injector.cpu_seconds(node) for node in NODES)
+        except Exception as e:
+            print(f"Could not read container CPU stats: {e}")
+            return float("nan")
+
+    def run_statement_comparison(self, count=2000, cl=ConsistencyLevel.QUORUM):
+        print("\n=== Experiment: Simple vs Prepared Statements ===")
+        self.logger.scenario = "statement_comparison"
+        print("WHAT IT IS: The exact same writes, sent two ways. A 'simple' statement ships the full CQL text every time,")
+        print("            so the coordinator node re-parses it on every single request. A 'prepared' statement is parsed once,")
+        print("            then each request only carries a statement ID plus the values.")
+        print("WHY IT MATTERS: Parsing costs coordinator CPU on every request. Prepared statements also tell the driver the")
+        print("                partition key, so token-aware routing can skip the extra coordinator hop entirely.")
+        results = []
+        for label, statements in (("SIMPLE", StatementCache(self.session, prepared=False)), ("PREPARED", self.statements)):
+            print(f"\n[Action]: {count} writes using {label} statements.")
+            cpu_before = self.cluster_cpu_seconds()
+            summary = self.run_load(count, cl, statements=statements, op_type=f"WRITE_{label}")
+            cpu_used = self.cluster_cpu_seconds() - cpu_before
+            results.append((label, summary, cpu_used))
+
+        print(f"\n{'mode':<10}{'ops/sec':>10}{'mean ms':>10}{'cluster CPU ms / 1k ops':>26}")
+        for label, summary, cpu_used in results:
+            cpu_per_k = cpu_used * 1000 / max(1, summary["succeeded"]) * 1000
+            print(f"{label:<10}{summary['ops_per_sec']:>10}{summary['mean_latency_ms']:>10}{cpu_per_k:>26.1f}")
+        print("Statement comparison complete.")
+        return results
+
+    def run_batch_comparison(self, count=5000, batch_size=20,
+                             cls=(ConsistencyLevel.ONE, ConsistencyLevel.QUORUM, ConsistencyLevel.ALL)):
+        print("\n=== Experiment: Single-Row Writes vs Batches ===")
+        self.logger.scenario = "batch_comparison"
+        print("WHAT IT IS: The same rows written one per request, in unlogged batches of rows that live on the same")
+        print("            replicas, in unlogged batches of rows from anywhere, and in logged (atomic) batches.")
+        print("WHY IT MATTERS: A batch saves client round trips, but the coordinator still has to deliver every row")
+        print("                to that row's replicas. Rows from all over the ring make it wait on most of the cluster,")
+        print("                and a logged batch pays an extra batchlog write before any row is applied.")
+        modes = (("SINGLE", {}),
+                 ("UNLOGGED", {"batch_size": batch_size}),
+                 ("UNLOGGED_MIXED", {"batch_size": batch_size, "grouped": False}),
+                 ("LOGGED", {"batch_size": batch_size, "logged": True}))
+        results = []
+        for cl in cls:
+            cl_name = ConsistencyLevel.value_to_name.get(cl, cl)
+            for label, options in modes:
+                print(f"\n[Action]: {count} rows at CL={cl_name} as {label}.")
+                summary = self.run_load(count, cl, op_type=f"WRITE_{label}", **options)
+                p50, p99 = self._request_percentiles(f"WRITE_{label}", cl_name)
+                results.append({
+                    "consistency_level": cl_name, "mode": label, "batch_size": options.get("batch_size", 1),
+                    "requests_ok": summary["succeeded"], "requests_failed": summary["failed"],
+                    "rows_per_sec": summary["rows_per_sec"],
+                    "request_p50_ms": p50, "request_p99_ms": p99,
+                })
+
+        print(f"\n{'CL':<8}{'mode':<16}{'rows/sec':>10}{'p50 ms':>9}{'p99 ms':>9}{'failed':>8}")
+        for row in results:
+            print(f"{row['consistency_level']:<8}{row['mode']:<16}{row['rows_per_sec']:>10}"
+                  f"{_ms(row['request_p50_ms']):>9}{_ms(row['request_p99_ms']):>9}{row['requests_failed']:>8}")
+        self.batch_reports.extend(results)
+        print("Batch comparison complete.")
+        return results
+
+    def run_contention_benchmark(self, writers=(1, 8, 32), hot_keys=(1, 16, 256), increments=1000,
+                                 cl=ConsistencyLevel.QUORUM, modes=CONTENTION_MODES):
+        print("\n=== Experiment: Hot-Key Contention (Last-Write-Wins vs Lightweight Transactions vs Counters) ===")
+        self.logger.scenario = "contention"
+        print("WHAT IT IS: Many writers all adding 1 to a handful of keys: read-then-write, read-then-write IF the value")
+        print("            is unchanged (a Paxos lightweight transaction), and counter columns.")
+        print("WHY IT MATTERS: Plain writes never conflict, they overwrite: two writers that read the same value both")
+        print("                succeed and one increment is gone. LWTs lose nothing but pay four round trips per attempt,")
+        print("                and retries pile up as more writers chase fewer keys. Counters add without reading.")
+        benchmark = ContentionBenchmark(
+            self.load_session, self.statements, self.clock, self.wait_until,
+            on_request=lambda operation, success, latency, coordinator: self.logger.log(
+                operation, cl, success, latency, coordinator))
+        results = []
+        for keys in hot_keys:
+            for count in writers:
+                for mode in modes:
+                    print(f"\n[Action]: {count} writers, {keys} hot keys, {increments} increments as {mode.upper()}.")
+                    summary = benchmark.run(mode, count, keys, increments, cl)
+                    print(f"  -> {summary['acknowledged']} acknowledged, {summary['lost_updates']} lost, "
+                          f"{summary['retries']} retries, {summary['ops_per_sec']} increments/sec")
+                    results.append(summary)
+
+        print(f"\n{'keys':>6}{'writers':>8}  {'mode':<9}{'incr/sec':>10}{'p50 ms':>9}{'p99 ms':>10}"
+              f"{'retries':>9}{'errors':>8}{'lost':>7}{'extra':>7}")
+        for row in results:
+            print(f"{row['hot_keys']:>6}{row['writers']:>8}  {row['mode']:<9}{row['ops_per_sec']:>10}"
+                  f"{_ms(row['p50_ms']):>9}{_ms(row['p99_ms']):>10}{row['retries']:>9}{row['errors']:>8}"
+                  f"{row['lost_updates']:>7}{row['extra_applies']:>7}")
+        self.contention_reports.extend(results)
+        print("Contention benchmark complete.")
+        return results
+
+    def _request_percentiles(self, operation, cl_name):
+        """p50 / p99 of one operation in the current scenario, across every coordinator."""
+        latency, _, _ = self.logger.recorder.merged()
+        merged = LatencyHistogram()
+        for (scenario, op, cl, _coordinator), hist in latency.items():
+            if (scenario, op, cl) == (self.logger.scenario, operation, cl_name):
+                merged.merge(hist)
+        if not merged.total:
+            return None, None
+        return merged.percentile(50), merged.percentile(99)
+
     def close(self):
         self.logger.save()
+        write_reports("experiment_consistency.csv", self.consistency_reports)
+        write_reports("experiment_transitions.csv", self.transition_reports)
+        write_reports("experiment_fault_timeline.csv", self.fault_events)
+        write_reports("experiment_batches.csv", self.batch_reports)
+        write_reports("experiment_contention.csv", self.contention_reports)
         self.cluster.shutdown()
+        if self.proxy is not None:
+            self.proxy.stop()
 
 if __name__ == "__main__":
-    runner = LabRunner(['127.0.0.1'])
+    import argparse
+    parser = argparse.ArgumentParser(description="Cassandra chaos engineering lab runner.")
+    parser.add_argument("--window", type=int, default=128, help="Writes kept in flight by run_load")
+    parser.add_argument("--rate", type=float, default=None, help="Fixed offered load in ops/sec (default: unthrottled)")
+    parser.add_argument("--simple-statements", action="store_true",
+                        help="Send plain-text SimpleStatements instead of prepared statements")
+    parser.add_argument("--metrics-format", choices=["csv", "arrow"], default="csv",
+                        help="experiment_metrics.csv, or a binary columnar Arrow stream (experiment_metrics.arrow)")
+    parser.add_argument("--load-processes", type=int, default=None,
+                        help="Worker processes for the heavy-load scenario (default: CPU count; 1 = threads in this process)")
+    parser.add_argument("--proxy", action="store_true",
+                        help="Inject latency, loss and partitions on a local TCP proxy instead of tc/Docker networks")
+    parser.add_argument("--timeline", default=None,
+                        help="JSON fault timeline for scenario 10 (default: fault_timeline.DEFAULT_TIMELINE)")
+    parser.add_argument("--timeline-rate", type=float, default=500, help="Offered load in ops/sec during scenario 10")
+    parser.add_argument("--batch-size", type=int, default=20, help="Rows per batch in the batch comparison")
+    parser.add_argument("--contention-writers", type=int, nargs="+", default=[1, 8, 32],
+                        help="Concurrent writers per run of the contention benchmark")
+    parser.add_argument("--contention-keys", type=int, nargs="+", default=[1, 16, 256],
+                        help="Hot keys per run of the contention benchmark")
+    parser.add_argument("--report", default=None, metavar="DIR",
+                        help="After the run, aggregate the metrics file into an HTML/PNG report in DIR")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Run against the in-process cluster simulator instead of Docker (no containers needed)")
+    parser.add_argument("--sim-nodes", type=int, default=3, help="Number of simulated nodes")
+    parser.add_argument("--sim-seed", type=int, default=0, help="Random seed for the simulator")
+    args = parser.parse_args()
+
+    timeline = load_timeline(args.timeline) if args.timeline else None  # Fail on a bad file before anything runs
+    sim = SimCluster(nodes=args.sim_nodes, seed=args.sim_seed) if args.simulate else None
+    runner = LabRunner(['127.0.0.1'], load_window=args.window, target_rate=args.rate,
+                       use_prepared=not args.simple_statements, metrics_format=args.metrics_format,
+                       load_processes=args.load_processes, sim=sim, use_proxy=args.proxy)
     try:
         runner.setup_schema()
         
@@ -297,8 +677,15 @@ if __name__ == "__main__":
         # Advanced / Educational Scenarios
         runner.run_scenario_8_network_latency()
         runner.run_scenario_9_anti_entropy_repair()
+        runner.run_scenario_10_fault_timeline(timeline, rate=args.timeline_rate)
+        runner.run_statement_comparison()
+        runner.run_batch_comparison(batch_size=args.batch_size)
+        runner.run_contention_benchmark(args.contention_writers, args.contention_keys)
         
         print("\nAll Experimental Phases successfully executed locally.")
         
     finally:
         runner.close()
+    if args.report:
+        from analyze_metrics import analyze, write_report
+        write_report(analyze(runner.logger.filename), args.report, source=runner.logger.filename)
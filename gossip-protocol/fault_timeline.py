@@ -0,0 +1,160 @@
+"""
+Faults on a timeline, applied while the load keeps running.
+
+The numbered scenarios inject a fault, run load, then heal, one step after
+another, so no request is ever in flight at the moment a fault hits or heals.
+A timeline declares faults at offsets from the start of a run instead:
+
+    [{"at": 10, "duration": 20, "fault": "crash",   "node": "cassandra-node3"},
+     {"at": 15, "duration": 10, "fault": "latency", "node": "cassandra-node1", "args": {"delay": "200ms"}}]
+
+FaultScheduler applies and heals them on time, overlapping if the timeline says
+so, while a paced WindowedLoad runs alongside. Every metric row is tagged with
+the set of faults active when it completed, which gives latency and error rate
+through the onset, the overlap and the recovery of each fault.
+
+Timelines are JSON files (a list like the one above) or Python lists of dicts.
+"""
+import json
+import time
+import threading
+
+# fault name -> (injector method that applies it, injector method that heals it)
+FAULTS = {
+    "crash": ("stop_node", "start_node"),
+    "partition": ("partition_network", "heal_network"),
+    "latency": ("inject_latency", "heal_latency"),
+    "loss": ("inject_loss", "heal_latency"),
+    "bandwidth": ("limit_bandwidth", "heal_latency"),
+}
+# These share one netem qdisc (or proxy link) per node, and heal_latency clears all of them
+LINK_FAULTS = ("latency", "loss", "bandwidth")
+
+DEFAULT_TIMELINE = [
+    {"at": 10, "duration": 20, "fault": "crash", "node": "cassandra-node3"},
+    {"at": 20, "duration": 15, "fault": "latency", "node": "cassandra-node1", "args": {"delay": "200ms"}},
+    {"at": 45, "duration": 10, "fault": "partition", "node": "cassandra-node2"},
+]
+
+
+def load_timeline(path):
+    with open(path) as f:
+        return validate(json.load(f))
+
+
+def validate(timeline, injector=None):
+    """Checks every event's shape and, given the injector, that it has the methods each fault needs."""
+    for event in timeline:
+        if event.get("fault") not in FAULTS:
+            raise ValueError(f"Unknown fault {event.get('fault')!r}; expected one of {', '.join(FAULTS)}")
+        missing = [name for name in FAULTS[event["fault"]] if injector is not None and not hasattr(injector, name)]
+        if missing:
+            raise ValueError(f"{type(injector).__name__} cannot inject {event['fault']!r} faults "
+                             f"(no {', '.join(missing)})")
+        if "node" not in event or event.get("at", -1) < 0 or event.get("duration", 0) <= 0:
+            raise ValueError(f"Each fault needs a node, an 'at' >= 0 and a positive 'duration': {event}")
+    return timeline
+
+
+def timeline_length(timeline):
+    return max((event["at"] + event["duration"] for event in timeline), default=0)
+
+
+class FaultScheduler:
+    """
+    Fires each fault's apply and heal at its offset from start().
+
+    By default a background thread keeps time with `clock`. Under the simulator pass
+    `call_later` (SimCluster.call_later) instead: the actions become events on the
+    virtual clock and fire in order with the load's own requests.
+
+    on_change(label) is called with the new active fault set, e.g.
+    "crash:cassandra-node3+latency:cassandra-node1", or "none".
+    """
+
+    def __init__(self, injector, timeline, clock=time.perf_counter, call_later=None, on_change=None):
+        self.injector = injector
+        self.timeline = validate(list(timeline), injector)
+        self.clock = clock
+        self.call_later = call_later
+        self.on_change = on_change
+        self.active = {}   # (fault, node) -> the timeline event that applied it
+        self.events = []   # What actually happened, and when
+        self.started = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _actions(self):
+        actions = []
+        for event in self.timeline:
+            actions.append((event["at"], 1, "inject", event))
+            actions.append((event["at"] + event["duration"], 0, "heal", event))
+        # Heals sort before injections at the same offset, so back-to-back faults don't overlap for an instant
+        return sorted(actions, key=lambda action: action[:2])
+
+    def start(self):
+        self.started = self.clock()
+        if self.call_later is not None:
+            for offset, _, action, event in self._actions():
+                self.call_later(offset, self._fire, action, event)
+        else:
+            self._thread = threading.Thread(target=self._run, name="fault-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        for offset, _, action, event in self._actions():
+            if self._stop.wait(max(0.0, offset - (self.clock() - self.started))):
+                return
+            self._fire(action, event)
+
+    def _fire(self, action, event, final=False):
+        if self._stop.is_set() and not final:
+            return  # A virtual-clock event still queued after finish()
+        fault, node = event["fault"], event["node"]
+        with self._lock:
+            try:
+                method = getattr(self.injector, FAULTS[fault][0 if action == "inject" else 1])
+                if action == "inject":
+                    method(node, **event.get("args", {}))
+                    self.active[(fault, node)] = event
+                else:
+                    self.active.pop((fault, node), None)
+                    method(node)
+                    if fault in LINK_FAULTS:
+                        self._reapply_link_faults(node)
+                error = ""
+            except Exception as e:
+                print(f"Timeline: {action} {fault} on {node} failed: {e}")
+                error = repr(e)
+            self.events.append({
+                "offset_s": round(self.clock() - self.started, 3),
+                "scheduled_s": event["at"] if action == "inject" else event["at"] + event["duration"],
+                "action": action,
+                "fault": fault,
+                "node": node,
+                "active_faults": self.label(),
+                "error": error,
+            })
+            if self.on_change:
+                self.on_change(self.label())
+
+    def _reapply_link_faults(self, node):
+        # heal_latency cleared the whole link, including faults on it that are still meant to be active
+        for (fault, other), event in self.active.items():
+            if other == node and fault in LINK_FAULTS:
+                getattr(self.injector, FAULTS[fault][0])(node, **event.get("args", {}))
+
+    def label(self):
+        with self._lock:
+            return "+".join(sorted(f"{fault}:{node}" for fault, node in self.active)) or "none"
+
+    def finish(self):
+        """Stops the scheduler and heals whatever is still active (a run shorter than its timeline)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            for fault, node in list(self.active):
+                self._fire("heal", self.active[(fault, node)], final=True)
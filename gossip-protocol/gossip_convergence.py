@@ -0,0 +1,200 @@
+"""
+How fast does gossip spread news through a cluster of 1,000 - 100,000 nodes?
+
+Each simulated round, every node contacts `fanout` random peers, as Cassandra's
+Gossiper does once a second. The whole cluster's knowledge is one NumPy matrix
+(nodes x updates): entry [n, k] is the version of update k that node n has
+seen. A round is a few array operations over that matrix, so 100k nodes take
+milliseconds per round rather than a Python loop over every message.
+
+Modes:
+  push       - the caller sends what it knows                   (1 message)
+  pull       - the caller asks, the peer answers                (2 messages)
+  push-pull  - Cassandra's SYN / ACK / ACK2 exchange: both sides
+               end up with the newer of each other's state       (3 messages)
+
+Loss drops each message independently. A partition cuts a fraction of the
+nodes off from the rest until `heal_round`. Rounds are synchronous: everyone
+acts on what they knew at the end of the previous round.
+
+Example:
+    python gossip_convergence.py --nodes 1000,10000,100000 --fanout 1,2,3 --loss 0,0.1 --interval 1.0
+"""
+import sys
+import time
+import json
+import math
+import argparse
+import numpy as np
+
+MODES = ("push", "pull", "push-pull")
+
+
+def simulate(nodes, fanout=1, mode="push-pull", loss=0.0, updates=8, partition=0.0, heal_round=None,
+             max_rounds=500, seed=0):
+    """
+    Spreads `updates` independent pieces of news, each starting at a random node.
+    Returns rounds until 50% / 99% / 100% of nodes know every update (None if never),
+    plus the number of messages sent along the way.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown gossip mode: {mode}")
+    rng = np.random.default_rng(seed)
+    known = np.zeros((nodes, updates), dtype=np.int32)
+    origins = rng.choice(nodes, size=updates, replace=False)
+    known[origins, np.arange(updates)] = 1
+
+    # Partition: the first `partition` share of a shuffled node order forms the minority side
+    side = np.zeros(nodes, dtype=bool)
+    side[rng.permutation(nodes)[:int(nodes * partition)]] = True
+
+    callers = np.repeat(np.arange(nodes), fanout)
+    push, pull = mode in ("push", "push-pull"), mode in ("pull", "push-pull")
+    messages = 0
+    reached = {50: None, 99: None, 100: None}
+    began = time.perf_counter()
+    rounds = 0
+
+    for rounds in range(1, max_rounds + 1):
+        # Pick peers uniformly, never yourself: draw from n-1 and skip over your own index
+        peers = rng.integers(0, nodes - 1, size=nodes * fanout)
+        peers += peers >= callers
+        delivered = rng.random(peers.size) >= loss
+        if partition and (heal_round is None or rounds < heal_round):
+            delivered &= side[callers] == side[peers]
+        messages += peers.size
+
+        new = known.copy()
+        if pull:
+            # The peer's answer can be lost as well; only then does the caller learn anything
+            answered = delivered & (rng.random(peers.size) >= loss)
+            messages += int(delivered.sum())
+            pulled = np.where(answered[:, None], known[peers], 0).reshape(nodes, fanout, updates).max(axis=1)
+            np.maximum(new, pulled, out=new)
+            delivered = answered
+            if push:  # ACK2 carries the caller's state back to the peer
+                messages += int(answered.sum())
+                delivered = answered & (rng.random(peers.size) >= loss)
+        if push:
+            src, dst = callers[delivered], peers[delivered]
+            for k in range(updates):  # ufunc.at is much faster on one column at a time
+                np.maximum.at(new[:, k], dst, known[src, k])
+        known = new
+
+        coverage = (known > 0).mean(axis=0).min()  # The slowest update decides
+        for pct in reached:
+            if reached[pct] is None and coverage * 100 >= pct - 1e-9:
+                reached[pct] = rounds
+        if reached[100] is not None:
+            break
+
+    return {
+        "nodes": nodes,
+        "fanout": fanout,
+        "mode": mode,
+        "loss": loss,
+        "partition": partition,
+        "heal_round": heal_round,
+        "rounds_50": reached[50],
+        "rounds_99": reached[99],
+        "rounds_100": reached[100],
+        "messages": messages,
+        "messages_per_node": round(messages / nodes, 1),
+        "elapsed_s": round(time.perf_counter() - began, 3),
+        "rounds_run": rounds,
+    }
+
+
+def sweep(sizes, fanouts, modes, losses, partition=0.0, heal_round=None, trials=3, updates=8, max_rounds=500):
+    """Runs every combination `trials` times and keeps the mean and the worst case of each."""
+    results = []
+    for nodes in sizes:
+        for mode in modes:
+            for fanout in fanouts:
+                for loss in losses:
+                    runs = [simulate(nodes, fanout, mode, loss, updates, partition, heal_round, max_rounds, seed)
+                            for seed in range(trials)]
+                    full = [run["rounds_100"] for run in runs]
+                    row = {
+                        "nodes": nodes, "mode": mode, "fanout": fanout, "loss": loss,
+                        "rounds_99_mean": _mean(run["rounds_99"] for run in runs),
+                        "rounds_100_mean": _mean(full),
+                        "rounds_100_max": None if None in full else max(full),
+                        "messages_per_node": _mean(run["messages_per_node"] for run in runs),
+                        "theory_push_rounds": round(math.log2(nodes) + math.log(nodes), 1),
+                    }
+                    results.append(row)
+                    print(f"{nodes:>7} nodes {mode:>9} fanout={fanout} loss={loss:<4}: "
+                          f"99% in {row['rounds_99_mean']} rounds, all in {row['rounds_100_mean']} "
+                          f"(worst {row['rounds_100_max']}), {row['messages_per_node']} msgs/node")
+    return results
+
+
+def _mean(values):
+    values = list(values)
+    if not values or None in values:
+        return None
+    return round(sum(values) / len(values), 1)
+
+
+def plot(results, path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, (ax_rounds, ax_msgs) = plt.subplots(1, 2, figsize=(12, 5))
+    series = dict.fromkeys((row["mode"], row["fanout"], row["loss"]) for row in results)
+    for mode, fanout, loss in series:
+        rows = [row for row in results if (row["mode"], row["fanout"], row["loss"]) == (mode, fanout, loss)]
+        xs = [row["nodes"] for row in rows]
+        label = f"{mode} f={fanout} loss={loss}"
+        ax_rounds.plot(xs, [row["rounds_100_mean"] for row in rows], marker="o", label=label)
+        ax_msgs.plot(xs, [row["messages_per_node"] for row in rows], marker="o", label=label)
+    for ax, title, ylabel in ((ax_rounds, "Rounds until every node knows", "rounds"),
+                              (ax_msgs, "Messages sent per node", "messages / node")):
+        ax.set_xscale("log")
+        ax.set_xlabel("cluster size (nodes)")
+        ax.set_ylabel(ylabel)
+        ax.set_title(title)
+        ax.grid(linestyle="--", alpha=0.5)
+        ax.legend(fontsize="small")
+    fig.tight_layout()
+    fig.savefig(path, dpi=150)
+    print(f"Chart saved to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure gossip dissemination time against cluster size.")
+    parser.add_argument("--nodes", default="1000,10000,100000", help="Comma-separated cluster sizes")
+    parser.add_argument("--fanout", default="1,2,3", help="Comma-separated peers contacted per round")
+    parser.add_argument("--modes", default="push,pull,push-pull", help=f"Comma-separated, from: {', '.join(MODES)}")
+    parser.add_argument("--loss", default="0", help="Comma-separated message loss probabilities")
+    parser.add_argument("--partition", type=float, default=0.0, help="Share of nodes cut off from the rest")
+    parser.add_argument("--heal-round", type=int, default=None, help="Round at which the partition heals")
+    parser.add_argument("--trials", type=int, default=3, help="Runs per configuration (different seeds)")
+    parser.add_argument("--updates", type=int, default=8, help="Independent updates spread at once")
+    parser.add_argument("--max-rounds", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="Gossip interval in seconds, to turn rounds into wall-clock time")
+    parser.add_argument("--output", default="gossip_convergence.json")
+    parser.add_argument("--chart", default="gossip_convergence.png")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",")]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(sorted(unknown))}")
+
+    results = sweep([int(n) for n in args.nodes.split(",")], [int(f) for f in args.fanout.split(",")], modes,
+                    [float(p) for p in args.loss.split(",")], args.partition, args.heal_round, args.trials,
+                    args.updates, args.max_rounds)
+    for row in results:
+        worst = row["rounds_100_max"]
+        row["worst_case_seconds"] = None if worst is None else round(worst * args.interval, 2)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+    try:
+        plot(results, args.chart)
+    except ImportError:
+        print("matplotlib is not installed; skipping the chart (pip install matplotlib).", file=sys.stderr)
@@ -0,0 +1,227 @@
+import csv
+import time
+import threading
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS  # 32 linear buckets per power of two -> ~3% worst-case error
+
+
+class LatencyHistogram:
+    """
+    A log-linear histogram in the style of HdrHistogram.
+
+    Values are recorded in whole microseconds. Below 32us every value has its own
+    bucket; above that, each power-of-two range (32-64us, 64-128us, ...) is split
+    into 32 equal buckets. Recording is a couple of integer ops and one dict
+    increment, memory depends on the spread of values rather than on how many were
+    recorded, and two histograms merge by adding counts - which is what lets many
+    threads (or processes) record separately and combine at the end.
+    """
+
+    __slots__ = ("counts", "total", "max_us")
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.max_us = 0
+
+    @staticmethod
+    def bucket_of(value_us):
+        if value_us < SUB_BUCKETS:
+            return value_us
+        shift = value_us.bit_length() - 1 - SUB_BUCKET_BITS
+        return SUB_BUCKETS + shift * SUB_BUCKETS + (value_us >> shift) - SUB_BUCKETS
+
+    @staticmethod
+    def value_of(bucket):
+        """Midpoint of a bucket, in microseconds."""
+        if bucket < SUB_BUCKETS:
+            return float(bucket)
+        shift, offset = divmod(bucket - SUB_BUCKETS, SUB_BUCKETS)
+        return ((SUB_BUCKETS + offset) << shift) + ((1 << shift) - 1) / 2.0
+
+    def record(self, latency_ms):
+        value_us = max(0, int(latency_ms * 1000))
+        bucket = self.bucket_of(value_us)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.total += 1
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+        self.max_us = max(self.max_us, other.max_us)
+        return self
+
+    def percentile(self, pct):
+        """Latency in ms at the given percentile (0-100), or None if nothing was recorded."""
+        if not self.total:
+            return None
+        rank = max(1, int(self.total * pct / 100.0 + 0.999999))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.value_of(bucket), self.max_us) / 1000.0
+        return self.max_us / 1000.0
+
+    def to_dict(self):
+        """Plain-data form, cheap to pickle or send between processes."""
+        return {"counts": self.counts, "total": self.total, "max_us": self.max_us}
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls()
+        hist.counts = {int(bucket): count for bucket, count in data["counts"].items()}
+        hist.total = data["total"]
+        hist.max_us = data["max_us"]
+        return hist
+
+
+class _Shard:
+    """One thread's private slice of the metrics. Only its owner thread ever writes to it."""
+
+    def __init__(self):
+        self.latency = {}   # (scenario, operation, cl, coordinator) -> LatencyHistogram (successes)
+        self.errors = {}    # (scenario, operation, cl, coordinator) -> count
+        self.seconds = {}   # (second, scenario, operation, cl) -> [LatencyHistogram, errors]
+
+
+class LatencyRecorder:
+    """
+    Per-scenario latency histograms plus one-second throughput/error buckets.
+
+    record() is called from the write path, which for the async load engine means
+    the driver's event-loop threads. Each thread records into its own shard, so the
+    hot path never takes a lock; the shards are merged only when a report is built.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._register_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._register_lock:  # Once per thread, never on the hot path
+                self._shards.append(shard)
+        return shard
+
+    def record(self, scenario, operation, cl, coordinator, success, latency_ms, now=None):
+        shard = self._shard()
+        key = (scenario, operation, cl, coordinator)
+        second = int(now if now is not None else time.time())
+        bucket = shard.seconds.get((second, scenario, operation, cl))
+        if bucket is None:
+            bucket = shard.seconds[(second, scenario, operation, cl)] = [LatencyHistogram(), 0]
+        if success:
+            hist = shard.latency.get(key)
+            if hist is None:
+                hist = shard.latency[key] = LatencyHistogram()
+            hist.record(latency_ms)
+            bucket[0].record(latency_ms)
+        else:
+            shard.errors[key] = shard.errors.get(key, 0) + 1
+            bucket[1] += 1
+
+    def merged(self):
+        """Combines every thread's shard into (latency, errors, seconds) dicts."""
+        latency, errors, seconds = {}, {}, {}
+        with self._register_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, hist in list(shard.latency.items()):
+                latency.setdefault(key, LatencyHistogram()).merge(hist)
+            for key, count in list(shard.errors.items()):
+                errors[key] = errors.get(key, 0) + count
+            for key, (hist, errs) in list(shard.seconds.items()):
+                merged = seconds.setdefault(key, [LatencyHistogram(), 0])
+                merged[0].merge(hist)
+                merged[1] += errs
+        return latency, errors, seconds
+
+    def absorb(self, latency, errors, seconds):
+        """Merges results produced elsewhere (e.g. by a worker process) into this recorder."""
+        shard = self._shard()
+        for key, hist in latency.items():
+            shard.latency.setdefault(key, LatencyHistogram()).merge(hist)
+        for key, count in errors.items():
+            shard.errors[key] = shard.errors.get(key, 0) + count
+        for key, (hist, errs) in seconds.items():
+            bucket = shard.seconds.setdefault(key, [LatencyHistogram(), 0])
+            bucket[0].merge(hist)
+            bucket[1] += errs
+
+    def export(self):
+        """Everything recorded so far as plain lists and dicts, ready to pickle across a process boundary."""
+        latency, errors, seconds = self.merged()
+        return {
+            "latency": [(key, hist.to_dict()) for key, hist in latency.items()],
+            "errors": list(errors.items()),
+            "seconds": [(key, hist.to_dict(), errs) for key, (hist, errs) in seconds.items()],
+        }
+
+    def absorb_export(self, data):
+        """The other end of export(): merges another process's histograms into this recorder."""
+        self.absorb(
+            {key: LatencyHistogram.from_dict(hist) for key, hist in data["latency"]},
+            dict(data["errors"]),
+            {key: (LatencyHistogram.from_dict(hist), errs) for key, hist, errs in data["seconds"]},
+        )
+
+    def summary_rows(self):
+        latency, errors, _ = self.merged()
+        rows = []
+        for key in sorted(set(latency) | set(errors), key=lambda k: tuple(str(part) for part in k)):
+            hist = latency.get(key, LatencyHistogram())
+            scenario, operation, cl, coordinator = key
+            rows.append({
+                "scenario": scenario, "operation": operation, "consistency_level": cl,
+                "coordinator_ip": coordinator, "ok": hist.total, "errors": errors.get(key, 0),
+                "p50_ms": hist.percentile(50), "p99_ms": hist.percentile(99),
+                "p999_ms": hist.percentile(99.9), "max_ms": hist.max_us / 1000.0 if hist.total else None,
+            })
+        return rows
+
+    def timeseries_rows(self):
+        _, _, seconds = self.merged()
+        rows = []
+        for (second, scenario, operation, cl), (hist, errs) in sorted(seconds.items(), key=lambda item: (item[0][0], str(item[0][1:]))):
+            rows.append({
+                "second": second, "scenario": scenario, "operation": operation, "consistency_level": cl,
+                "ok_per_sec": hist.total, "errors_per_sec": errs,
+                "p50_ms": hist.percentile(50), "p99_ms": hist.percentile(99),
+            })
+        return rows
+
+    def write_report(self, summary_path, timeseries_path):
+        """Writes both CSVs and prints the summary table. Returns the summary rows."""
+        summary = self.summary_rows()
+        _write_csv(summary_path, summary)
+        _write_csv(timeseries_path, self.timeseries_rows())
+
+        print(f"\n{'scenario':<36}{'op':<16}{'CL':<8}{'coordinator':<16}{'ok':>8}{'err':>6}"
+              f"{'p50 ms':>9}{'p99 ms':>9}{'p999 ms':>9}")
+        for row in summary:
+            print(f"{str(row['scenario']):<36}{row['operation']:<16}{str(row['consistency_level']):<8}"
+                  f"{str(row['coordinator_ip']):<16}{row['ok']:>8}{row['errors']:>6}"
+                  f"{_fmt(row['p50_ms']):>9}{_fmt(row['p99_ms']):>9}{_fmt(row['p999_ms']):>9}")
+        print(f"Latency summary saved to {summary_path}, per-second time series to {timeseries_path}")
+        return summary
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        if not rows:
+            return
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
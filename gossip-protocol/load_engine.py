@@ -0,0 +1,109 @@
+import time
+import threading
+
+
+class WindowedLoad:
+    """
+    Pipelined write path: keeps up to `window` requests in flight at once.
+
+    Instead of blocking on future.result() after every execute_async() (which only
+    ever measures one round trip at a time), we hand the driver a callback and move
+    on to the next request. A semaphore caps the number of outstanding requests, and
+    the callbacks release it as responses arrive on the driver's event loop thread.
+
+    If `target_rate` (ops/sec) is set, requests are released on a fixed schedule and
+    latency is measured from each request's *scheduled* start time. That way a stall
+    in the cluster shows up as latency instead of silently lowering the send rate
+    (the "coordinated omission" trap).
+    """
+
+    def __init__(self, session, window=128, target_rate=None, on_complete=None, clock=time.perf_counter,
+                 sleep=time.sleep, wait_until=None):
+        self.session = session
+        self.window = window
+        self.target_rate = target_rate
+        # on_complete(index, success, latency_ms, coordinator) - called from driver threads
+        self.on_complete = on_complete
+        # Swapped for the simulator's virtual clock when running against cluster_sim
+        self.clock = clock
+        self.sleep = sleep
+        # wait_until(predicate) replaces blocking on a free slot or the last response: the simulator's
+        # run_until, which advances virtual time until the in-flight requests complete
+        self.wait_until = wait_until
+
+    def run(self, count, make_request):
+        """
+        Sends `count` requests. make_request(i) returns (statement, parameters).
+        Blocks until every response (or error) has come back and returns a summary dict.
+        """
+        slots = threading.Semaphore(self.window)
+        all_done = threading.Event()
+        lock = threading.Lock()
+        state = {"finished": 0, "succeeded": 0, "failed": 0, "latency_total": 0.0}
+
+        def finish(index, started, success, coordinator):
+            latency = (self.clock() - started) * 1000
+            try:
+                if self.on_complete:
+                    self.on_complete(index, success, latency, coordinator)
+            finally:
+                # A hook that raises must not lose the request: count it and free its slot regardless
+                with lock:
+                    state["finished"] += 1
+                    state["succeeded" if success else "failed"] += 1
+                    state["latency_total"] += latency
+                    last = state["finished"] == count
+                slots.release()
+                if last:
+                    all_done.set()
+
+        def on_success(_rows, index, started, future):
+            coordinator = future.coordinator_host.address if future.coordinator_host else "UNKNOWN"
+            finish(index, started, True, coordinator)
+
+        def on_error(_exc, index, started, future):
+            finish(index, started, False, "UNKNOWN")
+
+        if count <= 0:
+            return self._summary(state, 0.0)
+
+        begin = self.clock()
+        interval = 1.0 / self.target_rate if self.target_rate else 0.0
+        for i in range(count):
+            if interval:
+                scheduled = begin + i * interval
+                delay = scheduled - self.clock()
+                if delay > 0:
+                    self.sleep(delay)
+            if self.wait_until is None:
+                slots.acquire()
+            elif not slots.acquire(blocking=False):
+                self.wait_until(lambda: slots.acquire(blocking=False))
+            started = scheduled if interval else self.clock()
+            statement, parameters = make_request(i)
+            try:
+                future = self.session.execute_async(statement, parameters)
+            except Exception:
+                # e.g. NoHostAvailable raised before the request ever left the client
+                finish(i, started, False, "UNKNOWN")
+                continue
+            future.add_callbacks(
+                on_success, on_error,
+                callback_args=(i, started, future), errback_args=(i, started, future),
+            )
+
+        if self.wait_until is None:
+            all_done.wait()
+        else:
+            self.wait_until(all_done.is_set)
+        return self._summary(state, self.clock() - begin)
+
+    @staticmethod
+    def _summary(state, elapsed):
+        return {
+            "succeeded": state["succeeded"],
+            "failed": state["failed"],
+            "elapsed_s": round(elapsed, 3),
+            "ops_per_sec": round(state["finished"] / elapsed, 1) if elapsed else 0.0,
+            "mean_latency_ms": round(state["latency_total"] / state["finished"], 3) if state["finished"] else None,
+        }
@@ -0,0 +1,187 @@
+import os
+import uuid
+import queue
+import threading
+import multiprocessing
+from datetime import datetime
+from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
+from cassandra.policies import DCAwareRoundRobinPolicy, TokenAwarePolicy
+from cassandra import ConsistencyLevel
+from cassandra.connection import DefaultEndPoint
+from load_engine import WindowedLoad
+from statements import StatementCache, INSERT_ROW
+from latency_histogram import LatencyRecorder
+from chaos_proxy import ProxyEndPointFactory
+
+REPORT_EVERY = 1.0  # seconds between the reports each worker sends back
+
+
+def connect(contact_points, routes=None):
+    """
+    The lab's standard cluster + session. Used by LabRunner and by every load worker process.
+    With `routes` (node address -> chaos proxy address) every connection goes through the proxy.
+    """
+    options = {}
+    if routes:
+        contact_points = [DefaultEndPoint(*address) for address in routes.values()]
+        options["endpoint_factory"] = ProxyEndPointFactory(routes)
+    profile = ExecutionProfile(
+        # Token-aware routing sends each bound statement straight to a replica of its partition
+        load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy(local_dc='datacenter1')),
+        request_timeout=5.0,
+        consistency_level=ConsistencyLevel.QUORUM
+    )
+    cluster = Cluster(contact_points, execution_profiles={EXEC_PROFILE_DEFAULT: profile}, protocol_version=5,
+                      **options)
+    return cluster, cluster.connect()
+
+
+def _worker(worker_id, contact_points, routes, count, cl, window, target_rate, use_prepared, scenario, op_type,
+            results):
+    """
+    Body of one load worker process. It owns its own Cluster, session and driver
+    event loop, runs WindowedLoad, and every REPORT_EVERY seconds ships what it
+    recorded since the last report back to the parent: the latency histograms,
+    the (id, value) of every acknowledged write, and one metrics row per request.
+    """
+    cluster = None
+    try:
+        cluster, session = connect(contact_points, routes)
+        statements = StatementCache(session, prepared=use_prepared)
+        cl_name = ConsistencyLevel.value_to_name.get(cl, cl)
+        state = {"report": _new_report()}
+        ids = {}  # request index -> row id, only while the write is in flight
+
+        def make_request(i):
+            row_id = ids[i] = uuid.uuid4()
+            return statements.request(INSERT_ROW, (row_id, i, datetime.utcnow()), cl)
+
+        def on_complete(i, success, latency, coordinator):
+            row_id = ids.pop(i)
+            report = state["report"]
+            report["recorder"].record(scenario, op_type, cl_name, coordinator, success, latency)
+            if success:
+                report["acked"].append((row_id.bytes, i))
+            report["rows"].append((datetime.utcnow().isoformat(), success, latency, coordinator))
+
+        def ship(report):
+            results.put(("report", worker_id, {"histograms": report["recorder"].export(),
+                                               "acked": report["acked"], "rows": report["rows"]}))
+
+        def reporter_loop():
+            # Swap in a fresh report, and only ship the one retired on the *previous*
+            # tick, so callbacks still holding the old reference have long finished.
+            retired = None
+            while not stop.wait(REPORT_EVERY):
+                if retired is not None:
+                    ship(retired)
+                retired, state["report"] = state["report"], _new_report()
+            if retired is not None:
+                ship(retired)
+
+        stop = threading.Event()
+        reporter = threading.Thread(target=reporter_loop, daemon=True)
+        reporter.start()
+        load = WindowedLoad(session, window=window, target_rate=target_rate, on_complete=on_complete)
+        summary = load.run(count, make_request)
+        stop.set()
+        reporter.join()
+        ship(state["report"])
+        results.put(("done", worker_id, summary))
+    except Exception as e:
+        results.put(("error", worker_id, repr(e)))
+    finally:
+        if cluster is not None:
+            cluster.shutdown()
+
+
+def _new_report():
+    return {"recorder": LatencyRecorder(), "acked": [], "rows": []}
+
+
+class ProcessLoad:
+    """
+    Runs the windowed writer in several OS processes at once.
+
+    Python threads sharing one session all funnel through one GIL and one driver
+    event loop, so a single client process saturates long before three Cassandra
+    nodes do. Here each worker is a separate process with its own Cluster, its own
+    connections and its own WindowedLoad, so offered load scales with client cores.
+
+    Workers don't send a message per write - at tens of thousands of writes a
+    second that would make the pipe the bottleneck. Once a second each one sends a
+    single report: its latency histograms, which the parent merges into `recorder`,
+    the acknowledged (id bytes, value) pairs, which go into `ledger`, and its
+    metrics rows as (timestamp, success, latency_ms, coordinator), handed to `on_rows`.
+    """
+
+    def __init__(self, contact_points, processes=None, window=128, target_rate=None, use_prepared=True,
+                 recorder=None, routes=None, ledger=None, on_rows=None):
+        self.contact_points = list(contact_points)
+        self.routes = routes
+        self.processes = processes or os.cpu_count() or 1
+        self.window = window
+        self.target_rate = target_rate
+        self.use_prepared = use_prepared
+        self.recorder = recorder
+        self.ledger = ledger
+        self.on_rows = on_rows
+
+    def run(self, count, cl=ConsistencyLevel.QUORUM, scenario="load", op_type="WRITE"):
+        """Splits `count` writes (and the target rate) across the workers; returns a combined summary dict."""
+        # "spawn", not fork: a forked child would inherit the parent's driver threads and sockets half-copied
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        per_worker_rate = self.target_rate / self.processes if self.target_rate else None
+        workers = []
+        for worker_id in range(self.processes):
+            share = count // self.processes + (1 if worker_id < count % self.processes else 0)
+            proc = ctx.Process(
+                target=_worker, name=f"load-worker-{worker_id}",
+                args=(worker_id, self.contact_points, self.routes, share, cl, self.window, per_worker_rate,
+                      self.use_prepared, scenario, op_type, results),
+            )
+            proc.start()
+            workers.append(proc)
+
+        summaries, errors = {}, {}
+        while len(summaries) + len(errors) < len(workers):
+            try:
+                kind, worker_id, payload = results.get(timeout=1.0)
+            except queue.Empty:
+                for worker_id, proc in enumerate(workers):
+                    if not proc.is_alive() and worker_id not in summaries and worker_id not in errors:
+                        errors[worker_id] = f"exited with code {proc.exitcode}"
+                continue
+            if kind == "report":
+                if self.recorder is not None:
+                    self.recorder.absorb_export(payload["histograms"])
+                if self.ledger is not None:
+                    self.ledger.absorb(payload["acked"])
+                if self.on_rows is not None:
+                    self.on_rows(payload["rows"])
+            elif kind == "done":
+                summaries[worker_id] = payload
+            else:
+                errors[worker_id] = payload
+        for proc in workers:
+            proc.join()
+
+        for worker_id, error in sorted(errors.items()):
+            print(f"  load-worker-{worker_id} failed: {error}")
+        succeeded = sum(s["succeeded"] for s in summaries.values())
+        failed = sum(s["failed"] for s in summaries.values())
+        latency_total = sum(s["mean_latency_ms"] * (s["succeeded"] + s["failed"])
+                            for s in summaries.values() if s["mean_latency_ms"] is not None)
+        finished = succeeded + failed
+        # Time the load phase itself: process start-up and connecting aren't part of the offered load
+        elapsed = max((s["elapsed_s"] for s in summaries.values()), default=0.0)
+        return {
+            "succeeded": succeeded,
+            "failed": failed,
+            "elapsed_s": round(elapsed, 3),
+            "ops_per_sec": round(finished / elapsed, 1) if elapsed else 0.0,
+            "mean_latency_ms": round(latency_total / finished, 3) if finished else None,
+            "workers": self.processes,
+            "worker_errors": len(errors),
+        }
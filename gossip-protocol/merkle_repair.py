@@ -0,0 +1,326 @@
+"""
+Merkle-tree anti-entropy: find and fix the differences between two replicas
+without shipping every row.
+
+Each replica hashes its rows into a tree whose leaves cover equal slices of the
+token ring (2^depth leaves; Cassandra's default depth is 15). A leaf's hash is
+the XOR of the digests of the rows in its slice, and every inner node is the XOR
+of its two children. XOR makes the tree incremental: inserting, deleting or
+overwriting a row touches one leaf with one XOR, whatever order rows arrive in.
+
+To compare, both sides walk down from the root together and only descend into
+children whose parents differ. Then they stream just the rows in the mismatched
+leaves, and last-write-wins decides which version each side keeps.
+
+Rows are any mapping of key bytes -> (value, write timestamp, ...), which is
+what SimNode.data holds in the cluster simulator, or what an export of a real
+replica can be loaded into.
+
+Benchmark (bytes exchanged and time against shipping every row):
+    python merkle_repair.py --rows 200000 --divergence 0,0.0001,0.001,0.01,0.1,0.5
+"""
+import sys
+import json
+import time
+import uuid
+import random
+import hashlib
+import argparse
+from operator import itemgetter
+import numpy as np
+from cassandra.murmur3 import murmur3
+from verifier import MIN_TOKEN
+
+ROW_BYTES = 16 + 8 + 8   # A row on the wire: UUID key, value, write timestamp
+HASH_BYTES = 8
+MASK = (1 << 64) - 1
+
+
+def _mix(x):
+    """splitmix64's finaliser, on Python ints. _mix_array is the same thing on uint64 arrays."""
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & MASK
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & MASK
+    return x ^ (x >> 31)
+
+
+def _mix_array(x):
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)  # uint64 arrays wrap on overflow
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _value_bits(value):
+    if isinstance(value, int):
+        return value & MASK
+    return int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), "little")
+
+
+def row_digest(key, version):
+    """64-bit digest of one row version (key, value and write timestamp)."""
+    high, low = int.from_bytes(key[:8], "little"), int.from_bytes(key[8:16].ljust(8, b"\0"), "little")
+    return _mix(high ^ _mix(low ^ _mix(_value_bits(version[0]) ^ _mix(version[1] & MASK))))
+
+
+def _index(rows, token_of, depth):
+    """Every row's key, leaf and digest, computed once and vectorised where possible."""
+    keys = list(rows)
+    versions = list(rows.values())
+    count = len(keys)
+    # map() with C-level callables keeps the per-row work out of the Python interpreter loop
+    tokens = np.fromiter(map(token_of, keys), dtype=np.int64, count=count)
+    packed = b"".join(keys)
+    if len(packed) != 16 * count:  # Not all 16-byte UUIDs: pad or truncate each key
+        packed = b"".join(key[:16].ljust(16, b"\0") for key in keys)
+    halves = np.frombuffer(packed, dtype="<u8").reshape(count, 2)
+    raw = list(map(itemgetter(0), versions))
+    values = np.array(raw)
+    if values.dtype.kind == "i":  # All plain ints: two's complement, the same bits _value_bits gives
+        values = values.astype(np.int64).view(np.uint64)
+    else:
+        values = np.fromiter(map(_value_bits, raw), dtype=np.uint64, count=count)
+    stamps = np.array(list(map(itemgetter(1), versions)), dtype=np.int64).view(np.uint64)
+    digests = _mix_array(halves[:, 0] ^ _mix_array(halves[:, 1] ^ _mix_array(values ^ _mix_array(stamps))))
+    return keys, _leaf_indices(tokens, depth), digests
+
+
+def newer(a, b):
+    """Last-write-wins between two versions; ties go to the larger value, as in Cassandra."""
+    return (a[1], a[0]) > (b[1], b[0])
+
+
+class MerkleTree:
+    def __init__(self, depth=15):
+        self.depth = depth
+        self.leaves = np.zeros(1 << depth, dtype=np.uint64)
+        self._levels = None  # Inner levels, rebuilt lazily after a leaf changes
+
+    def leaf_of(self, token):
+        return (token - MIN_TOKEN) >> (64 - self.depth)
+
+    def leaf_range(self, leaf):
+        """The (start, end] token range a leaf covers."""
+        width = 1 << (64 - self.depth)
+        return MIN_TOKEN + leaf * width - 1, MIN_TOKEN + (leaf + 1) * width - 1
+
+    def add(self, token, digest):
+        """Adds a row (or removes it: XOR is its own inverse)."""
+        self.leaves[self.leaf_of(token)] ^= np.uint64(digest)
+        self._levels = None
+
+    def update(self, token, old_digest, new_digest):
+        """Replaces one version of a row with another."""
+        self.leaves[self.leaf_of(token)] ^= np.uint64(old_digest ^ new_digest)
+        self._levels = None
+
+    @classmethod
+    def from_rows(cls, rows, token_of, depth=15):
+        _, leaves, digests = _index(rows, token_of, depth)
+        return cls.from_index(leaves, digests, depth)
+
+    @classmethod
+    def from_index(cls, leaves, digests, depth=15):
+        tree = cls(depth)
+        np.bitwise_xor.at(tree.leaves, leaves, digests)
+        return tree
+
+    def levels(self):
+        """[root level (1 hash), ..., leaf level (2^depth hashes)]."""
+        if self._levels is None:
+            levels = [self.leaves]
+            while len(levels[0]) > 1:
+                below = levels[0]
+                levels.insert(0, below[0::2] ^ below[1::2])
+            self._levels = levels
+        return self._levels
+
+    @property
+    def root(self):
+        return int(self.levels()[0][0])
+
+
+def _leaf_indices(tokens, depth):
+    # Shift the signed tokens into 0..2^64-1 (flip the sign bit), then keep the top `depth` bits
+    unsigned = tokens.view(np.uint64) ^ np.uint64(1 << 63)
+    return (unsigned >> np.uint64(64 - depth)).astype(np.int64)
+
+
+def diff(a, b):
+    """
+    Walks both trees from the root, descending only where hashes differ.
+    Returns (mismatched leaf indices, number of hashes each side had to send).
+    """
+    levels_a, levels_b = a.levels(), b.levels()
+    candidates = np.zeros(1, dtype=np.int64)
+    sent = 1
+    for depth in range(len(levels_a)):
+        mismatched = candidates[levels_a[depth][candidates] != levels_b[depth][candidates]]
+        if depth == len(levels_a) - 1 or not len(mismatched):
+            return mismatched, sent
+        candidates = (mismatched[:, None] * 2 + np.arange(2)).ravel()
+        sent += len(candidates)
+    return candidates[:0], sent
+
+
+def _rows_in_leaves(rows, index, leaves):
+    keys, row_leaves, _ = index
+    if not len(leaves):
+        return {}
+    return {keys[i]: rows[keys[i]] for i in np.flatnonzero(np.isin(row_leaves, leaves))}
+
+
+def repair_pair(rows_a, rows_b, token_of=murmur3, depth=15, apply_a=None, apply_b=None):
+    """
+    Brings two replicas in sync. apply_a(key, version) / apply_b(key, version) store a
+    repaired row (by default straight into the dicts). Returns what it cost.
+    """
+    apply_a = apply_a or rows_a.__setitem__
+    apply_b = apply_b or rows_b.__setitem__
+    began = time.perf_counter()
+    index_a, index_b = _index(rows_a, token_of, depth), _index(rows_b, token_of, depth)
+    tree_a = MerkleTree.from_index(index_a[1], index_a[2], depth)
+    tree_b = MerkleTree.from_index(index_b[1], index_b[2], depth)
+    mismatched, hashes = diff(tree_a, tree_b)
+
+    # Each side streams its rows from the mismatched ranges to the other
+    streamed_a = _rows_in_leaves(rows_a, index_a, mismatched)
+    streamed_b = _rows_in_leaves(rows_b, index_b, mismatched)
+    repaired = 0
+    for key, version in streamed_b.items():
+        mine = streamed_a.get(key)
+        if mine is None or newer(version, mine):
+            apply_a(key, version)
+            repaired += 1
+    for key, version in streamed_a.items():
+        theirs = streamed_b.get(key)
+        if theirs is None or newer(version, theirs):
+            apply_b(key, version)
+            repaired += 1
+
+    rows_streamed = len(streamed_a) + len(streamed_b)
+    return {
+        "method": "merkle",
+        "mismatched_ranges": len(mismatched),
+        "hashes_exchanged": 2 * hashes,
+        "rows_streamed": rows_streamed,
+        "rows_repaired": repaired,
+        "bytes": 2 * hashes * HASH_BYTES + rows_streamed * ROW_BYTES,
+        "elapsed_s": round(time.perf_counter() - began, 4),
+    }
+
+
+def full_compare(rows_a, rows_b, apply_a=None, apply_b=None):
+    """The naive way: B ships every row to A, A compares them all and sends back what B is missing."""
+    apply_a = apply_a or rows_a.__setitem__
+    apply_b = apply_b or rows_b.__setitem__
+    began = time.perf_counter()
+    sent_back = []
+    for key, version in list(rows_b.items()):
+        mine = rows_a.get(key)
+        if mine is None or newer(version, mine):
+            apply_a(key, version)
+        elif newer(mine, version):
+            sent_back.append((key, mine))
+    for key, version in rows_a.items():
+        if key not in rows_b:
+            sent_back.append((key, version))
+    repaired = len(sent_back)
+    for key, version in sent_back:
+        apply_b(key, version)
+    rows_streamed = len(rows_b) + len(sent_back)
+    return {
+        "method": "full",
+        "mismatched_ranges": None,
+        "hashes_exchanged": 0,
+        "rows_streamed": rows_streamed,
+        "rows_repaired": repaired,
+        "bytes": rows_streamed * ROW_BYTES,
+        "elapsed_s": round(time.perf_counter() - began, 4),
+    }
+
+
+def diverged_replicas(rows, divergence, seed=0):
+    """Two replicas of `rows` rows where `divergence` of B's rows are stale (half) or missing (half)."""
+    rng = random.Random(seed)
+    a = {}
+    for i in range(rows):
+        a[uuid.UUID(int=rng.getrandbits(128)).bytes] = (i, 1_000_000 + i)
+    b = dict(a)
+    for key in rng.sample(list(a), int(rows * divergence)):
+        if rng.random() < 0.5:
+            del b[key]
+        else:
+            value, ts = a[key]
+            b[key] = (value - 1, ts - 1)
+    return a, b
+
+
+def transfer_seconds(nbytes, bandwidth_mbps):
+    return nbytes * 8 / (bandwidth_mbps * 1e6)
+
+
+def benchmark(rows, divergences, depth=15, bandwidth_mbps=100.0, seed=0):
+    """
+    Repairs the same pair of replicas both ways at each divergence. est_total_s adds the time
+    the bytes would take on a `bandwidth_mbps` link to the measured CPU time, since on a real
+    cluster the streaming, not the hashing, is usually what makes repair slow.
+    """
+    results = []
+    for divergence in divergences:
+        for method in ("merkle", "full"):
+            a, b = diverged_replicas(rows, divergence, seed)
+            stats = repair_pair(a, b, depth=depth) if method == "merkle" else full_compare(a, b)
+            assert a == b, "replicas still differ after repair"
+            stats.update(rows=rows, divergence=divergence,
+                         est_total_s=round(stats["elapsed_s"] + transfer_seconds(stats["bytes"], bandwidth_mbps), 4))
+            results.append(stats)
+            print(f"{method:>6} @ {divergence:<7} divergence: {stats['bytes'] / 1e6:>9.3f} MB, "
+                  f"{stats['rows_streamed']:>8} rows streamed, {stats['elapsed_s']:>7.3f}s CPU, "
+                  f"~{stats['est_total_s']:.3f}s at {bandwidth_mbps:g} Mbit/s")
+    return results
+
+
+def plot(results, path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, (ax_bytes, ax_time) = plt.subplots(1, 2, figsize=(12, 5))
+    for method in ("merkle", "full"):
+        rows = [row for row in results if row["method"] == method]
+        xs = [max(row["divergence"], 1e-6) for row in rows]  # Log axis: draw 0% at 1e-6
+        ax_bytes.plot(xs, [row["bytes"] / 1e6 for row in rows], marker="o", label=method)
+        ax_time.plot(xs, [row["est_total_s"] for row in rows], marker="o", label=f"{method} (CPU + transfer)")
+        ax_time.plot(xs, [row["elapsed_s"] for row in rows], linestyle=":", label=f"{method} (CPU only)")
+    for ax, title, ylabel in ((ax_bytes, "Data exchanged", "MB"), (ax_time, "Repair time", "seconds")):
+        ax.set_xscale("log")
+        ax.set_xlabel("fraction of rows diverged")
+        ax.set_ylabel(ylabel)
+        ax.set_title(title)
+        ax.grid(linestyle="--", alpha=0.5)
+        ax.legend()
+    fig.tight_layout()
+    fig.savefig(path, dpi=150)
+    print(f"Chart saved to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Merkle-tree repair against full row comparison.")
+    parser.add_argument("--rows", type=int, default=200000, help="Rows per replica")
+    parser.add_argument("--divergence", default="0,0.0001,0.001,0.01,0.1,0.5",
+                        help="Comma-separated fractions of rows that differ between the replicas")
+    parser.add_argument("--depth", type=int, default=15, help="Tree depth (2^depth leaf ranges)")
+    parser.add_argument("--bandwidth-mbps", type=float, default=100.0,
+                        help="Link speed used to turn bytes exchanged into transfer time")
+    parser.add_argument("--output", default="merkle_repair.json")
+    parser.add_argument("--chart", default="merkle_repair.png")
+    args = parser.parse_args()
+
+    results = benchmark(args.rows, [float(d) for d in args.divergence.split(",")], args.depth,
+                        args.bandwidth_mbps)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+    try:
+        plot(results, args.chart)
+    except ImportError:
+        print("matplotlib is not installed; skipping the chart (pip install matplotlib).", file=sys.stderr)
@@ -0,0 +1,122 @@
+import csv
+import queue
+import threading
+
+
+class MetricsSink:
+    """
+    Streams metric rows to disk in fixed-size columnar chunks with bounded memory.
+
+    Writer threads call append(); rows go into the current chunk (one list per
+    column). When a chunk fills up it is handed to a background thread that writes
+    it out, and a fresh chunk is started. The hand-off queue is bounded, so if the
+    disk falls behind, append() blocks briefly instead of letting memory grow.
+    At most `chunk_rows * (max_pending_chunks + 2)` rows are ever held in memory,
+    and a crash loses at most the chunks not yet written rather than the whole run.
+
+    Formats:
+      "csv"   - plain CSV, one header row, appended chunk by chunk.
+      "arrow" - Apache Arrow IPC stream, one record batch per chunk. Binary and
+                columnar, so reading one column back doesn't parse the others. Every
+                complete batch stays readable even if the run dies mid-write.
+    """
+
+    def __init__(self, path, columns, fmt="csv", chunk_rows=10000, max_pending_chunks=4):
+        if fmt not in ("csv", "arrow"):
+            raise ValueError(f"Unknown metrics format: {fmt}")
+        self.path = path
+        self.columns = list(columns)
+        self.fmt = fmt
+        self.chunk_rows = chunk_rows
+        self.rows_written = 0
+        self._chunk = self._new_chunk()
+        self._lock = threading.Lock()
+        self._pending = queue.Queue(maxsize=max_pending_chunks)
+        self._closed = False
+        self._error = None
+        self._writer = threading.Thread(target=self._write_loop, name="metrics-sink", daemon=True)
+        self._writer.start()
+
+    def _new_chunk(self):
+        return {name: [] for name in self.columns}
+
+    def append(self, row):
+        """Adds one row (a tuple in column order). Safe to call from many threads at once."""
+        full = None
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MetricsSink is closed")
+            for name, value in zip(self.columns, row):
+                self._chunk[name].append(value)
+            if len(self._chunk[self.columns[0]]) >= self.chunk_rows:
+                full, self._chunk = self._chunk, self._new_chunk()
+        if full is not None:
+            # Outside the lock: if the writer is behind, only this thread waits
+            self._pending.put(full)
+
+    def flush(self):
+        """Hands the partially filled chunk to the writer without waiting for it to hit disk."""
+        with self._lock:
+            partial, self._chunk = self._chunk, self._new_chunk()
+        if partial[self.columns[0]]:
+            self._pending.put(partial)
+
+    def close(self):
+        """Flushes everything, waits for the writer thread to finish and closes the file."""
+        if self._closed:
+            return
+        self.flush()
+        with self._lock:
+            self._closed = True
+        self._pending.put(None)
+        self._writer.join()
+        if self._error is not None:
+            raise self._error
+
+    def _write_loop(self):
+        try:
+            if self.fmt == "csv":
+                self._write_csv()
+            else:
+                self._write_arrow()
+        except Exception as e:
+            self._error = e
+            # Keep draining so producers never block forever on a dead writer
+            while self._pending.get() is not None:
+                pass
+
+    def _write_csv(self):
+        with open(self.path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.columns)
+            while True:
+                chunk = self._pending.get()
+                if chunk is None:
+                    return
+                writer.writerows(zip(*(chunk[name] for name in self.columns)))
+                f.flush()
+                self.rows_written += len(chunk[self.columns[0]])
+
+    def _write_arrow(self):
+        import pyarrow as pa
+
+        stream = None
+        schema = None
+        sink = pa.OSFile(self.path, "wb")
+        try:
+            while True:
+                chunk = self._pending.get()
+                if chunk is None:
+                    return
+                # The first chunk fixes the column types; later chunks are converted to match
+                batch = pa.RecordBatch.from_pydict(chunk, schema=schema)
+                if stream is None:
+                    schema = batch.schema
+                    stream = pa.ipc.new_stream(sink, schema)
+                stream.write_batch(batch)
+                sink.flush()
+                self.rows_written += batch.num_rows
+        finally:
+            if stream is not None:
+                stream.close()
+            sink.close()
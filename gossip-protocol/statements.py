@@ -0,0 +1,72 @@
+import threading
+from cassandra.query import SimpleStatement, BatchStatement, BatchType
+
+# Every CQL statement the lab runs, written once with '?' bind markers.
+INSERT_ROW = "INSERT INTO chaos_lab.test_data (id, value, updated_at) VALUES (?, ?, ?)"
+SELECT_VALUE = "SELECT value FROM chaos_lab.test_data WHERE id = ?"
+SCAN_RANGE = "SELECT id, value FROM chaos_lab.test_data WHERE token(id) > ? AND token(id) <= ?"
+# The contention benchmark's hot keys: plain read-modify-write, lightweight transactions and counters
+SELECT_HOT = "SELECT value FROM chaos_lab.hot_rows WHERE id = ?"
+INSERT_HOT = "INSERT INTO chaos_lab.hot_rows (id, value) VALUES (?, ?)"
+INSERT_HOT_IF_NOT_EXISTS = "INSERT INTO chaos_lab.hot_rows (id, value) VALUES (?, ?) IF NOT EXISTS"
+UPDATE_HOT_IF = "UPDATE chaos_lab.hot_rows SET value = ? WHERE id = ? IF value = ?"
+INCREMENT_COUNTER = "UPDATE chaos_lab.hot_counters SET count = count + 1 WHERE id = ?"
+SELECT_COUNTER = "SELECT count FROM chaos_lab.hot_counters WHERE id = ?"
+
+
+class StatementCache:
+    """
+    Prepares each distinct query once per session and binds values per request.
+
+    A SimpleStatement ships its CQL text on every execution, so the coordinator
+    parses it every time. A prepared statement is parsed once; afterwards each
+    request sends only a statement id plus the bound values. Binding also gives
+    the driver the partition key, which TokenAwarePolicy uses to send the request
+    straight to a replica instead of a random coordinator.
+
+    Set prepared=False to get the old SimpleStatement behaviour (for comparison).
+    """
+
+    def __init__(self, session, prepared=True):
+        self.session = session
+        self.prepared = prepared
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.prepare_count = 0
+
+    def get_prepared(self, query):
+        statement = self._cache.get(query)
+        if statement is None:
+            with self._lock:
+                statement = self._cache.get(query)
+                if statement is None:
+                    statement = self.session.prepare(query)
+                    self._cache[query] = statement
+                    self.prepare_count += 1
+        return statement
+
+    def request(self, query, parameters=(), cl=None):
+        """Returns (statement, parameters) ready for session.execute / execute_async."""
+        if not self.prepared:
+            # The Python driver's simple statements use %s placeholders instead of ?
+            return SimpleStatement(query.replace("?", "%s"), consistency_level=cl), parameters or None
+        bound = self.get_prepared(query).bind(parameters)
+        # Set the CL on the bound copy: the prepared statement is shared by threads running at other CLs
+        if cl is not None:
+            bound.consistency_level = cl
+        return bound, None
+
+    def batch(self, query, rows, cl=None, logged=False):
+        """
+        One BatchStatement running `query` once per row in `rows`. Unlogged by default:
+        a logged batch is first written to the batchlog on two other nodes, so it can be
+        replayed in full if the coordinator dies, at the cost of that extra round trip.
+
+        Batch entries are always prepared. A simple statement in a batch would have its
+        values inlined into the CQL text by the driver, which defeats the comparison.
+        """
+        batch = BatchStatement(batch_type=BatchType.LOGGED if logged else BatchType.UNLOGGED, consistency_level=cl)
+        prepared = self.get_prepared(query)
+        for parameters in rows:
+            batch.add(prepared.bind(parameters))
+        return batch, None
@@ -0,0 +1,175 @@
+import csv
+import time
+import threading
+from cassandra import ConsistencyLevel
+from statements import SCAN_RANGE
+
+# Murmur3Partitioner tokens are signed 64-bit. MIN_TOKEN itself is never assigned to a key,
+# so "token > MIN_TOKEN AND token <= MAX_TOKEN" covers the whole ring.
+MIN_TOKEN = -2 ** 63
+MAX_TOKEN = 2 ** 63 - 1
+
+
+def token_ranges(splits):
+    """Cuts the ring into `splits` contiguous (start, end] ranges of equal width."""
+    width = 2 ** 64
+    bounds = [MIN_TOKEN + width * k // splits for k in range(splits)] + [MAX_TOKEN]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class WriteLedger:
+    """
+    The client's record of what it believes is in the table: every acknowledged
+    write's id and value. Keys are the 16 raw UUID bytes rather than UUID objects,
+    which keeps a few million entries affordable. Rows are only written by this
+    client, so a later acknowledged write to the same id simply replaces the entry.
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def record(self, row_id, value):
+        # A single dict assignment is atomic, so driver callback threads can call this freely
+        self._values[row_id.bytes] = value
+
+    def absorb(self, pairs):
+        """Adds (id bytes, value) pairs acknowledged elsewhere, e.g. by a load worker process."""
+        self._values.update(pairs)
+
+    def get(self, key):
+        return self._values.get(key)
+
+    def __len__(self):
+        return len(self._values)
+
+
+class TokenRangeVerifier:
+    """
+    Full-table consistency check that compares what Cassandra returns with the WriteLedger.
+
+    `SELECT * ... LIMIT 1000` only sees whichever 1000 rows come back first, and it
+    has nothing to compare them against. Instead we split the token ring into many
+    ranges and scan them concurrently (each one paged), so the work is spread over
+    every node and the driver always has `concurrency` range scans in flight. Each
+    row that comes back is checked against the ledger:
+
+      stale      - the row exists but holds an older value than the one acknowledged
+      missing    - an acknowledged write that no range scan returned at this CL
+      unledgered - rows we have no record of (earlier runs, or writes that timed
+                   out but still landed)
+    """
+
+    def __init__(self, session, statements, splits=128, concurrency=16, page_size=5000, retries=2,
+                 clock=time.perf_counter):
+        self.session = session
+        self.statements = statements
+        self.splits = splits
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.retries = retries
+        self.clock = clock
+
+    def verify(self, ledger, cl=ConsistencyLevel.QUORUM, on_range=None):
+        """
+        Scans the whole table at `cl`; returns a report dict.
+        on_range(success, latency_ms, coordinator, stale_rows) is called once per range.
+        """
+        ranges = token_ranges(self.splits)
+        lock = threading.Lock()
+        all_done = threading.Event()
+        seen = set()
+        totals = {"scanned": 0, "stale": 0, "unledgered": 0, "failed_ranges": 0}
+        state = {"next": 0, "finished": 0}
+
+        def start_next():
+            with lock:
+                if state["next"] >= len(ranges):
+                    return
+                index = state["next"]
+                state["next"] += 1
+            scan(index, attempt=0)
+
+        def scan(index, attempt):
+            # Rows are tallied per range and only merged once the range completes,
+            # so a range that fails halfway can be retried without double counting.
+            local = {"seen": [], "scanned": 0, "stale": 0, "unledgered": 0, "started": self.clock()}
+            statement, parameters = self.statements.request(SCAN_RANGE, ranges[index], cl)
+            statement.fetch_size = self.page_size
+            try:
+                future = self.session.execute_async(statement, parameters)
+            except Exception:
+                range_failed(index, attempt, local)
+                return
+            future.add_callbacks(on_page, on_error, callback_args=(index, attempt, local, future),
+                                 errback_args=(index, attempt, local))
+
+        def on_page(rows, index, attempt, local, future):
+            for row in rows:
+                key = row[0].bytes
+                expected = ledger.get(key)
+                if expected is None:
+                    local["unledgered"] += 1
+                else:
+                    local["seen"].append(key)
+                    if row[1] != expected:
+                        local["stale"] += 1
+            local["scanned"] += len(rows)
+            if future.has_more_pages:
+                future.start_fetching_next_page()  # The same callbacks fire again for the next page
+                return
+            coordinator = future.coordinator_host.address if future.coordinator_host else "UNKNOWN"
+            with lock:
+                seen.update(local["seen"])
+                for name in ("scanned", "stale", "unledgered"):
+                    totals[name] += local[name]
+            range_done(True, local, coordinator)
+
+        def on_error(_exc, index, attempt, local):
+            range_failed(index, attempt, local)
+
+        def range_failed(index, attempt, local):
+            if attempt < self.retries:
+                scan(index, attempt + 1)
+                return
+            with lock:
+                totals["failed_ranges"] += 1
+            range_done(False, local, "UNKNOWN")
+
+        def range_done(success, local, coordinator):
+            if on_range:
+                on_range(success, (self.clock() - local["started"]) * 1000, coordinator, local["stale"])
+            with lock:
+                state["finished"] += 1
+                last = state["finished"] == len(ranges)
+            if last:
+                all_done.set()
+            else:
+                start_next()
+
+        begin = self.clock()
+        for _ in range(min(self.concurrency, len(ranges))):
+            start_next()
+        all_done.wait()
+        elapsed = self.clock() - begin
+
+        return {
+            "consistency_level": ConsistencyLevel.value_to_name.get(cl, cl),
+            "expected": len(ledger),
+            "found": len(seen),
+            "missing": len(ledger) - len(seen),
+            "stale": totals["stale"],
+            "unledgered": totals["unledgered"],
+            "rows_scanned": totals["scanned"],
+            "failed_ranges": totals["failed_ranges"],
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_sec": round(totals["scanned"] / elapsed) if elapsed else 0,
+        }
+
+
+def write_reports(path, reports):
+    if not reports:
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(reports[0]))
+        writer.writeheader()
+        writer.writerows(reports)
@@ -17,9 +17,16 @@ CONFIG = {
         "preference_check": 0.5,
         "online_check": 0.5,
         "fanout": 0.4,
+        "worker_pull": 0.2,
         "worker_process": 1.0,
         "slow_mode_multiplier": 3.0
     },
+    # Concurrent engine: tasks per stage / per channel, and capacity of each queue between stages
+    "engine": {
+        "stage_workers": 256,
+        "channel_workers": 256,
+        "queue_size": 1024
+    },
     # Defined Event Types and their corresponding initial channels
     "events": {
         "user.signup": {
@@ -0,0 +1,365 @@
+# engine.py
+# Concurrent notification engine: every stage is a pool of asyncio tasks joined by bounded queues
+import asyncio
+import random
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .config import CONFIG
+from .models import NotificationEvent, QueueMessage, EventOutcome
+from . import stages
+
+# observer(step, status, message, data) - called for every state change when set (the visual mode)
+Observer = Callable[[str, str, str, Dict[str, Any]], None]
+
+
+class RateLimiter:
+    """Token bucket: `rate` sends per second, bursting up to one second's worth."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _Job:
+    """One event on its way through the stages."""
+    __slots__ = ("event_type", "user_id", "user_data", "event", "outcome", "pending")
+
+    def __init__(self, event_type: str, user_id: str, user_data: Dict[str, Any]):
+        self.event_type = event_type
+        self.user_id = user_id
+        self.user_data = user_data
+        self.event: Optional[NotificationEvent] = None
+        self.outcome = EventOutcome(event_id="", event_type=event_type, status="pending", started=time.monotonic())
+        self.pending = 0  # Channel messages not yet delivered or dead-lettered
+
+
+class NotificationEngine:
+    """
+    Ingestion, preference check, online check and fanout each run as `stage_workers`
+    tasks reading from a bounded queue and writing to the next one. Fanout puts one
+    QueueMessage per channel on that channel's queue, served by `channel_workers`
+    tasks. A full queue makes the stage before it wait, so a burst backs up to
+    submit() instead of growing memory without limit.
+
+    Every delay is CONFIG["simulated_delay"] times `time_scale`, awaited with
+    asyncio.sleep, so thousands of events are in flight at once. A failed delivery
+    goes back on its channel's queue after an exponential backoff, without holding a
+    worker, until max_retries sends it to the DLQ.
+
+    With one worker per stage, time_scale=1 and an observer, a single event runs
+    step by step: that is the visual mode (see pipeline.SimulationPipeline).
+    """
+
+    def __init__(self, fail_rate: float = 0.0, slow_mode: bool = False, time_scale: float = 1.0,
+                 stage_workers: Optional[int] = None, channel_workers: Optional[int] = None,
+                 queue_size: Optional[int] = None, rate_limits: Optional[Dict[str, float]] = None,
+                 backoff_scale: float = 1.0, max_backoff: Optional[float] = None,
+                 observer: Optional[Observer] = None, seed: Optional[int] = None):
+        settings = CONFIG["engine"]
+        self.fail_rate = fail_rate
+        self.time_scale = time_scale * (CONFIG["simulated_delay"]["slow_mode_multiplier"] if slow_mode else 1.0)
+        self.stage_workers = stage_workers or settings["stage_workers"]
+        self.channel_workers = channel_workers or settings["channel_workers"]
+        self.queue_size = queue_size or settings["queue_size"]
+        # Per-channel sends/sec in simulated time (e.g. CONFIG["rate_limits_per_sec"]); None means unlimited
+        self.rate_limits = rate_limits
+        # Retry n waits base_backoff_seconds ** n * backoff_scale, capped at max_backoff (both in real seconds)
+        self.backoff_scale = backoff_scale
+        self.max_backoff = max_backoff
+        self.observer = observer
+        self.random = random.Random(seed)
+        self.dlq: List[QueueMessage] = []
+        self.outcomes: List[EventOutcome] = []
+        self.stats = {"retries": 0, "peak_in_flight": 0}
+        self._in_flight = 0
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._jobs: Dict[str, _Job] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._retry_tasks = set()
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._idle: Optional[asyncio.Event] = None
+
+    # --- lifecycle ---
+
+    async def start(self):
+        """Creates the queues and starts every stage's workers on the running loop."""
+        size = self.queue_size
+        self._queues = {name: asyncio.Queue(size) for name in ("ingestion", "preference_check", "online_check", "publisher")}
+        self._queues.update({channel: asyncio.Queue(size) for channel in CONFIG["channels"]})
+        if self.rate_limits:
+            self._limiters = {channel: RateLimiter(rate / self.time_scale)
+                              for channel, rate in self.rate_limits.items() if rate}
+        self._idle = asyncio.Event()
+        self._idle.set()
+        stage_steps = (("ingestion", self._ingest), ("preference_check", self._check_preferences),
+                       ("online_check", self._check_online), ("publisher", self._fanout))
+        for name, step in stage_steps:
+            self._tasks += [asyncio.create_task(self._stage(name, step)) for _ in range(self.stage_workers)]
+        for channel in CONFIG["channels"]:
+            self._tasks += [asyncio.create_task(self._channel_worker(channel)) for _ in range(self.channel_workers)]
+
+    async def submit(self, event_type: str, user_id: str, overrides: Optional[Dict[str, Any]] = None):
+        """Queues one event for ingestion, waiting while the ingestion queue is full."""
+        job = _Job(event_type, user_id, stages.get_user_data(user_id, overrides))
+        self._in_flight += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self._in_flight)
+        self._idle.clear()
+        await self._queues["ingestion"].put(job)
+
+    async def join(self):
+        """Waits until every submitted event has been delivered, dead-lettered or dropped."""
+        await self._idle.wait()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in list(self._retry_tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retry_tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run(self, events: Iterable[Tuple[str, str, Optional[Dict[str, Any]]]]) -> Dict[str, Any]:
+        """Starts the engine, pushes (event_type, user_id, overrides) events through, and returns summary()."""
+        began = time.monotonic()
+        await self.start()
+        try:
+            for event_type, user_id, overrides in events:
+                await self.submit(event_type, user_id, overrides)
+            await self.join()
+        finally:
+            await self.stop()
+        return self.summary(time.monotonic() - began)
+
+    # --- observation ---
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {channel: self._queues[channel].qsize() if channel in self._queues else 0
+                for channel in CONFIG["channels"]}
+
+    def _emit(self, step: str, status: str, message: str, data: Dict[str, Any] = None):
+        if self.observer is not None:
+            self.observer(step, status, message, data or {})
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for outcome in self.outcomes:
+            statuses[outcome.status] = statuses.get(outcome.status, 0) + 1
+        latencies = sorted(outcome.finished - outcome.started for outcome in self.outcomes)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000, 1) if latencies else None
+
+        return {
+            "events": len(self.outcomes), "elapsed_s": round(elapsed, 3),
+            "events_per_sec": round(len(self.outcomes) / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": pct(50), "p99_ms": pct(99), "statuses": statuses,
+            "retries": self.stats["retries"], "dlq": len(self.dlq), "peak_in_flight": self.stats["peak_in_flight"],
+        }
+
+    # --- stages ---
+
+    async def _delay(self, base_time: float):
+        await asyncio.sleep(base_time * self.time_scale)
+
+    async def _stage(self, name: str, step):
+        queue = self._queues[name]
+        while True:
+            job = await queue.get()
+            try:
+                next_stage = await step(job)
+                if next_stage is not None:
+                    await self._queues[next_stage].put(job)
+            except Exception as e:
+                # One bad event must not take the worker down with it, or join() would wait forever
+                self._emit(name, "failed", f"Unexpected {name} error: {e}")
+                if job.event is not None:
+                    self._jobs.pop(job.event.event_id, None)
+                self._finish(job, "rejected")
+            finally:
+                queue.task_done()
+
+    async def _ingest(self, job: _Job) -> Optional[str]:
+        self._emit("ingestion", "processing", f"API Gateway received event: {job.event_type}")
+        await self._delay(CONFIG["simulated_delay"]["gateway"])
+        try:
+            job.event = stages.ingestion_layer(job.event_type, job.user_id)
+        except Exception as e:
+            self._emit("ingestion", "failed", f"Ingestion error: {str(e)}")
+            self._finish(job, "rejected")
+            return None
+        job.outcome.event_id = job.event.event_id
+        msg = f"Event parsed. Priority: {job.event.priority}. Default channels: {', '.join(job.event.metadata['default_channels'])}"
+        self._emit("ingestion", "success", msg, {"event_id": job.event.event_id})
+        return "preference_check"
+
+    async def _check_preferences(self, job: _Job) -> Optional[str]:
+        self._emit("preference_check", "processing", "Database Check: User preferences & DND status")
+        await self._delay(CONFIG["simulated_delay"]["preference_check"])
+        approved_channels = stages.preference_checker(job.event, job.user_data)
+        if not approved_channels:
+            self._emit("preference_check", "failed", "Event blocked by preferences (e.g., DND active).")
+            self._finish(job, "blocked")
+            return None
+        job.event.metadata["approved_channels"] = approved_channels
+        self._emit("preference_check", "success", f"Approved channels computed: {', '.join(approved_channels)}")
+        return "online_check"
+
+    async def _check_online(self, job: _Job) -> Optional[str]:
+        self._emit("online_check", "processing", "Checking Redis for user online status...")
+        await self._delay(CONFIG["simulated_delay"]["online_check"])
+        online_result = stages.online_status_checker(job.event, job.event.metadata["approved_channels"], job.user_data)
+        final_channels = online_result["channels"]
+        reasons = " ".join(online_result["decisions"])
+        self._emit("online_check", "success", f"Resolved endpoints: {', '.join(final_channels)}. {reasons}")
+        if not final_channels:
+            self._emit("online_check", "failed", "All channels suppressed dynamically.")
+            self._finish(job, "suppressed")
+            return None
+        job.event.metadata["final_channels"] = final_channels
+        return "publisher"
+
+    async def _fanout(self, job: _Job) -> None:
+        final_channels = job.event.metadata["final_channels"]
+        self._emit("publisher", "processing", f"Pub/Sub Fanning out to {len(final_channels)} queues...")
+        await self._delay(CONFIG["simulated_delay"]["fanout"])
+        self._jobs[job.event.event_id] = job
+        job.pending = len(final_channels)
+        for channel in final_channels:
+            q_msg = QueueMessage(message_id=str(uuid.uuid4()), event_id=job.event.event_id, channel=channel,
+                                 payload={"data": "..."})
+            await self._queues[channel].put(q_msg)
+        self._emit("publisher", "success", "Messages successfully pushed to topic queues.")
+        self._emit("queues", "info", "Queues populated", {"messages": list(final_channels)})
+        return None
+
+    async def _channel_worker(self, channel: str):
+        queue = self._queues[channel]
+        step_name = f"worker_{channel}"
+        limiter = self._limiters.get(channel)
+        while True:
+            q_msg = await queue.get()
+            try:
+                await self._deliver(q_msg, step_name, limiter)
+            except Exception as e:
+                q_msg.status = "failed"
+                q_msg.error_reason = str(e)
+                self._emit(step_name, "failed", f"Unexpected {channel.upper()} worker error: {e}")
+                job = self._jobs.pop(q_msg.event_id, None)
+                if job is not None:
+                    self._finish(job, "rejected")
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, q_msg: QueueMessage, step_name: str, limiter: Optional[RateLimiter]):
+        channel = q_msg.channel
+        if q_msg.retries == 0:
+            limit = CONFIG["rate_limits_per_sec"].get(channel, 10)
+            self._emit(step_name, "processing", f"Worker pulling from queue. Rate limit enforces max {limit}/sec.")
+            await self._delay(CONFIG["simulated_delay"]["worker_pull"])
+        if limiter is not None:
+            await limiter.acquire()
+        q_msg.status = "processing"
+        self._emit(step_name, "processing", f"Calling 3rd party {channel.upper()} provider...")
+        await self._delay(CONFIG["simulated_delay"]["worker_process"])
+
+        # Simulate Success/Fail based on fail rate
+        if self.random.random() >= self.fail_rate:
+            q_msg.status = "success"
+            if q_msg.retries:
+                self._emit(step_name, "success", f"Delivered successfully on retry {q_msg.retries}.")
+            else:
+                self._emit(step_name, "success", f"Delivered {channel.upper()} successfully.")
+            self._message_done(q_msg)
+            return
+        if q_msg.retries == 0:
+            self._emit(step_name, "error", "Delivery failed API Error (Simulated Outage).")
+        if q_msg.retries >= CONFIG["max_retries"]:
+            self._emit(step_name, "failed", f"Max retries ({CONFIG['max_retries']}) exceeded. Moving to DLQ.")
+            q_msg.status = "dlq"
+            q_msg.error_reason = "max retries exceeded"
+            self.dlq.append(q_msg)
+            self._emit("dlq", "info", "DLQ count increased.")
+            self._message_done(q_msg)
+            return
+        q_msg.retries += 1
+        q_msg.status = "pending"
+        self.stats["retries"] += 1
+        backoff = CONFIG["base_backoff_seconds"] ** q_msg.retries
+        self._emit(step_name, "error", f"Exponential backoff: Retrying {q_msg.retries}/{CONFIG['max_retries']} in {backoff}s...")
+        # The worker moves on; the message comes back to the queue once its backoff is over
+        task = asyncio.create_task(self._retry_later(q_msg, backoff))
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+
+    async def _retry_later(self, q_msg: QueueMessage, backoff: float):
+        wait = backoff * self.backoff_scale
+        if self.max_backoff is not None:
+            wait = min(wait, self.max_backoff)
+        await asyncio.sleep(wait)
+        await self._queues[q_msg.channel].put(q_msg)
+
+    # --- completion ---
+
+    def _message_done(self, q_msg: QueueMessage):
+        job = self._jobs.get(q_msg.event_id)
+        if job is None:
+            return  # The event was already rejected after another of its messages failed
+        (job.outcome.delivered if q_msg.status == "success" else job.outcome.dead_lettered).append(q_msg.channel)
+        job.pending -= 1
+        if job.pending == 0:
+            del self._jobs[q_msg.event_id]
+            outcome = job.outcome
+            self._finish(job, "delivered" if not outcome.dead_lettered else "partial" if outcome.delivered else "dlq")
+
+    def _finish(self, job: _Job, status: str):
+        if job.outcome.finished:
+            return
+        job.outcome.status = status
+        job.outcome.finished = time.monotonic()
+        self.outcomes.append(job.outcome)
+        self._in_flight -= 1
+        if self._in_flight == 0:
+            self._idle.set()
+
+
+def _events(count: int, seed: int) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """`count` events of random types for random users, a third of them online."""
+    rng = random.Random(seed)
+    event_types = list(CONFIG["events"])
+    return [(rng.choice(event_types), f"user_{rng.randrange(10000)}", {"online": rng.random() < 0.33})
+            for _ in range(count)]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Push a burst of events through the concurrent notification engine.")
+    parser.add_argument("--events", type=int, default=5000, help="Number of events to submit")
+    parser.add_argument("--time-scale", type=float, default=0.01,
+                        help="Multiplier on the simulated stage delays (1.0 = the visual mode's timing)")
+    parser.add_argument("--fail-rate", type=int, default=10, help="Percentage of provider calls that fail")
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="Enforce CONFIG['rate_limits_per_sec'] per channel (in simulated seconds)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    engine = NotificationEngine(fail_rate=args.fail_rate / 100.0, time_scale=args.time_scale,
+                                backoff_scale=args.time_scale,
+                                rate_limits=CONFIG["rate_limits_per_sec"] if args.rate_limits else None, seed=args.seed)
+    summary = asyncio.run(engine.run(_events(args.events, args.seed)))
+    sequential = sum(CONFIG["simulated_delay"][k] for k in ("gateway", "preference_check", "online_check", "fanout"))
+    print(f"{summary['events']} events in {summary['elapsed_s']}s: {summary['events_per_sec']} events/sec, "
+          f"p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms, peak {summary['peak_in_flight']} in flight")
+    print(f"Outcomes: {summary['statuses']}; {summary['retries']} retries, {summary['dlq']} messages in the DLQ")
+    print(f"(One event at a time, the stages before fanout alone would take {sequential * args.time_scale * args.events:.1f}s)")
@@ -2,7 +2,7 @@
 import time
 import uuid
 from dataclasses import dataclass, field
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 @dataclass
 class NotificationEvent:
@@ -31,3 +31,13 @@ class DeliveryLog:
     message: str
     details: Dict[str, Any]
     status: str # info, success, warning, error
+
+@dataclass
+class EventOutcome:
+    event_id: str
+    event_type: str
+    status: str # delivered, partial, dlq, blocked, suppressed, rejected
+    started: float
+    finished: float = 0.0
+    delivered: List[str] = field(default_factory=list)
+    dead_lettered: List[str] = field(default_factory=list)